@@ -2,7 +2,15 @@ from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from database import get_db
+from auth import invalidate_user
+from database import get_db, pool_stats
+from dm_hub import dm_hub
+from viewer_presence import viewer_presence
+from livekit_webhook import presence_batcher
+from live_directory import live_directory
+from images import image_pool
+from maintenance import maintenance
+from passwords import password_pool
 
 import os
 
@@ -105,6 +113,8 @@ def admin_add_tokens(data: dict, s: Session = Depends(get_db), auth: bool = Depe
 def delete_user(user_id: int, s: Session = Depends(get_db), auth: bool = Depends(verify_admin)):
     s.execute(text("DELETE FROM users WHERE id = :id"), {"id": user_id})
     s.commit()
+    invalidate_user(user_id)
+    live_directory.end(user_id)
     return {"detail": f"Gebruiker {user_id} verwijderd."}
 
 # 🔍 Gebruiker zoeken
@@ -140,6 +150,7 @@ def update_user(data: dict, s: Session = Depends(get_db), auth: bool = Depends(v
         WHERE id = :id
     """), {"email": email, "bio": bio, "verified": verified, "id": user_id})
     s.commit()
+    invalidate_user(int(user_id))
     return {"detail": f"Gebruiker {user_id} bijgewerkt."}
 
 
@@ -153,6 +164,7 @@ def block_user(data: dict, s: Session = Depends(get_db), auth: bool = Depends(ve
 
     s.execute(text("UPDATE users SET blocked = :b WHERE id = :id"), {"b": blocked, "id": user_id})
     s.commit()
+    invalidate_user(int(user_id))
     return {"detail": f"Gebruiker {user_id} {'geblokkeerd' if blocked else 'gedeblokkeerd'}."}
 
 
@@ -169,3 +181,22 @@ def admin_stats(s: Session = Depends(get_db), auth: bool = Depends(verify_admin)
 
 
 
+
+
+# 🔌 Connection pool statistieken
+@router.get("/db-pool")
+def db_pool(auth: bool = Depends(verify_admin)):
+    return pool_stats()
+
+
+# ⚙️ Worker pools (wachtrijdiepte, doorlooptijden)
+@router.get("/workers")
+def worker_stats(auth: bool = Depends(verify_admin)):
+    return {
+        "passwords": password_pool.stats(),
+        "images": image_pool.stats(),
+        "dm_push": dm_hub.stats(),
+        "viewers": viewer_presence.stats(),
+        "livekit_webhook": presence_batcher.stats(),
+        "maintenance": maintenance.stats(),
+    }
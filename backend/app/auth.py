@@ -1,76 +1,251 @@
-from fastapi import Depends, HTTPException, status, Request
-from jose import jwt, JWTError
+"""Gedeelde authenticatie: één resolver voor ``get_current_user``.
+
+Elke geauthenticeerde request (ook de heartbeat van ``/api/live/start`` en de
+DM-inbox-poll) passeert hier.  Geverifieerde tokens worden daarom gecachet:
+de SHA-256 van het token verwijst naar een lichte :class:`Principal`
+(id, username, gender en flags), met TTL en LRU-eviction.  Een cache-hit kost
+geen JWT-decode en geen DB-roundtrip.
+
+Wijzigingen aan de gebruiker (profiel, gender, blokkeren, verwijderen) moeten
+``invalidate_user(user_id)`` aanroepen zodat de volgende request opnieuw uit
+de database leest.
+
+Waar de browser geen header kan zetten (``EventSource``) gebruikt de client
+een *ticket*: een kortlevend token voor één doel (``purpose``), opgehaald via
+een geauthenticeerde POST.  Zo komt het sessietoken nooit in een URL (en dus
+niet in proxy-logs of de browsergeschiedenis), en is een ticket omgekeerd
+niet bruikbaar als Bearer-token.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request
+from jose import JWTError, jwt
 from sqlalchemy.orm import Session
+
 from database import get_db
 from models import UserDB
-import os
-from dotenv import load_dotenv
 
 # 🔐 Laad alle gevoelige data via .env
 load_dotenv()
 
-# Zorg voor veilige defaults zodat dezelfde configuratie als main.py geldt
-# wanneer omgevingsvariabelen ontbreken. Dit voorkomt dat token-validatie
-# faalt (en dus 401's oplevert) in ontwikkel- of testomgevingen waar alleen
-# ``JWT_SECRET`` is ingesteld.
 DEFAULT_ALGORITHM = "HS256"
-SECRET_KEY = (
-    os.getenv("JWT_SECRET")
-    or os.getenv("SECRET_KEY")
-    
-)
+DEFAULT_SECRET = "MyUltraSecretKey"
 ALGORITHM = os.getenv("ALGORITHM", DEFAULT_ALGORITHM)
 
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+TICKET_TTL = int(os.getenv("TICKET_TTL", "60"))
+
+
+def _secret_key() -> str:
+    # Bij elke decode opnieuw lezen: zo gebruiken main.create_access_token en
+    # de resolver altijd dezelfde sleutel, ook als tests de env aanpassen.
+    return os.getenv("JWT_SECRET") or os.getenv("SECRET_KEY") or DEFAULT_SECRET
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Lichte momentopname van een ingelogde gebruiker."""
+
+    id: int
+    username: str
+    gender: str = "anon"
+    is_verified: bool = False
+    blocked: bool = False
+
+    @classmethod
+    def from_user(cls, user: UserDB) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            gender=user.gender or "anon",
+            is_verified=bool(user.is_verified),
+            blocked=bool(user.blocked),
+        )
+
+
+class PrincipalCache:
+    """Thread-safe LRU-cache ``token-hash -> Principal`` met vervaltijd."""
+
+    def __init__(self, ttl: int, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, tuple[Principal, float]]" = OrderedDict()
+        self._by_user: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Principal]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            principal, expires_at = entry
+            if expires_at <= now:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return principal
+
+    def put(self, key: str, principal: Principal, token_exp: Optional[float] = None) -> None:
+        expires_at = time.time() + self.ttl
+        if token_exp:
+            # Nooit langer cachen dan het token zelf geldig is.
+            expires_at = min(expires_at, float(token_exp))
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (principal, expires_at)
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+            self._by_user.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_user.get(entry[0].id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                self._by_user.pop(entry[0].id, None)
+
+
+principal_cache = PrincipalCache(ttl=AUTH_CACHE_TTL, maxsize=AUTH_CACHE_SIZE)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Verwijder alle gecachte tokens van ``user_id``."""
+
+    principal_cache.invalidate_user(user_id)
+
+
+def _extract_bearer(token_header: Optional[str]) -> str:
+    if not token_header:
+        raise HTTPException(status_code=401, detail="Missing Authorization header")
+
+    parts = token_header.strip().split(" ")
+    if len(parts) != 2 or parts[0].lower() != "bearer":
+        raise HTTPException(status_code=401, detail="Invalid Authorization format")
+
+    token = parts[1].strip()
+    if not token:
+        raise HTTPException(status_code=401, detail="Empty token")
+    return token
+
+
+def resolve_principal(token_header: Optional[str], s: Session) -> Principal:
+    """Valideer het Bearer-token en geef de bijhorende :class:`Principal`."""
+
+    token = _extract_bearer(token_header)
+    key = hashlib.sha256(token.encode()).hexdigest()
+
+    cached = principal_cache.get(key)
+    if cached is not None:
+        return cached
 
-# helper: token decoderen
-def verify_token(token: str):
     try:
-        # Probeer eerst normale Johka-token te decoderen (met handtekening)
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        data = jwt.decode(token, _secret_key(), algorithms=[ALGORITHM])
     except JWTError:
-        # Als dat mislukt, probeer LiveKit-stijl (zonder verificatie)
-        try:
-            payload = jwt.decode(
-                token,
-                options={"verify_signature": False},
-                algorithms=[ALGORITHM or DEFAULT_ALGORITHM],
-            )
-        except Exception:
-            raise HTTPException(status_code=401, detail="Ongeldige of verlopen token")
-
-    # Johka-login tokens: hebben meestal 'username' of 'sub' (int)
-    # LiveKit-tokens: hebben 'sub' of 'identity' met string-naam
-    user_id = payload.get("sub")
-    username = payload.get("username") or payload.get("name") or payload.get("identity")
-
-    if not user_id and not username:
-        raise HTTPException(status_code=401, detail="Token bevat geen geldige claims")
-
-    return {
-        "id": int(user_id) if str(user_id).isdigit() else None,
-        "username": username,
-    }
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if data.get("purpose"):
+        # Tickets gelden enkel voor hun eigen endpoint.
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    principal = _load_principal(data, s)
+    principal_cache.put(key, principal, data.get("exp"))
+    return principal
+
+
+def _load_principal(data: dict, s: Session) -> Principal:
+    uid = data.get("sub")
+    if not uid or not str(uid).isdigit():
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+
+    user = s.get(UserDB, int(uid))
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    principal = Principal.from_user(user)
+    # De lookup was een losse leestransactie: connectie meteen teruggeven
+    # i.p.v. ze vast te houden tot het einde van de request.
+    _release(s)
+    return principal
+
+
+def create_ticket(user_id: int, purpose: str, ttl: int = TICKET_TTL) -> str:
+    """Kortlevend token dat enkel voor ``purpose`` geldt (bv. ``"dm-stream"``)."""
+
+    now = int(time.time())
+    payload = {"sub": str(user_id), "purpose": purpose, "iat": now, "exp": now + ttl}
+    return jwt.encode(payload, _secret_key(), algorithm=ALGORITHM)
+
+
+def resolve_ticket(ticket: Optional[str], purpose: str, s: Session) -> Principal:
+    """Valideer een ticket van :func:`create_ticket`; geen cache, één lookup per connectie."""
+
+    if not ticket:
+        raise HTTPException(status_code=401, detail="Missing ticket")
+    try:
+        data = jwt.decode(ticket, _secret_key(), algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid ticket")
+    if data.get("purpose") != purpose:
+        raise HTTPException(status_code=401, detail="Invalid ticket")
+    return _load_principal(data, s)
+
+
+def _release(s: Session) -> None:
+    if s.in_transaction():
+        s.rollback()
 
 
 # dependency: gebruiker ophalen uit token
-def get_current_user(request: Request, s: Session = Depends(get_db)):
+def get_current_user(request: Request, s: Session = Depends(get_db)) -> Principal:
     """
     Haalt de ingelogde gebruiker op aan de hand van het Bearer-token in de Authorization-header.
     """
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Geen geldige Authorization-header")
+    return resolve_principal(request.headers.get("authorization"), s)
 
-    token = auth_header.split(" ")[1]
-    claims = verify_token(token)
-
-    user = None
-    if claims["id"]:
-        user = s.query(UserDB).filter_by(id=claims["id"]).first()
-    elif claims["username"]:
-        user = s.query(UserDB).filter_by(username=claims["username"]).first()
-
-    if not user:
-        raise HTTPException(status_code=401, detail="Gebruiker niet gevonden")
 
-    return user
+def get_optional_user(request: Request, s: Session = Depends(get_db)) -> Optional[Principal]:
+    token_header = request.headers.get("authorization")
+    if not token_header:
+        return None
+    return resolve_principal(token_header, s)
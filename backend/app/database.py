@@ -1,8 +1,10 @@
 import os
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator, Optional
 
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 
@@ -27,7 +29,31 @@ if not DATABASE_URL:
         f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db_name}"
     )
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
+# Pool-instellingen: alle sync DB-toegang (ORM én raw psycopg2 via
+# ``engine.raw_connection()``) deelt deze begrensde pool.  De async engine
+# heeft een eigen pool (``DB_ASYNC_POOL_*``); samen vormen ze het budget per
+# worker, dus beide tellen mee tegenover ``max_connections``.
+DB_POOL_SIZE = int(_get_env("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(_get_env("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(_get_env("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = int(_get_env("DB_POOL_TIMEOUT", "30"))
+DB_ASYNC_POOL_SIZE = int(_get_env("DB_ASYNC_POOL_SIZE", "5"))
+DB_ASYNC_MAX_OVERFLOW = int(_get_env("DB_ASYNC_MAX_OVERFLOW", "10"))
+
+
+def _engine_kwargs(pool_size: int, max_overflow: int) -> dict:
+    kwargs = {"pool_pre_ping": True}
+    if not DATABASE_URL.startswith("sqlite"):
+        # SQLite (tests) gebruikt een eigen pool zonder overflow-instellingen.
+        kwargs.update(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    return kwargs
+
+engine = create_engine(DATABASE_URL, future=True, **_engine_kwargs(DB_POOL_SIZE, DB_MAX_OVERFLOW))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -40,4 +66,89 @@ def get_db() -> Generator:
         db.close()
 
 
-__all__ = ["Base", "engine", "SessionLocal", "get_db"]
\ No newline at end of file
+def _async_database_url(url: str) -> str:
+    """Vertaal de sync DATABASE_URL naar een asyncio-driver (asyncpg/aiosqlite)."""
+
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    elif backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = _get_env("ASYNC_DATABASE_URL") or _async_database_url(DATABASE_URL)
+
+# De async engine wordt pas bij eerste gebruik aangemaakt, zodat processen
+# die enkel sync DB-toegang nodig hebben (tests, scripts) geen asyncpg nodig
+# hebben.
+_async_engine: Optional[AsyncEngine] = None
+_AsyncSessionLocal: Optional[async_sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine, _AsyncSessionLocal
+
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL, **_engine_kwargs(DB_ASYNC_POOL_SIZE, DB_ASYNC_MAX_OVERFLOW)
+        )
+        _AsyncSessionLocal = async_sessionmaker(
+            _async_engine, autoflush=False, expire_on_commit=False
+        )
+    return _async_engine
+
+
+def async_session() -> AsyncSession:
+    """Nieuwe ``AsyncSession`` buiten een dependency (bv. in een stream)."""
+
+    get_async_engine()
+    return _AsyncSessionLocal()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Async tegenhanger van ``get_db`` voor ``async def``-routes."""
+
+    async with async_session() as db:
+        yield db
+
+
+def _pool_snapshot(pool, max_overflow: int) -> dict:
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            stats[name] = fn()
+    if not DATABASE_URL.startswith("sqlite"):
+        stats["max_overflow"] = max_overflow
+        stats["recycle"] = DB_POOL_RECYCLE
+    return stats
+
+
+def pool_stats() -> dict:
+    """Momentopname van beide connection pools (voor monitoring/admin).
+
+    ``async`` is ``None`` zolang de async engine nog niet gebruikt is.
+    """
+
+    return {
+        "sync": _pool_snapshot(engine.pool, DB_MAX_OVERFLOW),
+        "async": (
+            _pool_snapshot(_async_engine.pool, DB_ASYNC_MAX_OVERFLOW)
+            if _async_engine is not None
+            else None
+        ),
+    }
+
+
+__all__ = [
+    "Base",
+    "engine",
+    "SessionLocal",
+    "get_db",
+    "get_async_engine",
+    "async_session",
+    "get_async_db",
+    "pool_stats",
+]
\ No newline at end of file
@@ -1,52 +1,416 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from database import engine, get_db
-from models import PrivateMessage, UserDB
-from auth import get_current_user  # ⚠️ pas aan naar jouw daadwerkelijke auth-helper
-from sqlalchemy import or_
+from database import async_session, get_async_db, get_db
+from dm_hub import CLOSE, dm_hub
+from http_cache import if_none_match
+from models import DMThread, PrivateMessage, UserDB
+from auth import TICKET_TTL, Principal, create_ticket, get_current_user, resolve_principal, resolve_ticket
+from sqlalchemy import or_, select, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
 
 
 router = APIRouter(prefix="/api/dm", tags=["Direct Messages"])
 
+# Comment-regel om proxies/load balancers de verbinding niet te laten sluiten.
+STREAM_HEARTBEAT_SECONDS = 25
+STREAM_REPLAY_LIMIT = 100
+THREAD_PREVIEW_CHARS = 200
+INBOX_LIMIT = 50
+
+
 class MessageIn(BaseModel):
     to_username: str
     message: str
 
+
+def _message_out(r) -> dict:
+    return {
+        "id": r.id,
+        "from": r.sender,
+        "to": r.receiver,
+        "message": r.message,
+        "time": r.created_at.isoformat(),
+        "read": r.read
+    }
+
+
+def _message_select():
+    # Eén geprojecteerde join i.p.v. een lazy load per sender/receiver.
+    sender = aliased(UserDB)
+    receiver = aliased(UserDB)
+    return (
+        select(
+            PrivateMessage.id,
+            sender.username.label("sender"),
+            receiver.username.label("receiver"),
+            PrivateMessage.message,
+            PrivateMessage.created_at,
+            PrivateMessage.read,
+        )
+        .join(sender, PrivateMessage.sender_id == sender.id)
+        .join(receiver, PrivateMessage.receiver_id == receiver.id)
+    )
+
+
+def _messages_for(user_id: int):
+    return _message_select().where(
+        or_(
+            PrivateMessage.receiver_id == user_id,
+            PrivateMessage.sender_id == user_id
+        )
+    )
+
+
 @router.post("/send")
-def send_dm(data: MessageIn, user: UserDB = Depends(get_current_user), s: Session = Depends(get_db)):
-    target = s.query(UserDB).filter_by(username=data.to_username).first()
+async def send_dm(
+    data: MessageIn,
+    user: Principal = Depends(get_current_user),
+    s: AsyncSession = Depends(get_async_db),
+):
+    target = await s.scalar(select(UserDB).filter_by(username=data.to_username))
     if not target:
         raise HTTPException(404, "Gebruiker niet gevonden")
 
-    msg = PrivateMessage(sender_id=user.id, receiver_id=target.id, message=data.message)
+    thread_id = await _ensure_thread(s, user.id, target.id)
+    msg = PrivateMessage(
+        sender_id=user.id, receiver_id=target.id, thread_id=thread_id, message=data.message
+    )
     s.add(msg)
-    s.commit()
+    await s.flush()
+
+    # Thread in dezelfde transactie bijwerken; de teller-increment gebeurt in
+    # SQL zodat gelijktijdige berichten elkaar niet overschrijven.
+    unread_col = "unread_low" if target.id == min(user.id, target.id) else "unread_high"
+    await s.execute(
+        update(DMThread)
+        .where(DMThread.id == thread_id)
+        .values(
+            {
+                "last_message_id": msg.id,
+                "last_sender_id": user.id,
+                "last_preview": data.message[:THREAD_PREVIEW_CHARS],
+                # Applicatieklok (zoals Tip.created_at): microseconden, zodat de
+                # keyset-cursor op (last_activity_at, id) overal stabiel vergelijkt.
+                "last_activity_at": datetime.utcnow(),
+                unread_col: getattr(DMThread, unread_col) + 1,
+            }
+        )
+    )
+    await s.commit()
+    await s.refresh(msg, ["created_at"])
+
+    # Pas na de commit pushen: ontvangers zien nooit een bericht dat nog
+    # teruggedraaid kan worden.
+    await dm_hub.publish(
+        (user.id, target.id),
+        {
+            "id": msg.id,
+            "thread_id": thread_id,
+            "from": user.username,
+            "to": target.username,
+            "message": msg.message,
+            "time": msg.created_at.isoformat(),
+            "read": bool(msg.read),
+        },
+    )
     return {"ok": True, "message": "Bericht verzonden"}
 
 
 
+async def _ensure_thread(s: AsyncSession, a: int, b: int) -> int:
+    """Id van de thread tussen ``a`` en ``b``; maakt ze race-vrij aan."""
+
+    low, high = min(a, b), max(a, b)
+    insert = pg_insert if s.bind.dialect.name == "postgresql" else sqlite_insert
+    await s.execute(
+        insert(DMThread)
+        .values(user_low_id=low, user_high_id=high)
+        .on_conflict_do_nothing(index_elements=["user_low_id", "user_high_id"])
+    )
+    return await s.scalar(
+        select(DMThread.id).where(DMThread.user_low_id == low, DMThread.user_high_id == high)
+    )
+
+
+def _messages_since(user_id: int, since: int):
+    # Per kant een index-range op (receiver_id|sender_id, id) i.p.v. een OR
+    # die alle berichten van de gebruiker afloopt.
+    ids = union_all(
+        select(PrivateMessage.id).where(
+            PrivateMessage.receiver_id == user_id, PrivateMessage.id > since
+        ),
+        select(PrivateMessage.id).where(
+            PrivateMessage.sender_id == user_id,
+            PrivateMessage.receiver_id != user_id,
+            PrivateMessage.id > since,
+        ),
+    ).subquery()
+    return (
+        _message_select()
+        .where(PrivateMessage.id.in_(select(ids.c.id)))
+        .order_by(PrivateMessage.id)
+        .limit(INBOX_LIMIT)
+    )
+
+
 @router.get("/inbox")
-def get_inbox(user: UserDB = Depends(get_current_user), s: Session = Depends(get_db)):
-    msgs = (
-        s.query(PrivateMessage)
-        .filter(
-            or_(
-                PrivateMessage.receiver_id == user.id,
-                PrivateMessage.sender_id == user.id
+def get_inbox(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="X-Inbox-Cursor van de vorige poll"),
+    user: Principal = Depends(get_current_user),
+    s: Session = Depends(get_db),
+):
+    """Laatste berichten, of met ``since`` enkel de nieuwe (delta).
+
+    ``X-Inbox-Cursor`` bevat het hoogste bericht-id; geef het terug als
+    ``since``.  Een delta levert hoogstens ``INBOX_LIMIT`` berichten (oudste
+    eerst afgeknipt, ``X-Inbox-More: 1`` als er nog volgen).  Is er niets
+    nieuw en stuurt de client de vorige ETag mee, dan volgt een lege 304.
+    """
+
+    if since is None:
+        rows = s.execute(
+            _messages_for(user.id)
+            .order_by(PrivateMessage.created_at.desc())
+            .limit(INBOX_LIMIT)
+        ).all()
+    else:
+        rows = s.execute(_messages_since(user.id, since)).all()
+        rows.reverse()
+
+    cursor = max((r.id for r in rows), default=since or 0)
+    headers = {"X-Inbox-Cursor": str(cursor)}
+    if since is not None:
+        # Een delta vanaf ``cursor`` is per definitie leeg: stabiele validator.
+        etag = f'"dm-{user.id}-{cursor}"'
+        headers["ETag"] = etag
+        headers["Cache-Control"] = "private, no-cache"
+        if len(rows) == INBOX_LIMIT:
+            headers["X-Inbox-More"] = "1"
+        if not rows and if_none_match(request, etag):
+            return Response(status_code=304, headers=headers)
+    return JSONResponse([_message_out(r) for r in rows], headers=headers)
+
+
+# ===============================================================
+# 📡 Push (Server-Sent Events)
+# ===============================================================
+STREAM_TICKET_PURPOSE = "dm-stream"
+
+
+@router.post("/stream-ticket")
+def dm_stream_ticket(user: Principal = Depends(get_current_user)):
+    """Kortlevend ticket voor ``/stream?ticket=...`` (EventSource kan geen headers zetten)."""
+
+    return {"ticket": create_ticket(user.id, STREAM_TICKET_PURPOSE), "expires_in": TICKET_TTL}
+
+
+def _stream_user(
+    request: Request,
+    ticket: Optional[str] = Query(None),
+    s: Session = Depends(get_db),
+) -> Principal:
+    # Nooit het sessietoken in de URL: enkel de header of een stream-ticket.
+    header = request.headers.get("authorization")
+    if header:
+        return resolve_principal(header, s)
+    return resolve_ticket(ticket, STREAM_TICKET_PURPOSE, s)
+
+
+async def replay_messages(user_id: int, after_id: int) -> list[dict]:
+    """Berichten met id > ``after_id`` (oudste eerst), voor herverbindende clients."""
+
+    async with async_session() as s:
+        rows = (
+            await s.execute(
+                _messages_for(user_id)
+                .where(PrivateMessage.id > after_id)
+                .order_by(PrivateMessage.id)
+                .limit(STREAM_REPLAY_LIMIT)
             )
-        )
-        .order_by(PrivateMessage.created_at.desc())
-        .limit(50)
-        .all()
+        ).all()
+    return [_message_out(r) for r in rows]
+
+
+def _sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: dm\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@router.get("/stream")
+async def dm_stream(request: Request, user: Principal = Depends(_stream_user)):
+    """Live stream van nieuwe privéberichten (``event: dm``).
+
+    Bij herverbinden stuurt de browser ``Last-Event-ID``; berichten die in
+    tussentijd binnenkwamen worden eerst opnieuw verstuurd.
+    """
+
+    last_id = request.headers.get("last-event-id") or request.query_params.get("since")
+
+    async def events():
+        # Eerst inschrijven, dan pas replayen: zo valt er niets tussen de mazen.
+        queue = dm_hub.subscribe(user.id)
+        try:
+            yield "retry: 3000\n\n"
+            replayed = 0
+            if last_id and last_id.isdigit():
+                for event in await replay_messages(user.id, int(last_id)):
+                    replayed = event["id"]
+                    yield _sse(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event is CLOSE:
+                    break
+                if event["id"] <= replayed:
+                    continue
+                yield _sse(event)
+        finally:
+            dm_hub.unsubscribe(user.id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return [
+
+
+# ===============================================================
+# 🧵 Threads (gesprekken per gebruikerspaar)
+# ===============================================================
+def _thread_cursor(activity, thread_id: int) -> str:
+    return f"{activity.isoformat()}|{thread_id}"
+
+
+@router.get("/threads")
+def list_threads(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor van de vorige pagina"),
+    user: Principal = Depends(get_current_user),
+    s: Session = Depends(get_db),
+):
+    """Gesprekken van de gebruiker, meest recente eerst.
+
+    Elke kant (user_low / user_high) gebruikt zijn eigen index en levert
+    hoogstens ``limit`` rijen: de kost hangt af van het aantal getoonde
+    threads, niet van het aantal berichten.
+    """
+
+    def _side(mine, other, unread):
+        stmt = select(
+            DMThread.id,
+            DMThread.last_activity_at,
+            DMThread.last_preview,
+            DMThread.last_sender_id,
+            other.label("other_id"),
+            unread.label("unread"),
+        ).where(mine == user.id)
+        if cursor:
+            try:
+                ts, tid = cursor.rsplit("|", 1)
+                ts, tid = datetime.fromisoformat(ts), int(tid)
+            except ValueError:
+                raise HTTPException(400, "Ongeldige cursor")
+            stmt = stmt.where(
+                or_(
+                    DMThread.last_activity_at < ts,
+                    (DMThread.last_activity_at == ts) & (DMThread.id < tid),
+                )
+            )
+        return (
+            stmt.order_by(DMThread.last_activity_at.desc(), DMThread.id.desc())
+            .limit(limit)
+            .subquery()
+        )
+
+    low = _side(DMThread.user_low_id, DMThread.user_high_id, DMThread.unread_low)
+    # Gesprek met jezelf niet dubbel tellen.
+    high = _side(DMThread.user_high_id, DMThread.user_low_id, DMThread.unread_high)
+    both = union_all(
+        select(low),
+        select(high).where(high.c.other_id != user.id),
+    ).subquery()
+    rows = s.execute(
+        select(both, UserDB.username)
+        .join(UserDB, UserDB.id == both.c.other_id)
+        .order_by(both.c.last_activity_at.desc(), both.c.id.desc())
+        .limit(limit)
+    ).all()
+
+    threads = [
         {
-            "from": m.sender.username,
-            "to": m.receiver.username,
-            "message": m.message,
-            "time": m.created_at.isoformat(),
-            "read": m.read
+            "id": r.id,
+            "with": r.username,
+            "last_message": r.last_preview,
+            "last_from_me": r.last_sender_id == user.id,
+            "last_time": r.last_activity_at.isoformat(),
+            "unread": r.unread,
         }
-        for m in msgs
+        for r in rows
     ]
+    next_cursor = (
+        _thread_cursor(rows[-1].last_activity_at, rows[-1].id) if len(rows) == limit else None
+    )
+    return {"threads": threads, "next_cursor": next_cursor}
+
+
+def _own_thread(s: Session, thread_id: int, user_id: int) -> DMThread:
+    thread = s.get(DMThread, thread_id)
+    if not thread or user_id not in (thread.user_low_id, thread.user_high_id):
+        raise HTTPException(404, "Gesprek niet gevonden")
+    return thread
+
+
+@router.get("/threads/{thread_id}/messages")
+def thread_messages(
+    thread_id: int,
+    before: Optional[int] = Query(None, ge=1, description="next_before van de vorige pagina"),
+    limit: int = Query(50, ge=1, le=100),
+    user: Principal = Depends(get_current_user),
+    s: Session = Depends(get_db),
+):
+    _own_thread(s, thread_id, user.id)
+    stmt = _message_select().where(PrivateMessage.thread_id == thread_id)
+    if before is not None:
+        stmt = stmt.where(PrivateMessage.id < before)
+    rows = s.execute(stmt.order_by(PrivateMessage.id.desc()).limit(limit)).all()
+    return {
+        "messages": [_message_out(r) for r in rows],
+        "next_before": rows[-1].id if len(rows) == limit else None,
+    }
+
+
+@router.post("/threads/{thread_id}/read")
+def mark_thread_read(
+    thread_id: int,
+    user: Principal = Depends(get_current_user),
+    s: Session = Depends(get_db),
+):
+    thread = _own_thread(s, thread_id, user.id)
+    if thread.user_low_id == user.id:
+        thread.unread_low = 0
+    if thread.user_high_id == user.id:
+        thread.unread_high = 0
+    s.execute(
+        update(PrivateMessage)
+        .where(
+            PrivateMessage.thread_id == thread_id,
+            PrivateMessage.receiver_id == user.id,
+            or_(PrivateMessage.read.is_(False), PrivateMessage.read.is_(None)),
+        )
+        .values(read=True)
+    )
+    s.commit()
+    return {"ok": True}
@@ -0,0 +1,131 @@
+"""Push-kanaal voor privéberichten (SSE), met Redis als backplane.
+
+* Elke open ``/api/dm/stream`` krijgt een begrensde ``asyncio.Queue`` in de
+  :class:`DMHub` van zijn worker, geïndexeerd op user-id.
+* ``send_dm`` roept na de commit :meth:`DMHub.publish` aan.  Met Redis gaat het
+  event via ``PUBLISH`` naar alle workers (ook deze); elke worker levert het
+  af bij zijn eigen lokale subscribers.  Zonder Redis (of als ``PUBLISH``
+  faalt) wordt enkel lokaal afgeleverd.
+* Een subscriber die niet bijbenen kan (volle queue) wordt losgekoppeld; de
+  browser herverbindt en haalt gemiste berichten op via ``Last-Event-ID``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Iterable, Optional
+
+from redis_client import RedisError, redis as _redis
+
+DM_CHANNEL = "dm:events"
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Sentinel in de queue: stream afsluiten (client moet herverbinden).
+CLOSE = object()
+
+
+class DMHub:
+    def __init__(self, redis=None):
+        self.redis = redis
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    # ---------- subscribers ----------
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        self._ensure_listener()
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            self._subscribers.pop(user_id, None)
+
+    def subscriber_count(self) -> int:
+        return sum(len(q) for q in self._subscribers.values())
+
+    # ---------- publish / deliver ----------
+    async def publish(self, user_ids: Iterable[int], event: dict) -> None:
+        payload = {"to": sorted(set(user_ids)), "event": event}
+        self.published += 1
+        if self.redis is not None:
+            try:
+                await self.redis.publish(DM_CHANNEL, json.dumps(payload))
+                return
+            except RedisError as exc:
+                print(f"⚠️  DM publish via Redis mislukt, enkel lokaal: {exc}")
+        self.deliver(payload["to"], event)
+
+    def deliver(self, user_ids: Iterable[int], event: dict) -> None:
+        for user_id in user_ids:
+            for queue in list(self._subscribers.get(user_id, ())):
+                try:
+                    queue.put_nowait(event)
+                    self.delivered += 1
+                except asyncio.QueueFull:
+                    # Trage client: loskoppelen i.p.v. geheugen op te stapelen.
+                    self.dropped += 1
+                    self.unsubscribe(user_id, queue)
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(CLOSE)
+
+    # ---------- Redis backplane ----------
+    def _ensure_listener(self) -> None:
+        if self.redis is None:
+            return
+        if self._listener is not None and not self._listener.done():
+            return
+        self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self) -> None:
+        backoff = 1.0
+        while self._subscribers:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(DM_CHANNEL)
+                backoff = 1.0
+                while self._subscribers:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=5.0)
+                    if not message:
+                        continue
+                    try:
+                        payload = json.loads(message["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    self.deliver(payload.get("to", ()), payload.get("event", {}))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"⚠️  DM backplane fout, opnieuw over {backoff:.0f}s: {exc}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscriber_count(),
+            "users": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "backplane": self.redis is not None,
+        }
+
+
+dm_hub = DMHub(_redis)
+
+
+__all__ = ["DMHub", "dm_hub", "CLOSE", "DM_CHANNEL"]
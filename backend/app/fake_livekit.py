@@ -0,0 +1,129 @@
+"""Lokale LiveKit-webhook-emitter voor tests en load-benchmarks.
+
+Bouwt events in hetzelfde JSON-formaat als de LiveKit-server en ondertekent
+ze zoals ``WebhookReceiver`` verwacht (JWT met ``sha256`` van de body).
+
+    python fake_livekit.py --url http://localhost:8000/api/livekit/webhook \\
+        --room luna --viewers 2000 --concurrency 100 --leave
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Optional
+
+from livekit.api import AccessToken
+
+
+def event_body(
+    kind: str,
+    room: str,
+    identity: Optional[str] = None,
+    *,
+    can_publish: bool = False,
+    created_at: Optional[int] = None,
+) -> str:
+    """JSON-body van één webhook-event (``room`` is de slug, zonder ``-room``)."""
+
+    event = {
+        "event": kind,
+        "id": f"EV_{uuid.uuid4().hex[:12]}",
+        "createdAt": str(created_at or int(time.time())),
+        "room": {"name": f"{room}-room"},
+    }
+    if identity is not None:
+        event["participant"] = {
+            "identity": identity,
+            "sid": f"PA_{uuid.uuid4().hex[:12]}",
+            "permission": {"canSubscribe": True, "canPublish": can_publish},
+        }
+    return json.dumps(event)
+
+
+def sign(body: str, api_key: str, api_secret: str) -> str:
+    digest = base64.b64encode(hashlib.sha256(body.encode()).digest()).decode()
+    return AccessToken(api_key, api_secret).with_sha256(digest).to_jwt()
+
+
+def signed_request(body: str, api_key: str, api_secret: str) -> dict:
+    """Headers zoals LiveKit ze meestuurt."""
+
+    return {
+        "Authorization": sign(body, api_key, api_secret),
+        "Content-Type": "application/webhook+json",
+    }
+
+
+async def _emit(client, url: str, bodies: list[str], api_key: str, api_secret: str, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    failures = 0
+
+    async def send(body: str) -> None:
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                url, content=body, headers=signed_request(body, api_key, api_secret)
+            )
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures += 1
+
+    await asyncio.gather(*(send(body) for body in bodies))
+    latencies.sort()
+    return latencies, failures
+
+
+def _report(label: str, latencies: list[float], failures: int) -> None:
+    if not latencies:
+        return
+
+    def pct(p: float) -> float:
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+
+    print(
+        f"{label}: {len(latencies)} events, {failures} fouten,"
+        f" p50={pct(0.5):.1f}ms p95={pct(0.95):.1f}ms p99={pct(0.99):.1f}ms"
+    )
+
+
+async def main() -> None:
+    import httpx
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000/api/livekit/webhook")
+    parser.add_argument("--room", required=True, help="room-slug (zonder -room)")
+    parser.add_argument("--viewers", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--leave", action="store_true", help="alle kijkers ook weer laten vertrekken")
+    parser.add_argument("--finish", action="store_true", help="afsluiten met room_finished")
+    parser.add_argument("--api-key", default=os.getenv("LIVEKIT_API_KEY", "johka_live_key"))
+    parser.add_argument("--api-secret", default=os.getenv("LIVEKIT_API_SECRET"))
+    args = parser.parse_args()
+    if not args.api_secret:
+        parser.error("LIVEKIT_API_SECRET of --api-secret is vereist")
+
+    identities = [f"bench-{i}" for i in range(args.viewers)]
+    async with httpx.AsyncClient(timeout=30) as client:
+        phases = [("joined", [event_body("participant_joined", args.room, i) for i in identities])]
+        if args.leave:
+            phases.append(("left", [event_body("participant_left", args.room, i) for i in identities]))
+        if args.finish:
+            phases.append(("finished", [event_body("room_finished", args.room)]))
+        for label, bodies in phases:
+            latencies, failures = await _emit(
+                client, args.url, bodies, args.api_key, args.api_secret, args.concurrency
+            )
+            _report(label, latencies, failures)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""Conditional GET voor publieke, veel gepollde endpoints.
+
+Elke response krijgt een sterke ``ETag`` (hash van de body, of een
+meegegeven validator) en een expliciete ``Cache-Control``.  Stuurt de client
+(of een CDN / reverse proxy) ``If-None-Match`` met dezelfde tag mee, dan komt
+er een lege ``304 Not Modified`` terug.
+
+Gebruik::
+
+    return cached_json(request, payload, max_age=5)
+    return cached_response(request, body, etag=etag, max_age=15)
+
+Kan de tag goedkoop uit een paar kolommen afgeleid worden, controleer dan
+eerst en bouw de body pas als de client hem echt nodig heeft::
+
+    etag = validator("room", row.id, row.version)
+    if (hit := not_modified(request, etag, max_age=5)) is not None:
+        return hit
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+
+def etag_for(body: bytes) -> str:
+    """Sterke ETag op basis van de inhoud (gelijk over workers en restarts)."""
+
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def validator(*parts: Any) -> str:
+    """Sterke ETag uit de waarden waarvan de representatie afhangt (ids, versies, ...)."""
+
+    return etag_for(json.dumps(parts, default=str, separators=(",", ":")).encode())
+
+
+def cache_control(
+    max_age: int,
+    *,
+    s_maxage: Optional[int] = None,
+    stale_while_revalidate: Optional[int] = None,
+    private: bool = False,
+) -> str:
+    parts = ["private" if private else "public", f"max-age={max_age}"]
+    if s_maxage is not None and not private:
+        parts.append(f"s-maxage={s_maxage}")
+    if stale_while_revalidate:
+        parts.append(f"stale-while-revalidate={stale_while_revalidate}")
+    return ", ".join(parts)
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    """True als de client deze representatie al heeft (RFC 9110 §13.1.2)."""
+
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/"x" matcht "x" (proxies maken tags soms zwak).
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+
+def _headers(etag: str, **cache) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control(**cache)}
+
+
+def not_modified(
+    request: Request,
+    etag: str,
+    *,
+    max_age: int = 0,
+    s_maxage: Optional[int] = None,
+    stale_while_revalidate: Optional[int] = None,
+    private: bool = False,
+) -> Optional[Response]:
+    """Lege 304 als de client ``etag`` al heeft, anders None (dan de body bouwen)."""
+
+    if not if_none_match(request, etag):
+        return None
+    headers = _headers(
+        etag,
+        max_age=max_age,
+        s_maxage=s_maxage,
+        stale_while_revalidate=stale_while_revalidate,
+        private=private,
+    )
+    return Response(status_code=304, headers=headers)
+
+
+def cached_response(
+    request: Request,
+    body: bytes,
+    *,
+    etag: Optional[str] = None,
+    max_age: int = 0,
+    s_maxage: Optional[int] = None,
+    stale_while_revalidate: Optional[int] = None,
+    private: bool = False,
+    media_type: str = "application/json",
+) -> Response:
+    etag = etag or etag_for(body)
+    headers = _headers(
+        etag,
+        max_age=max_age,
+        s_maxage=s_maxage,
+        stale_while_revalidate=stale_while_revalidate,
+        private=private,
+    )
+    if if_none_match(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def dumps(payload: Any) -> bytes:
+    return json.dumps(jsonable_encoder(payload), separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def cached_json(request: Request, payload: Any, **kwargs) -> Response:
+    return cached_response(request, dumps(payload), **kwargs)
+
+
+__all__ = [
+    "etag_for",
+    "validator",
+    "cache_control",
+    "if_none_match",
+    "not_modified",
+    "cached_response",
+    "cached_json",
+    "dumps",
+]
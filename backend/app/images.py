@@ -0,0 +1,352 @@
+"""Beeldverwerking (decode, valideren, GIF-encoding) via een aparte pool.
+
+PIL houdt de GIL vast tijdens decode/encode; een geanimeerde GIF uit een
+handvol frames kost al snel honderden ms.  Op de event loop blokkeert dat
+elke andere request van die worker.  De jobs hieronder draaien daarom in een
+begrensde (standaard process-)pool: een volle wachtrij geeft een 503 en
+``/api/admin/workers`` toont de doorlooptijden.
+
+Alle jobs zijn top-level functies met paden/bytes als argumenten, zodat ze
+naar een gespawned child process gepickled kunnen worden.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+import re
+from io import BytesIO
+from typing import Optional
+from uuid import uuid4
+
+from PIL import Image, ImageOps
+
+from workers import BoundedPool
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "0")) or min(os.cpu_count() or 1, 4)
+IMAGE_MAX_QUEUE = int(os.getenv("IMAGE_MAX_QUEUE", "32"))
+IMAGE_JOB_TIMEOUT = float(os.getenv("IMAGE_JOB_TIMEOUT", "30"))
+
+GIF_FRAME_MS = 500
+
+image_pool = BoundedPool(
+    "images",
+    max_workers=IMAGE_WORKERS,
+    max_queue=IMAGE_MAX_QUEUE,
+    kind=os.getenv("IMAGE_EXECUTOR", "process"),
+    timeout=IMAGE_JOB_TIMEOUT,
+)
+
+
+EXTENSIONS = {"JPEG": "jpg", "GIF": "gif", "PNG": "png", "WEBP": "webp"}
+
+# Varianten per preview, één keer gemaakt bij ingest: (breedte, extensie).
+# Het origineel (320x240 uit room.js) dient als grootste JPEG.
+PREVIEW_VARIANTS = ((160, "jpg"), (240, "jpg"), (160, "webp"), (240, "webp"), (320, "webp"))
+PREVIEW_FULL_WIDTH = 320
+PREVIEW_JPEG_QUALITY = 70
+PREVIEW_WEBP_QUALITY = 60
+# Previews/frames zijn ~320x240; alles boven deze grens wordt niet gedecodeerd.
+PREVIEW_MAX_PIXELS = int(os.getenv("PREVIEW_MAX_PIXELS", str(4_000_000)))
+PREVIEW_FORMATS = ("JPEG", "GIF")
+FRAME_FORMATS = ("JPEG", "PNG", "WEBP", "GIF")
+_PREVIEW_RE = re.compile(r"^\d+-[0-9a-f]{16}\.(jpg|gif)$")
+
+# Avatars en galerijfoto's: vaste renditions, altijd JPEG, zonder metadata.
+# (breedte, hoogte) van het hoofdbestand; None = zijde vrij binnen het kader.
+AVATAR_SIZE = (256, 256)
+AVATAR_VARIANTS = ((96, "jpg"),)
+GALLERY_SIZE = (1280, 1280)
+GALLERY_VARIANTS = ((480, "jpg"),)
+UPLOAD_FORMATS = ("JPEG", "PNG", "WEBP", "GIF")
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", str(40_000_000)))
+UPLOAD_JPEG_QUALITY = 82
+_UPLOAD_RE = re.compile(r"^\d+-[0-9a-f]{16}\.jpg$")
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+# ---------- previews: content-addressed, twee generaties per live room ----------
+def preview_name(user_id: int, path: str, ext: str) -> str:
+    """``{user_id}-{digest}.{ext}``: zelfde beeld = zelfde naam, nooit botsingen tussen rooms."""
+
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b""):
+            digest.update(chunk)
+    return f"{user_id}-{digest.hexdigest()}.{ext}"
+
+
+def _commit_preview(
+    tmp_path: str, preview_dir: str, user_id: int, ext: str, previous: Optional[str]
+) -> str:
+    """Zet ``tmp_path`` op zijn definitieve naam (met varianten).
+
+    De vorige preview blijft staan: ``_set_live_snapshot`` (room.py) bewaart
+    één generatie en ruimt pas de preview van twee uploads terug op.
+    """
+
+    filename = preview_name(user_id, tmp_path, ext)
+    dest = os.path.join(preview_dir, filename)
+    os.replace(tmp_path, dest)
+    if filename != previous:
+        _write_variants(dest, preview_dir, filename)
+    return filename
+
+
+def preview_variants(filename: Optional[str]) -> list[tuple[str, int, str]]:
+    """``[(bestandsnaam, breedte, extensie), ...]`` van een preview; leeg voor oude namen."""
+
+    if not filename or not _PREVIEW_RE.match(filename):
+        return []
+    stem = filename.rsplit(".", 1)[0]
+    return [(f"{stem}-{width}w.{ext}", width, ext) for width, ext in PREVIEW_VARIANTS]
+
+
+def _write_variants(src_path: str, preview_dir: str, filename: str) -> None:
+    with Image.open(src_path) as img:
+        # Bij een GIF volstaat het eerste frame voor de grid.
+        base = ImageOps.exif_transpose(img).convert("RGB")
+    for name, width, ext in preview_variants(filename):
+        variant = base.copy()
+        variant.thumbnail((width, width * 3 // 4), Image.LANCZOS)
+        tmp_path = os.path.join(preview_dir, f".upload-{uuid4().hex}.part")
+        if ext == "webp":
+            variant.save(tmp_path, "WEBP", quality=PREVIEW_WEBP_QUALITY, method=4)
+        else:
+            variant.save(tmp_path, "JPEG", quality=PREVIEW_JPEG_QUALITY, optimize=True, progressive=True)
+        os.replace(tmp_path, os.path.join(preview_dir, name))
+
+
+def remove_preview(preview_dir: str, filename: Optional[str]) -> None:
+    if not filename or os.path.basename(filename) != filename:
+        return
+    for name in [filename] + [v[0] for v in preview_variants(filename)]:
+        try:
+            os.remove(os.path.join(preview_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+# ---------- avatars / galerij: content-addressed renditions ----------
+def upload_variants(kind: str, filename: Optional[str]) -> list[tuple[str, int, str]]:
+    """Kleinere renditions van een avatar/galerijfoto; leeg voor oude namen."""
+
+    if not filename or not _UPLOAD_RE.match(filename):
+        return []
+    stem = filename.rsplit(".", 1)[0]
+    variants = AVATAR_VARIANTS if kind == "avatar" else GALLERY_VARIANTS
+    return [(f"{stem}-{width}w.{ext}", width, ext) for width, ext in variants]
+
+
+def remove_upload(dest_dir: str, kind: str, filename: Optional[str]) -> None:
+    if not filename or os.path.basename(filename) != filename or not _UPLOAD_RE.match(filename):
+        return
+    for name in [filename] + [v[0] for v in upload_variants(kind, filename)]:
+        try:
+            os.remove(os.path.join(dest_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    """RGB zonder alpha (transparantie op wit), EXIF-oriëntatie toegepast."""
+
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, "white")
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def _render(img: Image.Image, size: tuple[int, int], crop: bool) -> Image.Image:
+    if crop:
+        return ImageOps.fit(img, size, Image.LANCZOS)
+    img = img.copy()
+    img.thumbnail(size, Image.LANCZOS)
+    return img
+
+
+def _save_jpeg(img: Image.Image, path: str) -> None:
+    # Nieuw bestand uit pixels: geen exif/icc/xmp mee (GPS, toestel, ...).
+    tmp_path = os.path.join(os.path.dirname(path), f".upload-{uuid4().hex}.part")
+    img.save(tmp_path, "JPEG", quality=UPLOAD_JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+
+
+def _check_size(img: Image.Image, max_pixels: int) -> None:
+    if img.width * img.height > max_pixels:
+        raise InvalidImage("Afbeelding te groot")
+
+
+def _validate_preview(src_path: str, formats: tuple[str, ...]) -> str:
+    """Formaat van ``src_path`` na ``verify()``; bij een fout weg ermee en ``InvalidImage``."""
+
+    try:
+        with Image.open(src_path) as img:
+            fmt = img.format
+            if fmt not in formats:
+                raise InvalidImage(f"Formaat {fmt} niet toegestaan")
+            _check_size(img, PREVIEW_MAX_PIXELS)
+            img.verify()
+    except Exception as exc:
+        os.remove(src_path)
+        if isinstance(exc, InvalidImage):
+            raise
+        # Ook Image.DecompressionBombError: nooit een 500.
+        raise InvalidImage(f"Ongeldige afbeelding: {exc}") from exc
+    return fmt
+
+
+# ---------- jobs (draaien in de pool) ----------
+def store_preview(
+    src_path: str,
+    preview_dir: str,
+    user_id: int,
+    formats: tuple[str, ...],
+    previous: Optional[str] = None,
+) -> str:
+    """Valideer een geüploade preview en sla ze op; geeft de bestandsnaam terug."""
+
+    fmt = _validate_preview(src_path, formats)
+    return _commit_preview(src_path, preview_dir, user_id, EXTENSIONS[fmt], previous)
+
+
+def store_upload_image(src_path: str, dest_dir: str, user_id: int, kind: str) -> tuple[str, bool]:
+    """Avatar (``kind="avatar"``) of galerijfoto valideren en normaliseren.
+
+    Naam ``{user_id}-{sha256[:16]}.jpg`` van de geüploade bytes: dezelfde foto
+    opnieuw uploaden levert hetzelfde bestand op zonder opnieuw te decoderen.
+    Geeft ``(bestandsnaam, nieuw)`` terug; ``src_path`` wordt altijd opgeruimd.
+    """
+
+    try:
+        digest = hashlib.sha256()
+        with open(src_path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(64 * 1024), b""):
+                digest.update(chunk)
+        filename = f"{user_id}-{digest.hexdigest()[:16]}.jpg"
+        dest = os.path.join(dest_dir, filename)
+        if os.path.exists(dest):
+            return filename, False
+
+        try:
+            with Image.open(src_path) as img:
+                if img.format not in UPLOAD_FORMATS:
+                    raise InvalidImage(f"Formaat {img.format} niet toegestaan")
+                if img.width * img.height > UPLOAD_MAX_PIXELS:
+                    raise InvalidImage("Afbeelding te groot")
+                img.load()
+                base = _flatten(img)
+        except InvalidImage:
+            raise
+        except Exception as exc:
+            raise InvalidImage(f"Ongeldige afbeelding: {exc}") from exc
+
+        crop = kind == "avatar"
+        size = AVATAR_SIZE if crop else GALLERY_SIZE
+        # Varianten eerst: het hoofdbestand is de "klaar"-markering voor de dedupe.
+        for name, width, _ext in upload_variants(kind, filename):
+            target = (width, width) if crop else (width, width * size[1] // size[0])
+            _save_jpeg(_render(base, target, crop), os.path.join(dest_dir, name))
+        _save_jpeg(_render(base, size, crop), dest)
+        return filename, True
+    finally:
+        try:
+            os.remove(src_path)
+        except FileNotFoundError:
+            pass
+
+
+def store_data_url_preview(
+    data_url: str, preview_dir: str, user_id: int, previous: Optional[str] = None
+) -> str:
+    """Base64 (data-URL of kaal) decoderen en als preview opslaan."""
+
+    _header, _, encoded = data_url.partition(",")
+    try:
+        data = base64.b64decode(encoded or data_url)
+    except Exception as exc:
+        raise InvalidImage("Invalid image data") from exc
+    tmp_path = os.path.join(preview_dir, f".upload-{uuid4().hex}.part")
+    with open(tmp_path, "wb") as fh:
+        fh.write(data)
+    # Zelfde controle als store_preview; de extensie volgt het echte formaat.
+    fmt = _validate_preview(tmp_path, PREVIEW_FORMATS)
+    return _commit_preview(tmp_path, preview_dir, user_id, EXTENSIONS[fmt], previous)
+
+
+def _load_frame(source) -> Image.Image:
+    try:
+        with Image.open(source) as img:
+            if img.format not in FRAME_FORMATS:
+                raise InvalidImage(f"Formaat {img.format} niet toegestaan")
+            _check_size(img, PREVIEW_MAX_PIXELS)
+            return img.convert("RGB")
+    except InvalidImage:
+        raise
+    except Exception as exc:
+        raise InvalidImage(f"Ongeldig frame: {exc}") from exc
+
+
+def _decode_frame(data_url) -> Image.Image:
+    """Frame uit de JSON-body: altijd base64 (data-URL of kaal), nooit een pad."""
+
+    if not isinstance(data_url, str):
+        raise InvalidImage("Ongeldig frame")
+    _header, _, encoded = data_url.partition(",")
+    try:
+        data = base64.b64decode(encoded or data_url, validate=True)
+    except Exception as exc:
+        raise InvalidImage(f"Ongeldig frame: {exc}") from exc
+    return _load_frame(BytesIO(data))
+
+
+def build_gif_preview(
+    paths: list[str],
+    data_urls: list[str],
+    preview_dir: str,
+    user_id: int,
+    previous: Optional[str] = None,
+) -> str:
+    """Geanimeerde GIF als preview opslaan.
+
+    ``paths`` zijn tijdelijke bestanden van de multipart-upload; ``data_urls``
+    komen uit de JSON-body en worden enkel als base64 gedecodeerd.
+    """
+
+    frames = []
+    loaders = [(_load_frame, path) for path in paths] + [(_decode_frame, url) for url in data_urls]
+    for load, source in loaders:
+        try:
+            frames.append(load(source))
+        except InvalidImage as exc:
+            print("Frame fout:", exc)
+    if not frames:
+        raise InvalidImage("Geen geldige frames ontvangen")
+    tmp_path = os.path.join(preview_dir, f".upload-{uuid4().hex}.part")
+    frames[0].save(
+        tmp_path, format="GIF", save_all=True, append_images=frames[1:], duration=GIF_FRAME_MS, loop=0
+    )
+    return _commit_preview(tmp_path, preview_dir, user_id, "gif", previous)
+
+
+__all__ = [
+    "image_pool",
+    "InvalidImage",
+    "preview_name",
+    "preview_variants",
+    "PREVIEW_FULL_WIDTH",
+    "remove_preview",
+    "store_preview",
+    "store_upload_image",
+    "upload_variants",
+    "remove_upload",
+    "store_data_url_preview",
+    "build_gif_preview",
+]
@@ -0,0 +1,268 @@
+"""In-memory directory van wie er live is, voor ``/api/public/streams``.
+
+De homepage pollt die lijst van elke bezoeker.  In plaats van telkens
+``live_sessions JOIN users ORDER BY started_at`` te draaien, houdt elke worker
+de lijst zelf bij en bewaart hij de JSON-body voorgeserialiseerd:
+
+* ``go_live`` / ``end_live``, snapshot-uploads en de viewer-tellers passen
+  de directory in-place aan (en verhogen ``version``);
+* een read kost dan geen query, enkel het teruggeven van de gecachte bytes;
+* de database wordt enkel gelezen bij een koude start, na ``invalidate()``
+  of na ``LIVE_DIRECTORY_MAX_AGE`` seconden.  Dat laatste houdt workers die de
+  wijziging niet zelf afhandelden (meerdere uvicorn-workers) bij.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+
+from database import engine
+from http_cache import etag_for
+from images import PREVIEW_FULL_WIDTH, preview_variants
+
+LIVE_DIRECTORY_MAX_AGE = float(os.getenv("LIVE_DIRECTORY_MAX_AGE", "30"))
+
+PREVIEW_BASE_URL = "https://api.johka.be/static/uploads/previews"
+
+# Getoond zolang niemand live is (of de tabel nog niet bestaat).
+DEMO_STREAMS = [
+    {
+        "username": "Luna",
+        "room": "luna-room",
+        "snapshot": None,
+        "preview_url": "https://picsum.photos/seed/luna/400/300",
+        "thumb": "https://picsum.photos/seed/luna/400/300",
+        "viewers": 48,
+    },
+    {
+        "username": "Bruno",
+        "room": "bruno-room",
+        "snapshot": None,
+        "preview_url": "https://picsum.photos/seed/bruno/400/300",
+        "thumb": "https://picsum.photos/seed/bruno/400/300",
+        "viewers": 112,
+    },
+    {
+        "username": "Milan",
+        "room": "milan-room",
+        "snapshot": None,
+        "preview_url": "https://picsum.photos/seed/milan/400/300",
+        "thumb": "https://picsum.photos/seed/milan/400/300",
+        "viewers": 23,
+    },
+]
+
+
+def preview_url(filename: Optional[str]) -> Optional[str]:
+    if not filename:
+        return None
+    return f"{PREVIEW_BASE_URL}/{filename}"
+
+
+def preview_srcset(filename: Optional[str]) -> Optional[dict]:
+    """``srcset``-strings per formaat plus een kleine ``thumb``; None voor oude previews.
+
+    ``{"jpeg": "…-160w.jpg 160w, …-240w.jpg 240w, ….jpg 320w",
+    "webp": "…-160w.webp 160w, …", "thumb": "…-160w.jpg"}``
+    """
+
+    variants = preview_variants(filename)
+    if not variants:
+        return None
+    sets: dict[str, list[str]] = {"jpeg": [], "webp": []}
+    for name, width, ext in variants:
+        sets["jpeg" if ext == "jpg" else "webp"].append(f"{PREVIEW_BASE_URL}/{name} {width}w")
+    if filename.endswith(".jpg"):
+        sets["jpeg"].append(f"{preview_url(filename)} {PREVIEW_FULL_WIDTH}w")
+    return {
+        "jpeg": ", ".join(sets["jpeg"]),
+        "webp": ", ".join(sets["webp"]),
+        "thumb": f"{PREVIEW_BASE_URL}/{variants[0][0]}",
+    }
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, str):
+        # SQLite geeft DATETIME via text() als string terug.
+        value = datetime.fromisoformat(value)
+    return value.timestamp() if value else 0.0
+
+
+class LiveDirectory:
+    """Thread-safe lijst van open live-sessies met gecachte JSON-body."""
+
+    def __init__(self, max_age: float = LIVE_DIRECTORY_MAX_AGE):
+        self.max_age = max_age
+        self.version = 0
+        self.rebuilds = 0
+        self._entries: dict[int, dict] = {}
+        self._body: Optional[bytes] = None
+        self._etag = ""
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    # ---------- lezen ----------
+    def body(self) -> tuple[bytes, int]:
+        """Geef ``(json_bytes, version)``; herbouwt enkel als koud of verouderd."""
+
+        body, _etag, version = self._current()
+        return body, version
+
+    def current(self) -> tuple[bytes, str]:
+        """Geef ``(json_bytes, etag)``; de ETag wordt één keer per wijziging berekend."""
+
+        body, etag, _version = self._current()
+        return body, etag
+
+    def _current(self) -> tuple[bytes, str, int]:
+        if self._stale():
+            with self._rebuild_lock:
+                # Single-flight: wie op de lock wachtte, ziet de verse lijst.
+                if self._stale():
+                    self.rebuild()
+        with self._lock:
+            if self._body is None:
+                self._body = self._serialize()
+                self._etag = etag_for(self._body)
+            return self._body, self._etag, self.version
+
+    def _stale(self) -> bool:
+        return not self._loaded_at or time.monotonic() - self._loaded_at > self.max_age
+
+    def _serialize(self) -> bytes:
+        entries = sorted(self._entries.values(), key=lambda e: e["started_at"], reverse=True)
+        streams = [
+            {
+                "username": e["username"],
+                "room": e["room"],
+                "viewers": e["viewers"],
+                "snapshot": e["snapshot"],
+                "preview_url": preview_url(e["snapshot"]) or e["thumb"],
+                "preview_srcset": preview_srcset(e["snapshot"]),
+                "thumb": e["thumb"],
+            }
+            for e in entries
+        ]
+        return json.dumps(streams or DEMO_STREAMS).encode()
+
+    # ---------- koude rebuild ----------
+    def rebuild(self) -> None:
+        version_before = self.version
+        try:
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    text(
+                        """
+                    SELECT s.user_id,
+                           u.username,
+                           s.room_slug AS room,
+                           COALESCE(s.viewers, 0) AS viewers,
+                           s.snapshot,
+                           s.started_at,
+                           COALESCE(u.avatar_url, '') AS avatar_url
+                      FROM live_sessions s
+                      JOIN users u ON u.id = s.user_id
+                     WHERE s.ended_at IS NULL
+                    """
+                    )
+                ).mappings().all()
+        except Exception as exc:
+            print(f"⚠️  Live directory rebuild mislukt: {exc}")
+            rows = []
+
+        entries = {
+            r["user_id"]: self._entry(
+                r["username"],
+                r["room"],
+                r["avatar_url"],
+                viewers=r["viewers"],
+                snapshot=r["snapshot"],
+                started_at=_timestamp(r["started_at"]),
+            )
+            for r in rows
+        }
+        with self._lock:
+            self._entries = entries
+            self._body = None
+            self.version += 1
+            self.rebuilds += 1
+            # Kwam er tijdens de query een wijziging binnen, dan kan die in de
+            # resultaten ontbreken: bij de volgende read opnieuw laden.
+            self._loaded_at = time.monotonic() if self.version == version_before + 1 else 0.0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = 0.0
+
+    # ---------- in-place updates ----------
+    @staticmethod
+    def _entry(username, room, avatar_url, *, viewers=0, snapshot=None, started_at=None) -> dict:
+        return {
+            "username": username,
+            "room": room,
+            "viewers": viewers,
+            "snapshot": snapshot,
+            "thumb": avatar_url or f"https://picsum.photos/seed/{username}/400/300",
+            "started_at": started_at if started_at is not None else time.time(),
+        }
+
+    def _changed(self) -> None:
+        self._body = None
+        self.version += 1
+
+    def start(self, user_id: int, username: str, room: str, avatar_url: Optional[str] = None) -> None:
+        with self._lock:
+            self._entries[user_id] = self._entry(username, room, avatar_url)
+            self._changed()
+
+    def end(self, user_id: int) -> None:
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._changed()
+
+    def set_snapshot(self, user_id: int, filename: str) -> None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry["snapshot"] = filename
+                self._changed()
+
+    def adjust_viewers(self, room: str, delta: int) -> None:
+        with self._lock:
+            for entry in self._entries.values():
+                if entry["room"] == room:
+                    entry["viewers"] = max(entry["viewers"] + delta, 0)
+                    self._changed()
+                    break
+
+    def set_viewers(self, room: str, viewers: int) -> None:
+        with self._lock:
+            for entry in self._entries.values():
+                if entry["room"] == room:
+                    if entry["viewers"] != viewers:
+                        entry["viewers"] = viewers
+                        self._changed()
+                    break
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "live": len(self._entries),
+                "version": self.version,
+                "rebuilds": self.rebuilds,
+                "age_s": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            }
+
+
+live_directory = LiveDirectory()
+
+
+__all__ = ["LiveDirectory", "live_directory", "preview_url", "preview_srcset", "DEMO_STREAMS"]
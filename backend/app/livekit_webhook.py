@@ -0,0 +1,276 @@
+"""Server-side presence via de LiveKit-webhook.
+
+LiveKit stuurt bij elke join/leave een ondertekende POST (JWT in
+``Authorization`` met de sha256 van de body).  Dat vervangt de
+``/api/room/view-start``/``view-end``-pings van de browser en klopt ook als
+een tab crasht: LiveKit ziet de verbinding wegvallen.
+
+* ``participant_joined`` / ``participant_left`` van kijkers (geen publish-
+  recht) worden per ``(room, identity)`` samengevoegd in een buffer;
+* ``room_finished`` sluit de live-sessie af;
+* een flusher schrijft de buffer om de ``LIVEKIT_WEBHOOK_FLUSH_SECONDS`` in één
+  transactie weg en telt ``viewers`` / ``unique_viewers`` opnieuw uit
+  ``live_viewers`` (geen drift).
+
+Er is altijd precies één bron van kijkers, anders telt één persoon dubbel
+(een rij per IP via view-start plus een rij per identity via de webhook).
+Met ``LIVEKIT_WEBHOOK_PRESENCE=1`` is dat de webhook en worden
+``view-start``/``view-end`` no-ops; zonder de vlag worden de events na de
+handtekeningcontrole genegeerd.  Zie ``fake_livekit.py`` voor een lokale
+emitter.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from livekit.api import TokenVerifier, WebhookReceiver
+from sqlalchemy import bindparam, text
+
+from database import async_session
+from live_directory import live_directory
+from viewer_presence import viewer_presence, write_viewer_states
+
+LIVEKIT_WEBHOOK_PRESENCE = os.getenv("LIVEKIT_WEBHOOK_PRESENCE", "0") == "1"
+LIVEKIT_WEBHOOK_FLUSH_SECONDS = float(os.getenv("LIVEKIT_WEBHOOK_FLUSH_SECONDS", "1"))
+
+VIEWER_EVENTS = {"participant_joined", "participant_left"}
+
+router = APIRouter(prefix="/api/livekit", tags=["LiveKit"])
+
+_receiver: Optional[WebhookReceiver] = None
+
+
+def _get_receiver() -> WebhookReceiver:
+    global _receiver
+    if _receiver is None:
+        _receiver = WebhookReceiver(
+            TokenVerifier(
+                os.getenv("LIVEKIT_API_KEY", "johka_live_key"),
+                os.getenv("LIVEKIT_API_SECRET"),
+            )
+        )
+    return _receiver
+
+
+def room_slug(room_name: str) -> str:
+    return room_name[: -len("-room")] if room_name.endswith("-room") else room_name
+
+
+class PresenceBatcher:
+    """Buffer van webhook-events, periodiek samengevoegd weggeschreven."""
+
+    def __init__(self, flush_interval: float = LIVEKIT_WEBHOOK_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self._viewers: dict[tuple[str, str], dict] = {}
+        self._finished: dict[str, datetime] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.received = 0
+        self.ignored = 0
+        self.flushes = 0
+        self.flushed_events = 0
+        self.flush_errors = 0
+
+    # ---------- buffer ----------
+    def add(self, kind: str, room: str, identity: str = "", ts: Optional[float] = None) -> None:
+        at = datetime.utcfromtimestamp(ts or time.time())
+        self.received += 1
+        if kind == "room_finished":
+            self._finished[room] = at
+        elif kind in VIEWER_EVENTS:
+            state = self._viewers.setdefault((room, identity), {"joined": None, "left": None})
+            if kind == "participant_joined":
+                # Webhooks kunnen in een andere volgorde aankomen: laatste telt.
+                if state["left"] is not None and state["left"] > at:
+                    state["joined"] = state["joined"] or at
+                else:
+                    state["joined"], state["left"] = at, None
+            elif state["joined"] is None or state["joined"] <= at:
+                state["left"] = at
+        self._ensure_flusher()
+
+    def pending(self) -> int:
+        return len(self._viewers) + len(self._finished)
+
+    # ---------- flusher ----------
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and not self._flusher.done():
+            return
+        self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while self.pending():
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.flush_errors += 1
+                print(f"⚠️  LiveKit presence flush mislukt: {exc}")
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            viewers, self._viewers = self._viewers, {}
+            finished, self._finished = self._finished, {}
+            if not viewers and not finished:
+                return 0
+            try:
+                touched = await self._write(viewers, finished)
+            except Exception:
+                # Terugzetten; nieuwere events voor dezelfde sleutel winnen.
+                for key, state in viewers.items():
+                    self._viewers.setdefault(key, state)
+                for room, at in finished.items():
+                    self._finished.setdefault(room, at)
+                raise
+
+        for room, count in touched:
+            live_directory.set_viewers(room, count)
+        self.flushes += 1
+        self.flushed_events += len(viewers) + len(finished)
+        return len(viewers) + len(finished)
+
+    async def _write(self, viewers: dict, finished: dict) -> list[tuple[str, int]]:
+        rooms = {room for room, _identity in viewers} | set(finished)
+        async with async_session() as s:
+            open_sessions = (
+                await s.execute(
+                    text(
+                        "SELECT id, user_id, room_slug FROM live_sessions"
+                        " WHERE ended_at IS NULL AND room_slug IN :rooms"
+                    ).bindparams(bindparam("rooms", expanding=True)),
+                    {"rooms": sorted(rooms)},
+                )
+            ).all()
+            by_room = {r.room_slug: r for r in open_sessions}
+
+            # Events voor rooms zonder open sessie (nog niet live, al gestopt) vallen weg.
+            await write_viewer_states(
+                s,
+                {
+                    (by_room[room].id, identity): state
+                    for (room, identity), state in viewers.items()
+                    if room in by_room
+                },
+            )
+
+            ended = [
+                {"sid": by_room[room].id, "at": at} for room, at in finished.items() if room in by_room
+            ]
+            if ended:
+                await s.execute(
+                    text(
+                        "UPDATE live_viewers SET left_at = :at"
+                        " WHERE session_id = :sid AND left_at IS NULL"
+                    ),
+                    ended,
+                )
+                await s.execute(
+                    text("UPDATE live_sessions SET ended_at = :at, viewers = 0 WHERE id = :sid"),
+                    ended,
+                )
+
+            live = sorted(r.id for room, r in by_room.items() if room not in finished)
+            counts = []
+            if live:
+                await s.execute(
+                    text(
+                        """
+                    UPDATE live_sessions
+                       SET viewers = (SELECT COUNT(*) FROM live_viewers v
+                                       WHERE v.session_id = live_sessions.id
+                                         AND v.left_at IS NULL),
+                           unique_viewers = (SELECT COUNT(*) FROM live_viewers v
+                                              WHERE v.session_id = live_sessions.id)
+                     WHERE id IN :ids
+                    """
+                    ).bindparams(bindparam("ids", expanding=True)),
+                    {"ids": live},
+                )
+                counts = (
+                    await s.execute(
+                        text("SELECT room_slug, viewers FROM live_sessions WHERE id IN :ids").bindparams(
+                            bindparam("ids", expanding=True)
+                        ),
+                        {"ids": live},
+                    )
+                ).all()
+            await s.commit()
+
+        for room in finished:
+            viewer_presence.forget(room)
+            if room in by_room:
+                live_directory.end(by_room[room].user_id)
+        return [(r.room_slug, r.viewers) for r in counts]
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._flusher = None
+        try:
+            await self.flush()
+        except Exception as exc:
+            print(f"⚠️  Laatste LiveKit presence flush mislukt: {exc}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": LIVEKIT_WEBHOOK_PRESENCE,
+            "received": self.received,
+            "ignored": self.ignored,
+            "pending": self.pending(),
+            "flushes": self.flushes,
+            "flushed_events": self.flushed_events,
+            "flush_errors": self.flush_errors,
+        }
+
+
+presence_batcher = PresenceBatcher()
+
+
+@router.post("/webhook")
+async def livekit_webhook(request: Request):
+    body = (await request.body()).decode()
+    auth = request.headers.get("authorization", "")
+    try:
+        event = _get_receiver().receive(body, auth.removeprefix("Bearer ").strip())
+    except Exception:
+        raise HTTPException(status_code=401, detail="Ongeldige webhook-handtekening")
+
+    if not LIVEKIT_WEBHOOK_PRESENCE:
+        # view-start/view-end zijn de bron; LiveKit niet laten herproberen.
+        presence_batcher.ignored += 1
+        return {"ok": True, "ignored": True}
+
+    if event.event in VIEWER_EVENTS:
+        participant = event.participant
+        # Publishers (de creator zelf) tellen niet als kijker.
+        if not participant.permission.can_publish:
+            presence_batcher.add(
+                event.event,
+                room_slug(event.room.name),
+                participant.identity[:64],
+                event.created_at or None,
+            )
+    elif event.event == "room_finished":
+        presence_batcher.add("room_finished", room_slug(event.room.name), ts=event.created_at or None)
+    return {"ok": True}
+
+
+__all__ = [
+    "router",
+    "presence_batcher",
+    "PresenceBatcher",
+    "LIVEKIT_WEBHOOK_PRESENCE",
+    "room_slug",
+]
@@ -3,50 +3,54 @@
 # JOHKA LIVE - COMPLETE BACKEND (STABLE)
 # ============================================
 
+import json
 import os
 from uuid import uuid4
 import re
 import time
-import shutil
 from datetime import datetime, date
 from typing import Optional, List
+from urllib.parse import urlsplit
 
 from dotenv import load_dotenv
-from bcrypt import hashpw, gensalt
 from admin import router as admin_router
 
-from database import Base, SessionLocal, engine, get_db
-from models import RoomDB, Tip, UserDB, Wallet, WalletHistory
+from database import Base, SessionLocal, engine, get_async_db, get_db
+from models import LiveSession, RoomDB, Tip, UserDB, Wallet, WalletHistory
 
 
 # ---------- FastAPI & Security ----------
 from fastapi import (
     FastAPI, Depends, HTTPException, status, Header,
-    UploadFile, File, Request
+    Request, Query
 )
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
-from starlette.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
 # ---------- DB ----------
-import psycopg2
 from sqlalchemy import (
+    select,
     text,
     or_,
     Text,
 )
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy.exc import IntegrityError
 
 # ---------- Auth / Hashing ----------
-from passlib.context import CryptContext
-from jose import jwt, JWTError
+from jose import jwt
+from images import InvalidImage, image_pool, remove_upload, store_upload_image, upload_variants
+from passwords import hash_password_async, password_pool, verify_password_async
 from pydantic import BaseModel, EmailStr
 
 
 # ---------- LiveKit ----------
 #   pip install livekit-api
 #from livekit import AccessToken, VideoGrant
-from fastapi.staticfiles import StaticFiles
+from static_files import UploadStaticFiles, static_url
+from uploads import discard, receive_files, sniff_image
 
 load_dotenv()
 
@@ -74,19 +78,6 @@ app.include_router(dm_router)
 JWT_SECRET = _get_env("JWT_SECRET", "MyUltraSecretKey")
 JWT_ALGORITHM = "HS256"
 
-# DB (Docker service 'postgres' in compose)
-POSTGRES_USER = _get_env("POSTGRES_USER", "johka")
-POSTGRES_PASSWORD = _get_env("POSTGRES_PASSWORD", required=True)
-POSTGRES_HOST = _get_env("POSTGRES_HOST", "postgres")
-POSTGRES_PORT = _get_env("POSTGRES_PORT", "5432")
-POSTGRES_DB = _get_env("POSTGRES_DB", "johka")
-
-
-PSYCOPG_URL = _get_env("PSYCOPG_URL") or (
-    f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@"
-    f"{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-)
-
 # LiveKit
 LIVEKIT_API_KEY = _get_env("LIVEKIT_API_KEY", "johka_live_key")
 LIVEKIT_API_SECRET = _get_env("LIVEKIT_API_SECRET", required=True)
@@ -102,10 +93,8 @@ os.makedirs(AVATAR_DIR, exist_ok=True)
 os.makedirs(GALLERY_DIR, exist_ok=True)
 os.makedirs(PREVIEW_DIR, exist_ok=True)
 
-def _preview_url(filename: Optional[str]) -> Optional[str]:
-    if not filename:
-        return None
-    return f"https://api.johka.be/static/uploads/previews/{filename}"
+from http_cache import cached_json, cached_response, not_modified, validator
+from live_directory import live_directory, preview_srcset as _preview_srcset, preview_url as _preview_url
 
 ADMIN_KEY = _get_env("ADMIN_KEY", required=True)
 
@@ -138,13 +127,12 @@ app.add_middleware(
     expose_headers=["*"],  # 👈 belangrijk: laat JS de response lezen
 )
 # 👇 serveer statische bestanden (previews, avatars, ...)
-app.mount("/static", StaticFiles(directory="/app/static"), name="static")
+#    immutable caching + optionele X-Accel-Redirect, zie static_files.py
+app.mount("/static", UploadStaticFiles(directory="/app/static"), name="static")
 
 # ============================================
 # DATABASE
 # ============================================
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 db = get_db
 
 # ============================================
@@ -184,14 +172,6 @@ class TipIn(BaseModel):
 # ============================================
 # HELPERS
 # ============================================
-def hash_password(p: str) -> str:
-    return pwd_ctx.hash(p)
-
-
-def verify_password(p: str, h: str) -> bool:
-    return pwd_ctx.verify(p, h)
-
-
 def slugify(s: str) -> str:
     s = s.lower()
     s = re.sub(r"[^a-z0-9]+", "-", s).strip("-")
@@ -251,101 +231,44 @@ def generate_jwt_token(user: "UserDB") -> str:
     return create_access_token({"sub": str(user.id), "username": user.username})
 
 
-def _psql():
-    return psycopg2.connect(PSYCOPG_URL)
+# ============================================
+# AUTH – get_current_user (gedeelde resolver + cache in auth.py)
+# ============================================
+from auth import Principal, get_current_user, invalidate_user
+from maintenance import maintenance
+from migrations import startup_check
+from viewer_presence import viewer_presence
+from livekit_webhook import presence_batcher, router as livekit_webhook_router
 
 
 # ============================================
-# AUTH – get_current_user
+# STARTUP (migraties: zie migrations.py, nooit DDL in requests)
 # ============================================
-def _resolve_authorization_user(
-    token_header: Optional[str],
-    s: Session,
-) -> UserDB:
-    
-    if not token_header:
-        raise HTTPException(status_code=401, detail="Missing Authorization header")
+@app.on_event("startup")
+def on_startup():
+    startup_check(engine)
 
-    parts = token_header.strip().split(" ")
-    if len(parts) != 2 or parts[0].lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Invalid Authorization format")
 
-    token = parts[1].strip()
-    if not token:
-        raise HTTPException(status_code=401, detail="Empty token")
+@app.on_event("startup")
+async def start_maintenance():
+    # Draait in elke worker, maar enkel de leider voert jobs uit (zie maintenance.py).
+    maintenance.start()
 
-    try:
-        data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    uid = data.get("sub")
-    if not uid:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-
-    u = s.get(UserDB, int(uid))
-    if not u:
-        raise HTTPException(status_code=401, detail="User not found")
-    return u
-def get_current_user(
-    request: Request,
-    authorization: Optional[str] = Header(None),
-    s: Session = Depends(db),
-) -> UserDB:
-    token_header = authorization or request.headers.get("authorization")
-    return _resolve_authorization_user(token_header, s)
 
+@app.on_event("shutdown")
+def on_shutdown():
+    password_pool.shutdown()
+    image_pool.shutdown()
 
-def get_optional_user(
-    request: Request,
-    authorization: Optional[str] = Header(None),
-    s: Session = Depends(db),
-) -> Optional[UserDB]:
-    token_header = authorization or request.headers.get("authorization")
-    if not token_header:
-        return None
-    return _resolve_authorization_user(token_header, s)
 
+@app.on_event("shutdown")
+async def flush_viewers_on_shutdown():
+    await viewer_presence.stop()
+    await presence_batcher.stop()
+    await maintenance.stop()
 
 
-# ============================================
-# STARTUP (migraties / basis)
-# ============================================
-@app.on_event("startup")
-def on_startup():
-    Base.metadata.create_all(bind=engine)
-    # Zorg dat iedereen een wallet heeft
-    with SessionLocal() as s:
-        try:
-            s.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS bio TEXT"))
-            s.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS birthdate DATE"))
-            s.execute(
-                text(
-                    "ALTER TABLE users ADD COLUMN IF NOT EXISTS verify_token VARCHAR(255)"
-                )
-            )
-            s.execute(
-                text(
-                    "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_verified BOOLEAN DEFAULT FALSE"
-                )
-            )
-            s.commit()
-        except Exception:
-            s.rollback()
-        try:
-            s.execute(
-                text("ALTER TABLE rooms ADD COLUMN IF NOT EXISTS temp_subject VARCHAR(100)")
-            )
-            s.commit()
-        except Exception:
-            s.rollback()
-        users = s.query(UserDB).all()
-        for u in users:
-            if not u.wallet:
-                s.add(Wallet(user_id=u.id, balance=0))
-        s.commit()
-        for u in users:
-            ensure_user_room(u, s)
+app.include_router(livekit_webhook_router)
 
 
 # ============================================
@@ -407,7 +330,7 @@ async def test_mail():
 # 🧠 REGISTRATIE
 # ============================================
 @app.post("/api/register")
-async def register_user(data: dict, s: Session = Depends(db)):
+async def register_user(data: dict, s: AsyncSession = Depends(get_async_db)):
     # ✅ Controle: wachtwoorden moeten overeenkomen
     if data["password"] != data.get("password2"):
         raise HTTPException(status_code=400, detail="Wachtwoorden komen niet overeen.")
@@ -421,9 +344,9 @@ async def register_user(data: dict, s: Session = Depends(db)):
         raise HTTPException(status_code=400, detail="Je moet minstens 18 jaar oud zijn.")
 
     # ✅ Controle: dubbele gebruikers
-    if s.query(UserDB).filter_by(email=data["email"]).first():
+    if await s.scalar(select(UserDB.id).filter_by(email=data["email"])):
         raise HTTPException(status_code=400, detail="E-mailadres is al geregistreerd.")
-    if s.query(UserDB).filter_by(username=data["username"]).first():
+    if await s.scalar(select(UserDB.id).filter_by(username=data["username"])):
         raise HTTPException(status_code=400, detail="Gebruikersnaam is al in gebruik.")
 
     # ✅ Nieuw account
@@ -431,13 +354,16 @@ async def register_user(data: dict, s: Session = Depends(db)):
     user = UserDB(
         username=data["username"],
         email=data["email"],
-        password_hash=hash_password(data["password"]),
+        password_hash=await hash_password_async(data["password"]),
         birthdate=geboortedatum,
         verify_token=token,
         is_verified=False,
     )
     s.add(user)
-    s.commit()
+    await s.flush()
+    s.add(Wallet(user_id=user.id, balance=0))
+    await s.commit()
+    await s.run_sync(lambda sync_s: ensure_user_room(user, sync_s))
 
     # ✅ Verificatie-mail versturen
     link = f"https://api.johka.be/api/verify-email?token={token}"
@@ -478,9 +404,9 @@ def verify_email(token: str, s: Session = Depends(db)):
 # 🔐 LOGIN
 # ============================================
 @app.post("/api/login")
-def login_user(data: dict, s: Session = Depends(db)):
-    user = s.query(UserDB).filter_by(username=data["username"]).first()
-    if not user or not verify_password(data["password"], user.password_hash):
+async def login_user(data: dict, s: AsyncSession = Depends(get_async_db)):
+    user = await s.scalar(select(UserDB).filter_by(username=data["username"]))
+    if not user or not await verify_password_async(data["password"], user.password_hash):
         raise HTTPException(status_code=400, detail="Ongeldige login.")
     if not user.is_verified:
         raise HTTPException(status_code=403, detail="Verifieer eerst je e-mailadres.")
@@ -495,304 +421,376 @@ def login_user(data: dict, s: Session = Depends(db)):
 
 
 @app.get("/api/me", response_model=MeOut)
-def me(user: UserDB = Depends(get_current_user), s: Session = Depends(db)):
-    room = ensure_user_room(user, s)
+def me(user: Principal = Depends(get_current_user), s: Session = Depends(db)):
+    u = s.get(UserDB, user.id)
+    room = ensure_user_room(u, s)
     return MeOut(
-        id=user.id,
-        username=user.username,
-        email=user.email,
-        bio=user.bio or "",
+        id=u.id,
+        username=u.username,
+        email=u.email,
+        bio=u.bio or "",
         room_slug=room.slug if room else None,
         room_id=room.id if room else None,
     )
 
 
+ROOMS_PAGE_MAX = 100
+
+
 @app.get("/api/rooms", response_model=List[RoomOut])
-def list_rooms(s: Session = Depends(db)):
-    rows = s.query(RoomDB).join(UserDB, RoomDB.user_id == UserDB.id).all()
-    return [RoomOut(slug=r.slug, name=r.name, owner=r.owner.username) for r in rows]
+def list_rooms(
+    request: Request,
+    limit: int = Query(50, ge=1, le=ROOMS_PAGE_MAX),
+    cursor: Optional[int] = Query(None, ge=0, description="X-Next-Cursor van de vorige pagina"),
+    live: Optional[bool] = None,
+    access_mode: Optional[str] = None,
+    gender: Optional[str] = None,
+    s: Session = Depends(db),
+):
+    """Keyset-gepagineerde lijst van rooms (op ``rooms.id``).
+
+    Eén geprojecteerde query haalt slug, naam en owner-username op; de
+    volgende pagina staat in ``X-Next-Cursor`` / ``Link`` (afwezig op de
+    laatste pagina).  De body blijft een gewone JSON-lijst.
+    """
+
+    stmt = (
+        select(RoomDB.id, RoomDB.slug, RoomDB.name, UserDB.username)
+        .join(UserDB, RoomDB.user_id == UserDB.id)
+        .order_by(RoomDB.id)
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        stmt = stmt.where(RoomDB.id > cursor)
+    if access_mode:
+        stmt = stmt.where(RoomDB.access_mode == access_mode)
+    if gender:
+        stmt = stmt.where(UserDB.gender == gender)
+    if live is not None:
+        is_live = (
+            select(LiveSession.id)
+            .where(LiveSession.user_id == RoomDB.user_id, LiveSession.ended_at.is_(None))
+            .exists()
+        )
+        stmt = stmt.where(is_live if live else ~is_live)
+
+    rows = s.execute(stmt).all()
+    # Pagina is begrensd: connectie terug naar de pool vóór de body verstuurd wordt.
+    s.close()
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].id)
+        headers["X-Next-Cursor"] = next_cursor
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        headers["Link"] = f'<{next_url}>; rel="next"'
+
+    def _body():
+        yield b"["
+        for i, r in enumerate(rows):
+            item = {"slug": r.slug, "name": r.name, "owner": r.username}
+            yield (b"," if i else b"") + json.dumps(item, ensure_ascii=False).encode()
+        yield b"]"
+
+    return StreamingResponse(_body(), media_type="application/json", headers=headers)
 
 @app.get("/api/rooms/{slug}")
-def get_room(slug: str, s: Session = Depends(db)):
+def get_room(slug: str, request: Request, s: Session = Depends(db)):
     normalized = _normalize_room_slug(slug)
-    room = (
-        s.query(RoomDB)
+    # Eén query: room, eigenaar en open sessie; daaruit eerst de ETag, pas
+    # daarna (bij een miss) de payload.
+    row = s.execute(
+        select(
+            RoomDB.id,
+            RoomDB.slug,
+            RoomDB.name,
+            RoomDB.is_private,
+            RoomDB.access_mode,
+            RoomDB.token_price,
+            UserDB.username,
+            LiveSession.room_slug.label("live_slug"),
+            LiveSession.viewers,
+            LiveSession.snapshot,
+        )
         .join(UserDB, RoomDB.user_id == UserDB.id)
-        .filter(RoomDB.slug == normalized)
-        .first()
-    )
-    if not room:
+        .outerjoin(
+            LiveSession,
+            (LiveSession.user_id == RoomDB.user_id) & LiveSession.ended_at.is_(None),
+        )
+        .where(RoomDB.slug == normalized)
+        .limit(1)
+    ).first()
+    s.close()
+    if not row:
         raise HTTPException(status_code=404, detail="Room niet gevonden")
-    live_slug = None
-    live_viewers = 0
-    preview_url = None
-    try:
-        with engine.connect() as conn:
-            res = conn.execute(
-                text(
-                    """
-                SELECT room_slug, COALESCE(viewers, 0) AS viewers, snapshot
-                  FROM live_sessions
-                 WHERE user_id = :uid AND ended_at IS NULL
-                 LIMIT 1
-                """
-                ),
-                {"uid": room.owner.id},
-            ).first()
-            if res:
-                live_slug = res._mapping["room_slug"]
-                live_viewers = res._mapping["viewers"]
-                preview_url = _preview_url(res._mapping["snapshot"])
-    except Exception:
-        pass
-    return {
-        "slug": room.slug,
-        "name": room.name,
-        "owner": room.owner.username,
-        "livekit_room": f"{room.slug}-room",
-        "live_slug": live_slug,
-        "is_live": bool(live_slug),
-        "is_private": bool(getattr(room, "is_private", False)),
-        "access_mode": getattr(room, "access_mode", "public"),
-        "token_price": getattr(room, "token_price", 0) or 0,
-        "viewers": live_viewers,
-        "preview_url": preview_url,
+
+    etag = validator("room", *row)
+    cache = {"max_age": 5, "stale_while_revalidate": 15}
+    if (hit := not_modified(request, etag, **cache)) is not None:
+        return hit
+
+    payload = {
+        "slug": row.slug,
+        "name": row.name,
+        "owner": row.username,
+        "livekit_room": f"{row.slug}-room",
+        "live_slug": row.live_slug,
+        "is_live": bool(row.live_slug),
+        "is_private": bool(row.is_private),
+        "access_mode": row.access_mode or "public",
+        "token_price": row.token_price or 0,
+        "viewers": (row.viewers or 0) if row.live_slug else 0,
+        "preview_url": _preview_url(row.snapshot),
+        "preview_srcset": _preview_srcset(row.snapshot),
     }
+    return cached_json(request, payload, etag=etag, **cache)
 
 
 
 
 
 # ============================================
-# PUBLIEKE STREAMS (dummy + DB)
+# PUBLIEKE STREAMS (in-memory directory, zie live_directory.py)
 # ============================================
 @app.get("/api/public/streams")
-def public_streams():
-    # Probeer DB, val terug op demo als tabel (nog) niet bestaat
-    try:
-        with engine.connect() as conn:
-            rows = conn.execute(
-                text(
-                    """
-                SELECT u.username,
-                       s.room_slug AS room,
-                       COALESCE(s.viewers, 0) AS viewers,
-                       s.snapshot,
-                       COALESCE(u.avatar_url, '') AS avatar_url
-                  FROM live_sessions s
-                  JOIN users u ON u.id = s.user_id
-                 WHERE s.ended_at IS NULL
-                 ORDER BY s.started_at DESC
-            """
-                )
-            )
-            out = []
-            for r in rows:
-                snapshot = r._mapping["snapshot"]
-                avatar = r._mapping["avatar_url"] or None
-                fallback = avatar or f"https://picsum.photos/seed/{r._mapping['username']}/400/300"
-                preview = _preview_url(snapshot) or fallback
-                out.append(
-                    {
-                        "username": r._mapping["username"],
-                        "room": r._mapping["room"],
-                        "viewers": r._mapping["viewers"],
-                        "snapshot": snapshot,
-                        "preview_url": preview,
-                        "thumb": fallback,
-                    }
-                )
-            if out:
-                return out
-    except Exception:
-        pass
-
-    # fallback demo
-    return [
-        {
-            "username": "Luna",
-            "room": "luna-room",
-            "snapshot": None,
-            "preview_url": "https://picsum.photos/seed/luna/400/300",
-            "thumb": "https://picsum.photos/seed/luna/400/300",
-            "viewers": 48,
-        },
-        {
-            "username": "Bruno",
-            "room": "bruno-room",
-            "snapshot": None,
-            "preview_url": "https://picsum.photos/seed/bruno/400/300",
-            "thumb": "https://picsum.photos/seed/bruno/400/300",
-            "viewers": 112,
-        },
-        {
-            "username": "Milan",
-            "room": "milan-room",
-            "snapshot": None,
-            "preview_url": "https://picsum.photos/seed/milan/400/300",
-            "thumb": "https://picsum.photos/seed/milan/400/300",
-            "viewers": 23,
-        },
-    ]
+def public_streams(request: Request):
+    # Voorgeserialiseerde body + ETag: geen query, geen JSON-encode per request.
+    body, etag = live_directory.current()
+    return cached_response(request, body, etag=etag, max_age=15, stale_while_revalidate=30)
 
 
 # ============================================
 # PROFIEL UPDATE / AVATAR / GALLERY
-# (houdt rekening met ontbrekende kolommen)
+# (kolommen komen uit migrations.py)
 # ============================================
 @app.post("/api/me/update")
-def update_profile(
+async def update_profile(
     data: dict,
-    user: UserDB = Depends(get_current_user),
-    s: Session = Depends(db),
+    user: Principal = Depends(get_current_user),
+    s: AsyncSession = Depends(get_async_db),
 ):
-    u = s.get(UserDB, user.id)
-
-    # Dynamische kolommen toevoegen waar nodig
-    def ensure_column(sql):
-        try:
-            s.execute(text(sql))
-            s.commit()
-        except Exception:
-            s.rollback()
+    u = await s.get(UserDB, user.id)
 
     if "username" in data and data["username"]:
         u.username = data["username"].strip()
     if "email" in data and data["email"]:
         u.email = data["email"].strip().lower()
     if "password" in data and data["password"]:
-        u.password_hash = hash_password(data["password"])
+        u.password_hash = await hash_password_async(data["password"])
     if "bio" in data:
-        ensure_column("ALTER TABLE users ADD COLUMN IF NOT EXISTS bio TEXT")
         u.bio = (data["bio"] or "").strip()
 
-    s.commit()
+    await s.commit()
+    invalidate_user(u.id)
     return {"status": "ok", "message": "Profile updated"}
 
 
-@app.post("/api/me/avatar")
-def upload_avatar(
-    file: UploadFile = File(...),
-    user: UserDB = Depends(get_current_user),
-    s: Session = Depends(db),
-):
-    filename = f"{user.id}_{file.filename}"
-    path = os.path.join(AVATAR_DIR, filename)
-    with open(path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+GALLERY_MAX_BYTES = int(os.getenv("GALLERY_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_TYPES = ("jpg", "png", "webp", "gif")
 
-    public_url = f"https://api.johka.be/static/uploads/avatars/{filename}"
 
+async def _store_upload(request: Request, dest_dir: str, user_id: int, kind: str, max_bytes: int) -> str:
+    """Gestreamd naar schijf (met limiet), daarna decode/normalisatie in de image pool."""
+
+    received = (await receive_files(request, dest_dir, max_bytes=max_bytes, field="file"))[0]
+    if sniff_image(received.path) not in UPLOAD_TYPES:
+        discard([received])
+        raise HTTPException(415, "Enkel JPEG, PNG, WebP of GIF")
     try:
-        s.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar_url TEXT"))
-        s.commit()
-    except Exception:
-        s.rollback()
+        filename, _created = await image_pool.run(
+            store_upload_image, received.path, dest_dir, user_id, kind
+        )
+    except InvalidImage as exc:
+        raise HTTPException(415, str(exc))
+    finally:
+        discard([received])
+    return filename
 
-    u = s.get(UserDB, user.id)
-    setattr(u, "avatar_url", public_url)
-    s.commit()
+
+def _upload_thumb_url(url: Optional[str], kind: str) -> Optional[str]:
+    """URL van de kleinste rendition (zelfde map), of de URL zelf voor oude uploads."""
+
+    if not url:
+        return url
+    path = urlsplit(url).path
+    variants = upload_variants(kind, os.path.basename(path))
+    if not variants:
+        return url
+    return url[: url.rindex(os.path.basename(path))] + variants[0][0]
+
+
+@app.post("/api/me/avatar")
+async def upload_avatar(
+    request: Request,
+    user: Principal = Depends(get_current_user),
+    s: AsyncSession = Depends(get_async_db),
+):
+    """Avatar als multipart (veld ``file``) of raw body; opgeslagen als 256x256 JPEG (+ 96px)."""
+
+    filename = await _store_upload(request, AVATAR_DIR, user.id, "avatar", AVATAR_MAX_BYTES)
+    public_url = "https://api.johka.be" + static_url(f"uploads/avatars/{filename}")
+
+    u = await s.get(UserDB, user.id)
+    previous = os.path.basename(urlsplit(u.avatar_url or "").path)
+    u.avatar_url = public_url
+    await s.commit()
+    remove_upload(AVATAR_DIR, "avatar", previous if previous != filename else None)
     return {"url": public_url}
 
 
+async def _bump_gallery_version(s: AsyncSession, user_id: int) -> None:
+    """Maakt de ETag van /api/creator ongeldig zonder de galerij zelf te lezen."""
+
+    await s.execute(
+        text("UPDATE users SET gallery_version = gallery_version + 1 WHERE id = :uid"),
+        {"uid": user_id},
+    )
+
+
 @app.post("/api/me/gallery")
-def upload_gallery(
-    file: UploadFile = File(...),
-    user: UserDB = Depends(get_current_user),
-    s: Session = Depends(db),
+async def upload_gallery(
+    request: Request,
+    user: Principal = Depends(get_current_user),
+    s: AsyncSession = Depends(get_async_db),
 ):
+    """Galerijfoto, max. 1280px (+ 480px thumbnail); dezelfde foto twee keer telt één keer."""
+
     user_dir = os.path.join(GALLERY_DIR, str(user.id))
     os.makedirs(user_dir, exist_ok=True)
-    path = os.path.join(user_dir, file.filename)
-    with open(path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    filename = await _store_upload(request, user_dir, user.id, "gallery", GALLERY_MAX_BYTES)
+    public_url = "https://api.johka.be" + static_url(f"uploads/gallery/{user.id}/{filename}")
+
+    # Eén rij erbij i.p.v. de hele JSON-lijst herschrijven; dezelfde foto na
+    # een soft delete komt terug op haar oude plaats.
+    item_id = (
+        await s.execute(
+            text(
+                """
+            INSERT INTO gallery_items (user_id, url) VALUES (:uid, :url)
+            ON CONFLICT (user_id, url) DO UPDATE SET deleted_at = NULL
+            RETURNING id
+            """
+            ),
+            {"uid": user.id, "url": public_url},
+        )
+    ).scalar_one()
+    await _bump_gallery_version(s, user.id)
+    await s.commit()
 
-    public_url = f"https://api.johka.be/static/uploads/gallery/{user.id}/{file.filename}"
+    return {"url": public_url, "id": item_id}
 
-    try:
-        s.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS gallery_json TEXT"))
-        s.commit()
-    except Exception:
-        s.rollback()
 
-    import json
+@app.delete("/api/me/gallery/{item_id}")
+async def delete_gallery_item(
+    item_id: int,
+    user: Principal = Depends(get_current_user),
+    s: AsyncSession = Depends(get_async_db),
+):
+    result = await s.execute(
+        text(
+            "UPDATE gallery_items SET deleted_at = CURRENT_TIMESTAMP"
+            " WHERE id = :id AND user_id = :uid AND deleted_at IS NULL"
+        ),
+        {"id": item_id, "uid": user.id},
+    )
+    if not result.rowcount:
+        raise HTTPException(404, "Foto niet gevonden")
+    await _bump_gallery_version(s, user.id)
+    await s.commit()
+    return {"status": "ok"}
 
-    u = s.get(UserDB, user.id)
-    gallery = []
-    if getattr(u, "gallery_json", None):
-        try:
-            gallery = json.loads(u.gallery_json or "[]")
-        except Exception:
-            gallery = []
-    gallery.append(public_url)
-    u.gallery_json = json.dumps(gallery)
-    s.commit()
 
-    return {"url": public_url}
+GALLERY_PAGE_SIZE = 24
 
 
 @app.get("/api/creator/{username}")
-def public_creator(username: str, s: Session = Depends(db)):
-    u = s.query(UserDB).filter(UserDB.username == username).first()
-    if not u:
+def public_creator(
+    username: str,
+    request: Request,
+    gallery_after: int = Query(0, ge=0),
+    gallery_limit: int = Query(GALLERY_PAGE_SIZE, ge=1, le=100),
+    s: Session = Depends(db),
+):
+    # Profiel, room en open sessie in één query; de galerijpagina zit in de
+    # ETag via ``gallery_version`` en wordt enkel bij een miss opgehaald.
+    row = s.execute(
+        select(
+            UserDB.id,
+            UserDB.username,
+            UserDB.bio,
+            UserDB.avatar_url,
+            UserDB.gallery_version,
+            RoomDB.slug.label("room_slug"),
+            LiveSession.room_slug.label("live_slug"),
+            LiveSession.viewers,
+            LiveSession.snapshot,
+        )
+        .outerjoin(RoomDB, RoomDB.user_id == UserDB.id)
+        .outerjoin(
+            LiveSession,
+            (LiveSession.user_id == UserDB.id) & LiveSession.ended_at.is_(None),
+        )
+        .where(UserDB.username == username)
+        .limit(1)
+    ).first()
+    if not row:
         raise HTTPException(404, "Gebruiker niet gevonden")
 
-    room = s.query(RoomDB).filter(RoomDB.user_id == u.id).first()
-    if not room:
-        room = ensure_user_room(u, s)
-    gallery = []
-    import json
+    room_slug = row.room_slug
+    if room_slug is None:
+        room_slug = ensure_user_room(s.get(UserDB, row.id), s).slug
 
-    if getattr(u, "gallery_json", None):
-        try:
-            gallery = json.loads(u.gallery_json)
-        except Exception:
-            gallery = []
-
-    live_slug = None
-    live_viewers = 0
-    try:
-        with engine.connect() as conn:
-            res = conn.execute(
-                text(
-                    """
-                SELECT room_slug, COALESCE(viewers, 0) AS viewers, snapshot
-                  FROM live_sessions
-                 WHERE user_id = :uid AND ended_at IS NULL
-                 LIMIT 1
-                """
-                ),
-                {"uid": u.id},
-            ).first()
-            if res:
-                live_slug = res._mapping["room_slug"]
-                live_viewers = res._mapping["viewers"]
-                preview_url = _preview_url(res._mapping["snapshot"])
-            else:
-                preview_url = None
-    except Exception:
-        preview_url = None
+    etag = validator("creator", *row, room_slug)
+    cache = {"max_age": 30, "stale_while_revalidate": 60}
+    if (hit := not_modified(request, etag, **cache)) is not None:
+        return hit
 
+    # Keyset-paginatie op id (uploadvolgorde); één rij extra om te weten of er meer is.
+    rows = s.execute(
+        text(
+            """
+        SELECT id, url
+          FROM gallery_items
+         WHERE user_id = :uid AND deleted_at IS NULL AND id > :after
+         ORDER BY id
+         LIMIT :limit
+        """
+        ),
+        {"uid": row.id, "after": gallery_after, "limit": gallery_limit + 1},
+    ).all()
+    gallery_next = rows[gallery_limit - 1].id if len(rows) > gallery_limit else None
+    rows = rows[:gallery_limit]
+    gallery = [r.url for r in rows]
+    gallery_items = [
+        {"id": r.id, "url": r.url, "thumb": _upload_thumb_url(r.url, "gallery")} for r in rows
+    ]
 
-    return {
-        "username": u.username,
-        "bio": getattr(u, "bio", ""),
-        "avatar": getattr(u, "avatar_url", ""),
+    payload = {
+        "username": row.username,
+        "bio": row.bio,
+        "avatar": row.avatar_url,
+        "avatar_thumb": _upload_thumb_url(row.avatar_url, "avatar"),
         "banner": "",
         "gallery": gallery,
-        "room_slug": live_slug,
-        "is_live": bool(live_slug),
-        "viewers": live_viewers,
-        "preview_url": preview_url or getattr(u, "avatar_url", ""),
-        "default_room": room.slug if room else None,
+        "gallery_items": gallery_items,
+        "gallery_next": gallery_next,
+        "room_slug": row.live_slug,
+        "is_live": bool(row.live_slug),
+        "viewers": (row.viewers or 0) if row.live_slug else 0,
+        "preview_url": _preview_url(row.snapshot) or row.avatar_url,
+        "preview_srcset": _preview_srcset(row.snapshot),
+        "default_room": room_slug,
     }
+    return cached_json(request, payload, etag=etag, **cache)
 
 
 # ============================================
 # WALLET + TIP
 # ============================================
 @app.get("/api/wallet")
-def get_wallet(user: UserDB = Depends(get_current_user), s: Session = Depends(db)):
+def get_wallet(user: Principal = Depends(get_current_user), s: Session = Depends(db)):
     w = s.query(Wallet).filter_by(user_id=user.id).first()
     if not w:
         w = Wallet(user_id=user.id, balance=0)
@@ -804,7 +802,7 @@ def get_wallet(user: UserDB = Depends(get_current_user), s: Session = Depends(db
 @app.post("/api/wallet/topup")
 def topup_wallet(
     amount: int,
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(db),
 ):
     if amount <= 0:
@@ -819,7 +817,7 @@ def topup_wallet(
 
 
 @app.post("/api/tip")
-def send_tip(data: TipIn, user: UserDB = Depends(get_current_user), s: Session = Depends(db)):
+def send_tip(data: TipIn, user: Principal = Depends(get_current_user), s: Session = Depends(db)):
     if data.amount <= 0:
         raise HTTPException(400, "Bedrag moet positief zijn")
 
@@ -867,22 +865,30 @@ def send_tip(data: TipIn, user: UserDB = Depends(get_current_user), s: Session =
 
 
 @app.get("/api/tips")
-def get_tips(user: UserDB = Depends(get_current_user), s: Session = Depends(db)):
-    tips = (
-        s.query(Tip)
-        .filter(or_(Tip.from_user_id == user.id, Tip.to_user_id == user.id))
+def get_tips(user: Principal = Depends(get_current_user), s: Session = Depends(db)):
+    from_user = aliased(UserDB)
+    to_user = aliased(UserDB)
+    rows = s.execute(
+        select(
+            from_user.username.label("from_username"),
+            to_user.username.label("to_username"),
+            Tip.amount,
+            Tip.created_at,
+        )
+        .join(from_user, Tip.from_user_id == from_user.id)
+        .join(to_user, Tip.to_user_id == to_user.id)
+        .where(or_(Tip.from_user_id == user.id, Tip.to_user_id == user.id))
         .order_by(Tip.created_at.desc())
         .limit(50)
-        .all()
-    )
+    ).all()
     return [
         {
-            "from": t.from_user.username,
-            "to": t.to_user.username,
-            "amount": t.amount,
-            "when": t.created_at.isoformat(),
+            "from": r.from_username,
+            "to": r.to_username,
+            "amount": r.amount,
+            "when": r.created_at.isoformat(),
         }
-        for t in tips
+        for r in rows
     ]
 
 
@@ -892,36 +898,10 @@ def get_tips(user: UserDB = Depends(get_current_user), s: Session = Depends(db))
 #  Laatste stukje van je main.py
 # =============================================
 
-# 🧹 Cleanup functie voor oude previews
-import threading, time
-from pathlib import Path
-
-def cleanup_previews(folder="/app/static/uploads/previews", max_age_hours=6):
-    now = time.time()
-    limit = max_age_hours * 3600
-    deleted = 0
-
-    for file in Path(folder).glob("*.jpg"):
-        try:
-            if now - file.stat().st_mtime > limit:
-                file.unlink()
-                deleted += 1
-        except Exception as e:
-            print(f"❌ Fout bij verwijderen {file}: {e}")
-
-    if deleted:
-        print(f"🧹 {deleted} oude preview(s) verwijderd uit {folder}")
-
-def schedule_cleanup():
-    cleanup_previews()
-    threading.Timer(3600, schedule_cleanup).start()  # elk uur herhalen
-
-schedule_cleanup()
-
 from mollie.api.client import Client
 
 @app.post("/api/wallet/create-payment")
-def create_payment(data: dict, user: UserDB = Depends(get_current_user)):
+def create_payment(data: dict, user: Principal = Depends(get_current_user)):
     """Maak een nieuwe Mollie-betaling aan en bewaar die tijdelijk."""
     try:
         mollie = Client()
@@ -1001,7 +981,7 @@ def current_user(Authorization: str = Header(None), s: Session = Depends(db)):
 # 💾 Transactiegeschiedenis ophalen
 # ============================================
 @app.get("/api/wallet/history")
-def wallet_history(user: UserDB = Depends(get_current_user), s: Session = Depends(db)):
+def wallet_history(user: Principal = Depends(get_current_user), s: Session = Depends(db)):
 
     """
     Geef laatste transacties (wallet_history) van de huidige gebruiker terug.
@@ -1038,7 +1018,7 @@ app.include_router(room_router, prefix="/api/room")
 # 💳 Mollie webhook – saldo bijwerken + loggen
 # ============================================
 @app.post("/api/wallet/webhook")
-async def mollie_webhook(request: Request, s: Session = Depends(db)):
+async def mollie_webhook(request: Request, s: AsyncSession = Depends(get_async_db)):
     """Webhook die Mollie aanroept bij statuswijziging (paid, failed, etc.)"""
     from mollie.api.client import Client
     import os
@@ -1054,7 +1034,8 @@ async def mollie_webhook(request: Request, s: Session = Depends(db)):
         return {"status": "ignored"}
 
     try:
-        payment = mollie.payments.get(payment_id)
+        # De Mollie-client is synchroon: niet op de event loop uitvoeren.
+        payment = await run_in_threadpool(mollie.payments.get, payment_id)
     except Exception as e:
         print(f"❌ Fout bij ophalen Mollie betaling: {e}")
         return {"status": "error"}
@@ -1062,22 +1043,15 @@ async def mollie_webhook(request: Request, s: Session = Depends(db)):
     if payment.is_paid():
         user_id = payment.metadata.get("user_id")
         if user_id:
-            wallet = s.query(Wallet).filter_by(user_id=user_id).first()
+            wallet = await s.scalar(select(Wallet).filter_by(user_id=user_id))
             if wallet:
                 amount_tokens = int(float(payment.amount["value"]) * 10)  # 💰 1 EUR = 10 tokens
                 wallet.balance += amount_tokens
-                s.commit()
-                print(f"✅ Mollie betaling voltooid voor user {user_id} (+{amount_tokens} tokens)")
 
-                # 📜 Log transactie in wallet_history
-                s.execute(
-                    text("""
-                        INSERT INTO wallet_history (user_id, change, reason)
-                        VALUES (:uid, :amount, 'mollie')
-                    """),
-                    {"uid": user_id, "amount": amount_tokens}
-                )
-                s.commit()
+                # 📜 Log transactie in wallet_history (zelfde transactie als het saldo)
+                s.add(WalletHistory(user_id=wallet.user_id, change=amount_tokens, reason="mollie"))
+                await s.commit()
+                print(f"✅ Mollie betaling voltooid voor user {user_id} (+{amount_tokens} tokens)")
                 print(f"📘 Log toegevoegd aan wallet_history voor user {user_id}")
 
         else:
@@ -1125,7 +1099,7 @@ async def forgot_password(req: dict, s: Session = Depends(db)):
 
 # 2️⃣ Nieuwe wachtwoord opslaan
 @app.post("/api/reset-password")
-async def reset_password(req: dict, s: Session = Depends(db)):
+async def reset_password(req: dict, s: AsyncSession = Depends(get_async_db)):
     token = req.get("token")
     new_pw = req.get("password")
 
@@ -1136,12 +1110,12 @@ async def reset_password(req: dict, s: Session = Depends(db)):
     except BadSignature:
         raise HTTPException(status_code=400, detail="Ongeldig token")
 
-    user = s.query(UserDB).filter_by(email=email).first()
+    user = await s.scalar(select(UserDB).filter_by(email=email))
     if not user:
         raise HTTPException(status_code=404, detail="Gebruiker niet gevonden")
 
-    user.password_hash = hashpw(new_pw.encode(), gensalt()).decode()
-    s.commit()
+    user.password_hash = await hash_password_async(new_pw)
+    await s.commit()
     return {"detail": "Wachtwoord succesvol gewijzigd"}
 
 
@@ -1153,22 +1127,22 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from database import get_db
 from models import UserDB
-from auth import get_current_user   # gebruik je bestaande login-auth
 
 class GenderIn(BaseModel):
     gender: str
 
 @app.post("/api/user/update-gender")
-def update_gender(data: GenderIn, user: UserDB = Depends(get_current_user), s: Session = Depends(get_db)):
+def update_gender(data: GenderIn, user: Principal = Depends(get_current_user), s: Session = Depends(get_db)):
     """Past het gender aan van de ingelogde gebruiker."""
     allowed = {"anon", "male", "female", "trans"}
     if data.gender not in allowed:
         raise HTTPException(status_code=400, detail="Ongeldige waarde voor gender")
 
-    user.gender = data.gender
-    s.add(user)
+    u = s.get(UserDB, user.id)
+    u.gender = data.gender
     s.commit()
-    return {"status": "ok", "gender": user.gender}
+    invalidate_user(u.id)
+    return {"status": "ok", "gender": u.gender}
 
 
 # =============================================
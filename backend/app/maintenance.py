@@ -0,0 +1,320 @@
+"""Achtergrondonderhoud in precies één proces (leader election).
+
+Vroeger startte ``main.py`` bij de import een ``threading.Timer`` in elke
+uvicorn-worker (en in elke test) die elk uur de hele previews-map globde en
+statte.  Nu:
+
+* ``on_startup`` start één :class:`MaintenanceScheduler` per worker, maar enkel
+  de leider voert jobs uit.  Leiderschap via een Redis-lock
+  (``SET NX EX``, bij elke tick atomair verlengd en bij het stoppen atomair
+  vrijgegeven met een compare-and-expire/-delete script, zodat een node
+  nooit een lock verlengt of wist die intussen van een ander is) of, zonder
+  Redis, een PostgreSQL
+  advisory lock op een vaste connectie.  Op SQLite (dev/tests) is er maar één
+  proces en is de scheduler altijd leider;
+* de preview-reaper leidt de te verwijderen bestanden af uit
+  ``live_sessions.snapshot`` / ``previous_snapshot`` van afgelopen sessies (partiële index op
+  ``ended_at``) en werkt in begrensde batches;
+* een zeldzame orphan-sweep ruimt wat daar buiten valt op (oude
+  ``{username}_{ts}.jpg``-bestanden, achtergebleven ``.part``-uploads), ook
+  begrensd per run.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import bindparam, text
+
+from database import engine
+from images import preview_variants, remove_preview
+from redis_client import RedisError, redis as _redis
+
+PREVIEW_DIR = os.getenv("PREVIEW_DIR", "/app/static/uploads/previews")
+
+MAINTENANCE_TICK_SECONDS = float(os.getenv("MAINTENANCE_TICK_SECONDS", "60"))
+PREVIEW_RETENTION_HOURS = float(os.getenv("PREVIEW_RETENTION_HOURS", "6"))
+PREVIEW_REAPER_BATCH = int(os.getenv("PREVIEW_REAPER_BATCH", "200"))
+ORPHAN_SWEEP_LIMIT = int(os.getenv("ORPHAN_SWEEP_LIMIT", "500"))
+
+LEADER_KEY = "maintenance:leader"
+# GET + EXPIRE/DEL als één stap: tussen beide kan de key verlopen en door
+# een andere node genomen zijn.
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+# Vaste sleutel voor pg_try_advisory_lock (naast MIGRATION_LOCK_KEY).
+MAINTENANCE_LOCK_KEY = 7_420_001
+
+
+@dataclass
+class Job:
+    name: str
+    every: float
+    fn: Callable[[], int]
+    next_run: float = 0.0
+    runs: int = 0
+    failures: int = 0
+    last_result: Optional[int] = None
+    last_ms: float = 0.0
+
+
+class MaintenanceScheduler:
+    def __init__(self, redis=None, bind=None, tick: float = MAINTENANCE_TICK_SECONDS):
+        self.redis = redis
+        self.bind = bind
+        self.tick = tick
+        self.node_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.jobs: list[Job] = []
+        self.is_leader = False
+        self._pg_conn = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, every: float, fn: Callable[[], int]) -> None:
+        """Registreer een (sync) job; draait in een thread, ``fn`` geeft een aantal terug."""
+
+        self.jobs.append(Job(name, every, fn))
+
+    # ---------- leader election ----------
+    async def _acquire(self) -> bool:
+        if self.redis is not None:
+            ttl = max(int(self.tick * 3), 10)
+            try:
+                if await self.redis.set(LEADER_KEY, self.node_id, nx=True, ex=ttl):
+                    return True
+                return bool(await self.redis.eval(_RENEW_SCRIPT, 1, LEADER_KEY, self.node_id, ttl))
+            except RedisError as exc:
+                print(f"⚠️  Maintenance-lock via Redis mislukt, val terug op DB: {exc}")
+        return await asyncio.to_thread(self._acquire_pg)
+
+    def _acquire_pg(self) -> bool:
+        bind = self.bind or engine
+        if bind.dialect.name != "postgresql":
+            return True
+        try:
+            if self._pg_conn is not None:
+                # Lock hoort bij de sessie: zolang de connectie leeft, zijn we leider.
+                self._pg_conn.execute(text("SELECT 1"))
+                self._pg_conn.commit()
+                return True
+            conn = bind.connect()
+            locked = conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+            ).scalar()
+            conn.commit()
+            if locked:
+                self._pg_conn = conn
+            else:
+                conn.close()
+            return bool(locked)
+        except Exception as exc:
+            print(f"⚠️  Maintenance-lock via PostgreSQL mislukt: {exc}")
+            self._release_pg()
+            return False
+
+    def _release_pg(self) -> None:
+        if self._pg_conn is None:
+            return
+        try:
+            self._pg_conn.close()  # sluit de sessie: advisory lock vervalt mee
+        except Exception:
+            pass
+        self._pg_conn = None
+
+    async def _release(self) -> None:
+        if self.redis is not None and self.is_leader:
+            try:
+                await self.redis.eval(_RELEASE_SCRIPT, 1, LEADER_KEY, self.node_id)
+            except RedisError:
+                pass
+        await asyncio.to_thread(self._release_pg)
+        self.is_leader = False
+
+    # ---------- loop ----------
+    async def run_pending(self) -> list[str]:
+        """Eén tick: leiderschap controleren en vervallen jobs draaien."""
+
+        self.is_leader = await self._acquire()
+        if not self.is_leader:
+            return []
+        ran = []
+        for job in self.jobs:
+            now = time.monotonic()
+            if now < job.next_run:
+                continue
+            job.next_run = now + job.every
+            started = time.perf_counter()
+            try:
+                job.last_result = await asyncio.to_thread(job.fn)
+                job.runs += 1
+            except Exception as exc:
+                job.failures += 1
+                print(f"⚠️  Maintenance-job {job.name} mislukt: {exc}")
+            job.last_ms = round((time.perf_counter() - started) * 1000, 2)
+            ran.append(job.name)
+        return ran
+
+    async def _loop(self) -> None:
+        while True:
+            # Eerst wachten: een korte levensduur (tests, rolling restart) doet niets.
+            await asyncio.sleep(self.tick)
+            await self.run_pending()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        await self._release()
+
+    def stats(self) -> dict:
+        return {
+            "node": self.node_id,
+            "leader": self.is_leader,
+            "jobs": {
+                job.name: {
+                    "every_s": job.every,
+                    "runs": job.runs,
+                    "failures": job.failures,
+                    "last_result": job.last_result,
+                    "last_ms": job.last_ms,
+                }
+                for job in self.jobs
+            },
+        }
+
+
+# ---------- jobs ----------
+def reap_ended_previews(
+    preview_dir: str = PREVIEW_DIR,
+    *,
+    retention_hours: float = PREVIEW_RETENTION_HOURS,
+    batch: int = PREVIEW_REAPER_BATCH,
+    bind=None,
+) -> int:
+    """Previews van sessies die langer dan ``retention_hours`` afgelopen zijn.
+
+    Geen directory-scan: de kandidaten komen uit de partiële index
+    ``ix_live_sessions_ended_previews``; per run hoogstens ``batch`` sessies.
+    Zowel ``snapshot`` als de bewaarde ``previous_snapshot`` gaan weg.
+    """
+
+    bind = bind or engine
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    with bind.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT id, snapshot, previous_snapshot FROM live_sessions"
+                " WHERE ended_at IS NOT NULL"
+                " AND (snapshot IS NOT NULL OR previous_snapshot IS NOT NULL)"
+                " AND ended_at < :cutoff"
+                " ORDER BY ended_at LIMIT :batch"
+            ),
+            {"cutoff": cutoff, "batch": batch},
+        ).all()
+        if not rows:
+            return 0
+        # Eerst de verwijzing weg, dan het bestand: nooit een snapshot naar niets.
+        conn.execute(
+            text(
+                "UPDATE live_sessions SET snapshot = NULL, previous_snapshot = NULL"
+                " WHERE id IN :ids AND ended_at IS NOT NULL"
+            ).bindparams(bindparam("ids", expanding=True)),
+            {"ids": [r.id for r in rows]},
+        )
+        names = {name for r in rows for name in (r.snapshot, r.previous_snapshot) if name}
+        # Dezelfde content-hash kan intussen opnieuw in gebruik zijn (nieuwe sessie).
+        in_use = set(
+            conn.execute(
+                text(
+                    "SELECT snapshot FROM live_sessions WHERE snapshot IN :names"
+                    " UNION SELECT previous_snapshot FROM live_sessions"
+                    " WHERE previous_snapshot IN :names"
+                ).bindparams(bindparam("names", expanding=True)),
+                {"names": sorted(names)},
+            ).scalars()
+        )
+        conn.commit()
+    for name in sorted(names - in_use):
+        remove_preview(preview_dir, name)
+    return len(rows)
+
+
+def sweep_orphan_previews(
+    preview_dir: str = PREVIEW_DIR,
+    *,
+    max_age_hours: float = PREVIEW_RETENTION_HOURS,
+    limit: int = ORPHAN_SWEEP_LIMIT,
+    bind=None,
+) -> int:
+    """Bestanden waar geen enkele sessie naar verwijst (oud formaat, halve uploads)."""
+
+    bind = bind or engine
+    with bind.connect() as conn:
+        snapshots = conn.execute(
+            text(
+                "SELECT snapshot FROM live_sessions WHERE snapshot IS NOT NULL"
+                " UNION SELECT previous_snapshot FROM live_sessions"
+                " WHERE previous_snapshot IS NOT NULL"
+            )
+        ).scalars().all()
+    referenced = set(snapshots)
+    for name in snapshots:
+        referenced.update(v[0] for v in preview_variants(name))
+
+    cutoff = time.time() - max_age_hours * 3600
+    deleted = 0
+    try:
+        entries = os.scandir(preview_dir)
+    except FileNotFoundError:
+        return 0
+    with entries:
+        for entry in entries:
+            if deleted >= limit:
+                break
+            if entry.name in referenced or not entry.is_file():
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    deleted += 1
+            except FileNotFoundError:
+                pass
+    if deleted:
+        print(f"🧹 {deleted} verweesde preview(s) verwijderd uit {preview_dir}")
+    return deleted
+
+
+maintenance = MaintenanceScheduler(_redis)
+maintenance.add("preview_reaper", 10 * 60, reap_ended_previews)
+maintenance.add("orphan_preview_sweep", 6 * 3600, sweep_orphan_previews)
+
+
+__all__ = [
+    "MaintenanceScheduler",
+    "maintenance",
+    "reap_ended_previews",
+    "sweep_orphan_previews",
+]
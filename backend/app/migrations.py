@@ -0,0 +1,633 @@
+"""Versiebeheerde schema-migraties.
+
+Schemawijzigingen horen niet in request handlers: elke ``ALTER TABLE`` neemt
+een ACCESS EXCLUSIVE lock op de tabel (meestal ``users``) en blokkeert zo alle
+reads.  Migraties draaien daarom één keer bij deploy::
+
+    python migrations.py upgrade     # openstaande migraties toepassen
+    python migrations.py status      # toegepaste / openstaande versies tonen
+
+Toegepaste versies staan in ``schema_migrations``.  Een PostgreSQL advisory
+lock zorgt dat parallelle deploys (of meerdere workers met
+``MIGRATE_ON_STARTUP=1``) elkaar niet in de weg lopen.
+
+Op andere databases (SQLite in dev/tests) volstaat ``create_all`` op de
+ORM-modellen; de migraties zelf zijn PostgreSQL-specifiek.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from typing import Callable, Sequence, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from database import Base, engine
+import models  # noqa: F401  (registreert alle tabellen op Base.metadata)
+
+log = logging.getLogger("johka.migrations")
+
+# Vaste sleutel voor pg_advisory_lock: één migratie-run tegelijk.
+MIGRATION_LOCK_KEY = 7_420_000
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "0") == "1"
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    steps: Union[Sequence[str], Callable[[Connection], None]]
+    # False voor statements die niet in een transactie mogen lopen
+    # (bv. CREATE INDEX CONCURRENTLY).
+    transactional: bool = True
+
+    def apply(self, conn: Connection) -> None:
+        if callable(self.steps):
+            self.steps(conn)
+            return
+        for sql in self.steps:
+            conn.execute(text(sql))
+
+
+# ============================================
+# 📜 Migraties (enkel toevoegen, nooit wijzigen)
+# ============================================
+# Bevroren schema van vóór de migraties (de ORM-modellen van toen).  Bewust
+# geen ``create_all``: v1 mag niet meeschuiven met models.py, anders krijgt
+# een verse database kolommen en indexen die bestaande databases pas via
+# latere versies krijgen.  Alles daarna hoort in een eigen migratie.
+BASELINE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        username VARCHAR(32) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        birthdate DATE,
+        verify_token VARCHAR(255) UNIQUE,
+        is_verified BOOLEAN NOT NULL,
+        created_at TIMESTAMP DEFAULT NOW(),
+        bio TEXT,
+        gender VARCHAR(10) NOT NULL DEFAULT 'anon'
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username)",
+    """
+    CREATE TABLE IF NOT EXISTS rooms (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL UNIQUE REFERENCES users(id),
+        name VARCHAR(64) NOT NULL,
+        slug VARCHAR(64) NOT NULL,
+        temp_subject VARCHAR(100),
+        created_at TIMESTAMP DEFAULT NOW(),
+        is_private BOOLEAN NOT NULL DEFAULT FALSE,
+        access_mode TEXT NOT NULL DEFAULT 'public',
+        access_key TEXT,
+        token_price INTEGER NOT NULL DEFAULT 0,
+        CONSTRAINT uq_room_slug UNIQUE (slug)
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_rooms_slug ON rooms (slug)",
+    """
+    CREATE TABLE IF NOT EXISTS room_bans (
+        id SERIAL PRIMARY KEY,
+        room_id INTEGER NOT NULL REFERENCES rooms(id) ON DELETE CASCADE,
+        identity VARCHAR(255) NOT NULL,
+        username VARCHAR(255) NOT NULL,
+        banned_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        CONSTRAINT uq_roomban_room_identity UNIQUE (room_id, identity)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS room_timeouts (
+        id SERIAL PRIMARY KEY,
+        room_id INTEGER NOT NULL REFERENCES rooms(id) ON DELETE CASCADE,
+        identity VARCHAR(255) NOT NULL,
+        username VARCHAR(255) NOT NULL,
+        until TIMESTAMP NOT NULL,
+        created_at TIMESTAMP DEFAULT NOW(),
+        CONSTRAINT uq_roomtimeout_room_identity UNIQUE (room_id, identity)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS room_moderators (
+        id SERIAL PRIMARY KEY,
+        room_id INTEGER NOT NULL REFERENCES rooms(id) ON DELETE CASCADE,
+        identity VARCHAR(255) NOT NULL,
+        username VARCHAR(255) NOT NULL,
+        added_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        CONSTRAINT uq_roommods_room_identity UNIQUE (room_id, identity)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS wallets (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER UNIQUE REFERENCES users(id),
+        balance INTEGER,
+        updated_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS wallet_history (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        change INTEGER NOT NULL,
+        reason VARCHAR,
+        created_at TIMESTAMP DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tips (
+        id SERIAL PRIMARY KEY,
+        from_user_id INTEGER NOT NULL REFERENCES users(id),
+        to_user_id INTEGER NOT NULL REFERENCES users(id),
+        amount INTEGER NOT NULL,
+        created_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS private_messages (
+        id SERIAL PRIMARY KEY,
+        sender_id INTEGER NOT NULL REFERENCES users(id),
+        receiver_id INTEGER NOT NULL REFERENCES users(id),
+        message TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT NOW(),
+        read BOOLEAN
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_private_messages_id ON private_messages (id)",
+]
+
+
+def _backfill_wallets_and_rooms(conn: Connection) -> None:
+    """Geef gebruikers zonder wallet/room er één, met twee set-based statements.
+
+    Nieuwe gebruikers krijgen hun wallet en room bij registratie; dit vangt
+    enkel accounts op die van vóór die logica dateren.  Botsende slugs worden
+    overgeslagen en krijgen later een room via ``ensure_user_room``.
+    """
+
+    conn.execute(
+        text(
+            """
+        INSERT INTO wallets (user_id, balance)
+        SELECT u.id, 0
+          FROM users u
+         WHERE NOT EXISTS (SELECT 1 FROM wallets w WHERE w.user_id = u.id)
+        ON CONFLICT (user_id) DO NOTHING
+        """
+        )
+    )
+    # Slug-logica gespiegeld aan slugify(): lowercase, niet-alfanumeriek -> '-'.
+    conn.execute(
+        text(
+            """
+        WITH candidates AS (
+            SELECT u.id AS user_id,
+                   COALESCE(NULLIF(u.username, ''), 'Creator ' || u.id) AS name,
+                   COALESCE(
+                       NULLIF(LEFT(TRIM(BOTH '-' FROM regexp_replace(
+                           lower(COALESCE(u.username, '')), '[^a-z0-9]+', '-', 'g'
+                       )), 60), ''),
+                       'room-' || u.id
+                   ) AS base_slug
+              FROM users u
+             WHERE NOT EXISTS (SELECT 1 FROM rooms r WHERE r.user_id = u.id)
+        )
+        INSERT INTO rooms (user_id, name, slug)
+        SELECT c.user_id,
+               c.name,
+               CASE
+                   WHEN EXISTS (SELECT 1 FROM rooms r WHERE r.slug = c.base_slug)
+                     OR EXISTS (
+                           SELECT 1 FROM candidates c2
+                            WHERE c2.base_slug = c.base_slug AND c2.user_id < c.user_id
+                        )
+                   THEN c.base_slug || '-' || c.user_id
+                   ELSE c.base_slug
+               END
+          FROM candidates c
+        ON CONFLICT DO NOTHING
+        """
+        )
+    )
+
+
+# (naam, definitie) — gespiegeld in de ``__table_args__`` van models.py zodat
+# create_all (verse DB, SQLite) dezelfde indexen krijgt.
+HOT_PATH_INDEXES = [
+    # Open sessie per creator / per room (live-status, view-start/-end).
+    ("ix_live_sessions_user_open", "live_sessions (user_id) WHERE ended_at IS NULL"),
+    ("ix_live_sessions_room_open", "live_sessions (room_slug) WHERE ended_at IS NULL"),
+    ("ix_live_sessions_open_started", "live_sessions (started_at DESC) WHERE ended_at IS NULL"),
+    # Niet partieel: view-start heropent ook rijen met left_at gezet.
+    ("ix_live_viewers_session_ip", "live_viewers (session_id, viewer_ip)"),
+    ("ix_private_messages_receiver_created", "private_messages (receiver_id, created_at DESC)"),
+    ("ix_private_messages_sender_created", "private_messages (sender_id, created_at DESC)"),
+    ("ix_tips_from_created", "tips (from_user_id, created_at DESC)"),
+    ("ix_tips_to_created", "tips (to_user_id, created_at DESC)"),
+    ("ix_wallet_history_user_created", "wallet_history (user_id, created_at DESC)"),
+    # room_bans / room_timeouts: (room_id, identity) is al gedekt door hun
+    # UNIQUE-constraints, een extra index zou enkel schrijfwerk kosten.
+]
+
+
+def _create_indexes_concurrently(conn: Connection, indexes: Sequence[tuple[str, str]]) -> None:
+    """Indexen bouwen zonder schrijvers te blokkeren (CONCURRENTLY).
+
+    Een afgebroken ``CREATE INDEX CONCURRENTLY`` laat een INVALID index achter
+    die ``IF NOT EXISTS`` anders stilzwijgend zou overslaan: die eerst weg.
+    """
+
+    for name, definition in indexes:
+        invalid = conn.execute(
+            text(
+                """
+            SELECT 1
+              FROM pg_index i
+              JOIN pg_class c ON c.oid = i.indexrelid
+             WHERE c.relname = :name AND NOT i.indisvalid
+            """
+            ),
+            {"name": name},
+        ).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"))
+
+
+def _swap_ended_previews_index(conn: Connection) -> None:
+    """Reaper-index ook laten gelden voor sessies met enkel ``previous_snapshot``."""
+
+    _create_indexes_concurrently(
+        conn,
+        [
+            (
+                "ix_live_sessions_ended_previews",
+                "live_sessions (ended_at) WHERE ended_at IS NOT NULL"
+                " AND (snapshot IS NOT NULL OR previous_snapshot IS NOT NULL)",
+            )
+        ],
+    )
+    conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_live_sessions_ended_snapshot"))
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "baseline", BASELINE_DDL),
+    Migration(
+        2,
+        "users_rooms_profile_columns",
+        [
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS bio TEXT",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS birthdate DATE",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS verify_token VARCHAR(255)",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_verified BOOLEAN NOT NULL DEFAULT FALSE",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS gender VARCHAR(10) NOT NULL DEFAULT 'anon'",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS avatar_url TEXT",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS gallery_json TEXT",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS blocked BOOLEAN DEFAULT FALSE",
+            "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS temp_subject VARCHAR(100)",
+            "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS is_private BOOLEAN NOT NULL DEFAULT FALSE",
+            "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS access_mode TEXT NOT NULL DEFAULT 'public'",
+            "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS access_key TEXT",
+            "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS token_price INTEGER NOT NULL DEFAULT 0",
+        ],
+    ),
+    Migration(
+        3,
+        "live_sessions_viewers_room_logs",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS live_sessions (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL UNIQUE REFERENCES users(id) ON DELETE CASCADE,
+                room_slug VARCHAR(64) NOT NULL,
+                started_at TIMESTAMP DEFAULT NOW(),
+                ended_at TIMESTAMP,
+                viewers INTEGER NOT NULL DEFAULT 0,
+                snapshot TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS live_viewers (
+                id SERIAL PRIMARY KEY,
+                session_id INTEGER NOT NULL REFERENCES live_sessions(id) ON DELETE CASCADE,
+                viewer_ip VARCHAR(64) NOT NULL,
+                joined_at TIMESTAMP DEFAULT NOW(),
+                left_at TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS room_logs (
+                id SERIAL PRIMARY KEY,
+                room_id INTEGER NOT NULL REFERENCES rooms(id) ON DELETE CASCADE,
+                user_id INTEGER,
+                action VARCHAR(64) NOT NULL,
+                info TEXT DEFAULT '',
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+            """,
+        ],
+    ),
+    Migration(4, "backfill_wallets_rooms", _backfill_wallets_and_rooms),
+    Migration(
+        5,
+        "hot_path_indexes",
+        lambda conn: _create_indexes_concurrently(conn, HOT_PATH_INDEXES),
+        transactional=False,
+    ),
+    Migration(
+        6,
+        "dm_threads",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS dm_threads (
+                id SERIAL PRIMARY KEY,
+                user_low_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                user_high_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                last_message_id INTEGER,
+                last_sender_id INTEGER,
+                last_preview TEXT,
+                last_activity_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                unread_low INTEGER NOT NULL DEFAULT 0,
+                unread_high INTEGER NOT NULL DEFAULT 0,
+                CONSTRAINT uq_dm_threads_pair UNIQUE (user_low_id, user_high_id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_dm_threads_low_activity"
+            " ON dm_threads (user_low_id, last_activity_at DESC, id DESC)",
+            "CREATE INDEX IF NOT EXISTS ix_dm_threads_high_activity"
+            " ON dm_threads (user_high_id, last_activity_at DESC, id DESC)",
+            # Nullable zonder default: enkel een catalogus-wijziging, geen rewrite.
+            "ALTER TABLE private_messages ADD COLUMN IF NOT EXISTS thread_id INTEGER"
+            " REFERENCES dm_threads(id) ON DELETE SET NULL",
+            # Eén thread per paar, met het laatste bericht en ongelezen tellers.
+            """
+            INSERT INTO dm_threads (user_low_id, user_high_id, last_message_id, last_sender_id,
+                                    last_preview, last_activity_at, unread_low, unread_high)
+            SELECT DISTINCT ON (m.lo, m.hi)
+                   m.lo, m.hi, m.id, m.sender_id, LEFT(m.message, 200),
+                   COALESCE(m.created_at, NOW()),
+                   COUNT(*) FILTER (WHERE m.receiver_id = m.lo AND NOT COALESCE(m.read, FALSE))
+                       OVER (PARTITION BY m.lo, m.hi),
+                   COUNT(*) FILTER (WHERE m.receiver_id = m.hi AND m.lo <> m.hi
+                                      AND NOT COALESCE(m.read, FALSE))
+                       OVER (PARTITION BY m.lo, m.hi)
+              FROM (
+                    SELECT pm.*,
+                           LEAST(pm.sender_id, pm.receiver_id) AS lo,
+                           GREATEST(pm.sender_id, pm.receiver_id) AS hi
+                      FROM private_messages pm
+                   ) m
+             ORDER BY m.lo, m.hi, m.created_at DESC NULLS LAST, m.id DESC
+            ON CONFLICT (user_low_id, user_high_id) DO NOTHING
+            """,
+            """
+            UPDATE private_messages pm
+               SET thread_id = t.id
+              FROM dm_threads t
+             WHERE pm.thread_id IS NULL
+               AND t.user_low_id = LEAST(pm.sender_id, pm.receiver_id)
+               AND t.user_high_id = GREATEST(pm.sender_id, pm.receiver_id)
+            """,
+        ],
+    ),
+    Migration(
+        7,
+        "private_messages_thread_index",
+        lambda conn: _create_indexes_concurrently(
+            conn, [("ix_private_messages_thread_id", "private_messages (thread_id, id DESC)")]
+        ),
+        transactional=False,
+    ),
+    Migration(
+        8,
+        "private_messages_inbox_since_indexes",
+        lambda conn: _create_indexes_concurrently(
+            conn,
+            [
+                ("ix_private_messages_receiver_id", "private_messages (receiver_id, id)"),
+                ("ix_private_messages_sender_id", "private_messages (sender_id, id)"),
+            ],
+        ),
+        transactional=False,
+    ),
+    Migration(
+        9,
+        "live_sessions_unique_viewers",
+        [
+            "ALTER TABLE live_sessions"
+            " ADD COLUMN IF NOT EXISTS unique_viewers INTEGER NOT NULL DEFAULT 0",
+        ],
+    ),
+    Migration(
+        10,
+        "live_sessions_ended_snapshot_index",
+        lambda conn: _create_indexes_concurrently(
+            conn,
+            [
+                (
+                    "ix_live_sessions_ended_snapshot",
+                    "live_sessions (ended_at)"
+                    " WHERE ended_at IS NOT NULL AND snapshot IS NOT NULL",
+                )
+            ],
+        ),
+        transactional=False,
+    ),
+    Migration(
+        11,
+        "gallery_items",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS gallery_items (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                url TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT NOW(),
+                deleted_at TIMESTAMP,
+                CONSTRAINT uq_gallery_items_user_url UNIQUE (user_id, url)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_gallery_items_user_visible"
+            " ON gallery_items (user_id, id) WHERE deleted_at IS NULL",
+            # Volgorde van de JSON-lijst behouden: ids in array-volgorde per gebruiker.
+            # Enkel rijen die geldige JSON-arrays zijn worden gecast (IS JSON
+            # cast zelf niet; OFFSET 0 houdt de filter vóór de cast), zodat één
+            # kapotte blob de deploy niet afbreekt.  Niet-string elementen vallen weg.
+            """
+            INSERT INTO gallery_items (user_id, url, created_at)
+            SELECT u.id, g.item #>> '{}', COALESCE(u.created_at, NOW())
+              FROM (
+                    SELECT id, created_at, gallery_json::json AS items
+                      FROM users
+                     WHERE gallery_json IS JSON ARRAY
+                    OFFSET 0
+                   ) u
+             CROSS JOIN LATERAL json_array_elements(u.items) WITH ORDINALITY AS g(item, pos)
+             WHERE json_typeof(g.item) = 'string'
+             ORDER BY u.id, g.pos
+            ON CONFLICT (user_id, url) DO NOTHING
+            """,
+            # Zelfde transactie: de blob verdwijnt pas als de rijen er staan, en
+            # enkel voor de gekopieerde arrays; andere inhoud blijft staan.
+            "UPDATE users SET gallery_json = NULL WHERE gallery_json IS JSON ARRAY",
+        ],
+    ),
+    Migration(
+        12,
+        "users_gallery_version",
+        [
+            "ALTER TABLE users"
+            " ADD COLUMN IF NOT EXISTS gallery_version INTEGER NOT NULL DEFAULT 0",
+        ],
+    ),
+    Migration(
+        13,
+        "live_sessions_previous_snapshot",
+        ["ALTER TABLE live_sessions ADD COLUMN IF NOT EXISTS previous_snapshot TEXT"],
+    ),
+    Migration(
+        14,
+        "live_sessions_ended_previews_index",
+        _swap_ended_previews_index,
+        transactional=False,
+    ),
+]
+
+
+# ============================================
+# ⚙️ Runner
+# ============================================
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(
+        text(
+            """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        """
+        )
+    )
+    conn.commit()
+
+
+def applied_versions(conn: Connection) -> set[int]:
+    versions = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+    conn.commit()
+    return versions
+
+
+def _record(conn: Connection, migration: Migration) -> None:
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+        {"v": migration.version, "n": migration.name},
+    )
+
+
+def _apply(conn: Connection, migration: Migration) -> None:
+    if migration.transactional:
+        # Schema + versie-record in één transactie: faalt er iets, dan blijft
+        # de versie open en probeert de volgende deploy het opnieuw.
+        with conn.begin():
+            migration.apply(conn)
+            _record(conn, migration)
+        return
+
+    previous = conn.get_isolation_level()
+    conn.execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        migration.apply(conn)
+        _record(conn, migration)
+        conn.commit()
+    finally:
+        conn.execution_options(isolation_level=previous)
+
+
+def upgrade(bind: Engine | None = None) -> list[int]:
+    """Pas alle openstaande migraties toe en geef de nieuwe versies terug."""
+
+    bind = bind or engine
+    if bind.dialect.name != "postgresql":
+        Base.metadata.create_all(bind=bind)
+        return []
+
+    done: list[int] = []
+    with bind.connect() as conn:
+        # Sessie-lock (geen xact-lock): blijft gelden over de commits per migratie.
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        conn.commit()
+        try:
+            _ensure_version_table(conn)
+            applied = applied_versions(conn)
+            for migration in MIGRATIONS:
+                if migration.version in applied:
+                    continue
+                log.info("migratie %s (%s) toepassen", migration.version, migration.name)
+                _apply(conn, migration)
+                done.append(migration.version)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            conn.commit()
+    return done
+
+
+def pending(bind: Engine | None = None) -> list[Migration]:
+    """Migraties die nog niet toegepast zijn (leeg op niet-PostgreSQL)."""
+
+    bind = bind or engine
+    if bind.dialect.name != "postgresql":
+        return []
+    with bind.connect() as conn:
+        # Alleen lezen: bij startup geen DDL, ook niet voor de versietabel.
+        if conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar() is None:
+            return list(MIGRATIONS)
+        applied = applied_versions(conn)
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def startup_check(bind: Engine | None = None) -> None:
+    """Aangeroepen bij app-startup: nooit DDL, tenzij ``MIGRATE_ON_STARTUP=1``."""
+
+    bind = bind or engine
+    if bind.dialect.name != "postgresql" or MIGRATE_ON_STARTUP:
+        upgrade(bind)
+        return
+    missing = pending(bind)
+    if missing:
+        log.warning(
+            "⚠️  %d openstaande migratie(s): %s — draai `python migrations.py upgrade`",
+            len(missing),
+            ", ".join(f"{m.version}:{m.name}" for m in missing),
+        )
+
+
+def main(argv: list[str]) -> int:
+    command = argv[1] if len(argv) > 1 else "upgrade"
+    if command == "upgrade":
+        done = upgrade()
+        print(f"✅ {len(done)} migratie(s) toegepast" + (f": {done}" if done else ""))
+        return 0
+    if command == "status":
+        missing = {m.version for m in pending()}
+        for m in MIGRATIONS:
+            print(f"{m.version:>4}  {'pending' if m.version in missing else 'applied':<8} {m.name}")
+        return 0
+    print("gebruik: python migrations.py [upgrade|status]", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(sys.argv))
+
+
+__all__ = ["Migration", "MIGRATIONS", "upgrade", "pending", "startup_check"]
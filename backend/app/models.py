@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Integer, String, Text, UniqueConstraint, func
+from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint, func, text
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -21,6 +21,35 @@ class UserDB(Base):
     room = relationship("RoomDB", back_populates="owner", uselist=False)
     wallet = relationship("Wallet", back_populates="owner", uselist=False)
     gender = Column(String(10), nullable=False, server_default='anon')
+    blocked = Column(Boolean, nullable=True, server_default="false")
+    avatar_url = Column(Text, nullable=True)
+    # Legacy: sinds migratie 11 staat de galerij in gallery_items.
+    gallery_json = Column(Text, nullable=True)
+    # Opgehoogd bij elke galerijwijziging; validator voor /api/creator.
+    gallery_version = Column(Integer, nullable=False, server_default="0")
+
+
+class GalleryItem(Base):
+    """Eén galerijfoto; append-only, verwijderen zet enkel ``deleted_at``."""
+
+    __tablename__ = "gallery_items"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    url = Column(Text, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+    deleted_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "url", name="uq_gallery_items_user_url"),
+        Index(
+            "ix_gallery_items_user_visible",
+            user_id,
+            id,
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+    )
 
 
 class RoomDB(Base):
@@ -103,6 +132,8 @@ class WalletHistory(Base):
     reason = Column(String, default="mollie")
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (Index("ix_wallet_history_user_created", user_id, created_at.desc()),)
+
 
 class Tip(Base):
     __tablename__ = "tips"
@@ -115,6 +146,37 @@ class Tip(Base):
     from_user = relationship("UserDB", foreign_keys=[from_user_id])
     to_user = relationship("UserDB", foreign_keys=[to_user_id])
 
+    __table_args__ = (
+        Index("ix_tips_from_created", from_user_id, created_at.desc()),
+        Index("ix_tips_to_created", to_user_id, created_at.desc()),
+    )
+
+
+class DMThread(Base):
+    """Gesprek tussen twee gebruikers (``user_low_id < user_high_id``).
+
+    Laatste bericht, activiteit en ongelezen tellers per kant worden in
+    ``send_dm`` in dezelfde transactie als het bericht bijgewerkt.
+    """
+
+    __tablename__ = "dm_threads"
+
+    id = Column(Integer, primary_key=True)
+    user_low_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_high_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    last_message_id = Column(Integer, nullable=True)
+    last_sender_id = Column(Integer, nullable=True)
+    last_preview = Column(Text, nullable=True)
+    last_activity_at = Column(DateTime, server_default=func.now(), nullable=False)
+    unread_low = Column(Integer, nullable=False, server_default="0")
+    unread_high = Column(Integer, nullable=False, server_default="0")
+
+    __table_args__ = (
+        UniqueConstraint("user_low_id", "user_high_id", name="uq_dm_threads_pair"),
+        Index("ix_dm_threads_low_activity", user_low_id, last_activity_at.desc(), id.desc()),
+        Index("ix_dm_threads_high_activity", user_high_id, last_activity_at.desc(), id.desc()),
+    )
+
 
 class PrivateMessage(Base):
     __tablename__ = "private_messages"
@@ -122,6 +184,7 @@ class PrivateMessage(Base):
     id = Column(Integer, primary_key=True, index=True)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     receiver_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    thread_id = Column(Integer, ForeignKey("dm_threads.id", ondelete="SET NULL"), nullable=True)
     message = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=False), server_default=func.now())
     read = Column(Boolean, default=False)
@@ -129,6 +192,86 @@ class PrivateMessage(Base):
     sender = relationship("UserDB", foreign_keys=[sender_id])
     receiver = relationship("UserDB", foreign_keys=[receiver_id])
 
+    __table_args__ = (
+        Index("ix_private_messages_receiver_created", receiver_id, created_at.desc()),
+        Index("ix_private_messages_sender_created", sender_id, created_at.desc()),
+        Index("ix_private_messages_thread_id", thread_id, id.desc()),
+        Index("ix_private_messages_receiver_id", receiver_id, id),
+        Index("ix_private_messages_sender_id", sender_id, id),
+    )
+
+
+# Live-tabellen: schema in migrations.py, modellen vooral voor create_all
+# (SQLite/tests) en documentatie.  De handlers gebruiken raw SQL.
+class LiveSession(Base):
+    __tablename__ = "live_sessions"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True)
+    room_slug = Column(String(64), nullable=False)
+    started_at = Column(DateTime, server_default=func.now())
+    ended_at = Column(DateTime, nullable=True)
+    viewers = Column(Integer, nullable=False, server_default="0")
+    unique_viewers = Column(Integer, nullable=False, server_default="0")
+    snapshot = Column(Text, nullable=True)
+    # Eén generatie terug: caches en andere workers kunnen er nog even naar wijzen.
+    previous_snapshot = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_live_sessions_user_open",
+            user_id,
+            postgresql_where=text("ended_at IS NULL"),
+            sqlite_where=text("ended_at IS NULL"),
+        ),
+        Index(
+            "ix_live_sessions_room_open",
+            room_slug,
+            postgresql_where=text("ended_at IS NULL"),
+            sqlite_where=text("ended_at IS NULL"),
+        ),
+        Index(
+            "ix_live_sessions_open_started",
+            started_at.desc(),
+            postgresql_where=text("ended_at IS NULL"),
+            sqlite_where=text("ended_at IS NULL"),
+        ),
+        # Preview-reaper (maintenance.py): afgelopen sessies die nog een bestand hebben.
+        Index(
+            "ix_live_sessions_ended_previews",
+            ended_at,
+            postgresql_where=text(
+                "ended_at IS NOT NULL AND (snapshot IS NOT NULL OR previous_snapshot IS NOT NULL)"
+            ),
+            sqlite_where=text(
+                "ended_at IS NOT NULL AND (snapshot IS NOT NULL OR previous_snapshot IS NOT NULL)"
+            ),
+        ),
+    )
+
+
+class LiveViewer(Base):
+    __tablename__ = "live_viewers"
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey("live_sessions.id", ondelete="CASCADE"), nullable=False)
+    viewer_ip = Column(String(64), nullable=False)
+    joined_at = Column(DateTime, server_default=func.now())
+    left_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_live_viewers_session_ip", session_id, viewer_ip),)
+
+
+class RoomLog(Base):
+    __tablename__ = "room_logs"
+
+    id = Column(Integer, primary_key=True)
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, nullable=True)
+    action = Column(String(64), nullable=False)
+    info = Column(Text, server_default="")
+    created_at = Column(DateTime, server_default=func.now())
+
 
 from pydantic import BaseModel, Field, root_validator
 
@@ -0,0 +1,51 @@
+"""Wachtwoord-hashing (bcrypt) via een aparte process pool.
+
+bcrypt kost per hash/verify ~250 ms CPU.  Door dat in een begrensde
+process pool te doen blijft de event loop vrij en schaalt het over alle
+cores; een login-storm na een storing krijgt een 503 in plaats van de
+token- en viewer-endpoints uit te hongeren.
+"""
+
+import os
+
+from passlib.context import CryptContext
+
+from workers import BoundedPool
+
+pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or None
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+
+password_pool = BoundedPool(
+    "passwords",
+    max_workers=PASSWORD_HASH_WORKERS,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+    kind=os.getenv("PASSWORD_HASH_EXECUTOR", "process"),
+)
+
+
+def hash_password(p: str) -> str:
+    return pwd_ctx.hash(p)
+
+
+def verify_password(p: str, h: str) -> bool:
+    return pwd_ctx.verify(p, h)
+
+
+async def hash_password_async(p: str) -> str:
+    return await password_pool.run(hash_password, p)
+
+
+async def verify_password_async(p: str, h: str) -> bool:
+    return await password_pool.run(verify_password, p, h)
+
+
+__all__ = [
+    "pwd_ctx",
+    "hash_password",
+    "verify_password",
+    "hash_password_async",
+    "verify_password_async",
+    "password_pool",
+]
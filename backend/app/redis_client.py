@@ -0,0 +1,40 @@
+"""Gedeelde (optionele) async Redis-client.
+
+Eén client per worker voor heartbeats, DM-push en presence.  Is Redis niet
+geïnstalleerd of niet geconfigureerd, dan is ``redis`` ``None`` en vallen de
+gebruikers terug op hun in-process pad.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RedisError = Exception
+try:  # pragma: no cover - Redis is optioneel in sommige omgevingen
+    from redis.asyncio import Redis
+    from redis.exceptions import RedisError
+
+    REDIS_URL = os.getenv("REDIS_URL")
+    REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+    REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+    REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+    if not REDIS_URL and not REDIS_PASSWORD:
+        raise RuntimeError("Environment variable 'REDIS_PASSWORD' is required")
+
+    if REDIS_URL:
+        redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    else:
+        redis = Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD or None,
+            decode_responses=True,
+        )
+except Exception as exc:  # pragma: no cover - Redis optioneel
+    print(f"⚠️  Redis disabled: {exc}")
+    redis = None
+
+
+__all__ = ["redis", "RedisError"]
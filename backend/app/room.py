@@ -8,25 +8,42 @@ subjects.  Keeping the code together makes it easier to maintain and keeps
 
 from __future__ import annotations
 
-import base64
 import json
 import os
 import time
-from io import BytesIO
 from typing import Optional
 from uuid import uuid4
 
-import psycopg2
 from dotenv import load_dotenv
 from fastapi import APIRouter, Body, Depends, HTTPException, Request
 import httpx
-from jose import JWTError, jwt
-from PIL import Image
+from jose import jwt
 from pydantic import BaseModel
-from sqlalchemy import text
+from sqlalchemy import select, text
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import engine, get_db
+from starlette.concurrency import run_in_threadpool
+from auth import Principal, get_current_user, get_optional_user
+from database import engine, get_async_db, get_db
+from http_cache import cached_json, not_modified, validator
+from images import (
+    InvalidImage,
+    build_gif_preview,
+    image_pool,
+    remove_preview,
+    store_data_url_preview,
+    store_preview,
+)
+from live_directory import live_directory
+from uploads import (
+    discard,
+    media_type,
+    read_json,
+    receive_files,
+    receive_multipart,
+    sniff_image,
+)
 from models import RoomDB, UserDB, Wallet, WalletHistory
 from models import KickRequest, BanRequest, TimeoutRequest, ModRequest
 from livekit.api import AccessToken, VideoGrants
@@ -86,20 +103,6 @@ async def do_livekit_kick(room_name: str, identity: str):
         
 
 
-JWT_SECRET = _get_env("JWT_SECRET", "MyUltraSecretKey")
-JWT_ALGORITHM = "HS256"
-
-POSTGRES_USER = _get_env("POSTGRES_USER", "johka")
-POSTGRES_PASSWORD = _get_env("POSTGRES_PASSWORD", required=True)
-POSTGRES_HOST = _get_env("POSTGRES_HOST", "postgres")
-POSTGRES_PORT = _get_env("POSTGRES_PORT", "5432")
-POSTGRES_DB = _get_env("POSTGRES_DB", "johka")
-
-PSYCOPG_URL = _get_env("PSYCOPG_URL") or (
-    f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@"
-    f"{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-)
-
 LIVEKIT_API_KEY = _get_env("LIVEKIT_API_KEY", "johka_live_key")
 LIVEKIT_API_SECRET = _get_env("LIVEKIT_API_SECRET", required=True)
 LIVEKIT_URL = _get_env("LIVEKIT_URL", "wss://live.johka.be")
@@ -169,6 +172,9 @@ UPLOAD_ROOT = "/app/static/uploads"
 AVATAR_DIR = os.path.join(UPLOAD_ROOT, "avatars")
 GALLERY_DIR = os.path.join(UPLOAD_ROOT, "gallery")
 PREVIEW_DIR = os.path.join(UPLOAD_ROOT, "previews")
+# Eén preview-frame (raw/multipart); een JPEG van 320x240 is ~20 KB.
+SNAPSHOT_MAX_BYTES = int(os.getenv("SNAPSHOT_MAX_BYTES", str(2 * 1024 * 1024)))
+SNAPSHOT_SEQ_MAX_FRAMES = int(os.getenv("SNAPSHOT_SEQ_MAX_FRAMES", "20"))
 
 db = get_db
 
@@ -216,60 +222,6 @@ def ensure_user_room(user: UserDB, s: Session) -> RoomDB:
     return room
 
 
-def _psql():
-    return psycopg2.connect(PSYCOPG_URL)
-
-
-def _resolve_authorization_user(
-    token_header: Optional[str],
-    s: Session,
-) -> UserDB:
-    if not token_header:
-        raise HTTPException(status_code=401, detail="Missing Authorization header")
-
-    parts = token_header.strip().split(" ")
-    if len(parts) != 2 or parts[0].lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Invalid Authorization format")
-
-    token = parts[1].strip()
-    if not token:
-        raise HTTPException(status_code=401, detail="Empty token")
-
-    try:
-        data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    uid = data.get("sub")
-    if not uid:
-        raise HTTPException(status_code=401, detail="Invalid token payload")
-
-    u = s.get(UserDB, int(uid))
-    if not u:
-        raise HTTPException(status_code=401, detail="User not found")
-    return u
-
-
-def get_current_user(
-    request: Request,
-    authorization: Optional[str] = None,
-    s: Session = Depends(db),
-) -> UserDB:
-    token_header = authorization or request.headers.get("authorization")
-    return _resolve_authorization_user(token_header, s)
-
-
-def get_optional_user(
-    request: Request,
-    authorization: Optional[str] = None,
-    s: Session = Depends(db),
-) -> Optional[UserDB]:
-    token_header = authorization or request.headers.get("authorization")
-    if not token_header:
-        return None
-    return _resolve_authorization_user(token_header, s)
-
-
 def log_room_action(
     s: Session,
     room_id: int,
@@ -290,28 +242,9 @@ def log_room_action(
 # ===============================================================
 # 🔌 Redis (heartbeat voor "go live" status)
 # ===============================================================
-RedisError = Exception
-try:  # pragma: no cover - Redis is optioneel in sommige omgevingen
-    from redis.asyncio import Redis
-    from redis.exceptions import RedisError
-
-    REDIS_URL = _get_env("REDIS_URL")
-    REDIS_HOST = _get_env("REDIS_HOST", "redis")
-    REDIS_PORT = int(_get_env("REDIS_PORT", "6379"))
-    REDIS_PASSWORD = _get_env("REDIS_PASSWORD", required=True)
-
-    if REDIS_URL:
-        redis = Redis.from_url(REDIS_URL, decode_responses=True)
-    else:
-        redis = Redis(
-            host=REDIS_HOST,
-            port=REDIS_PORT,
-            password=REDIS_PASSWORD or None,
-            decode_responses=True,
-        )
-except Exception as exc:  # pragma: no cover - Redis optioneel
-    print(f"⚠️  Redis disabled: {exc}")
-    redis = None
+from redis_client import RedisError, redis
+from viewer_presence import viewer_presence
+from livekit_webhook import LIVEKIT_WEBHOOK_PRESENCE
 
 
 # ===============================================================
@@ -337,7 +270,7 @@ class LivekitTokenRequest(BaseModel):
 
 
 
-def _ensure_owner_room(room_id_value, user: UserDB, s: Session) -> RoomDB:
+def _ensure_owner_room(room_id_value, user: Principal, s: Session) -> RoomDB:
     """Validatie helper om te checken of de gebruiker eigenaar is van room."""
 
     if room_id_value is None:
@@ -361,8 +294,8 @@ def _ensure_owner_room(room_id_value, user: UserDB, s: Session) -> RoomDB:
 @_public_router.post("/api/livekit-token")
 async def create_livekit_token(
     payload: Optional[LivekitTokenRequest] = Body(default=None),
-    user: Optional[UserDB] = Depends(get_optional_user),
-    s: Session = Depends(get_db),
+    user: Optional[Principal] = Depends(get_optional_user),
+    s: AsyncSession = Depends(get_async_db),
 ):
     payload = payload or LivekitTokenRequest()
 
@@ -378,9 +311,9 @@ async def create_livekit_token(
     room_slug_value = None
 
     if user:
-        owner_room = s.query(RoomDB).filter(RoomDB.user_id == user.id).first()
+        owner_room = await s.scalar(select(RoomDB).where(RoomDB.user_id == user.id))
         if not owner_room:
-            owner_room = ensure_user_room(user, s)
+            owner_room = await s.run_sync(lambda sync_s: ensure_user_room(user, sync_s))
 
     if user and not requested_slug:
         if not owner_room:
@@ -400,11 +333,17 @@ async def create_livekit_token(
             raise HTTPException(status_code=400, detail="room_slug is vereist")
 
         normalized_slug = _normalize_room_slug(requested_slug)
-        target_room = s.query(RoomDB).filter(RoomDB.slug == normalized_slug).first()
-        if not target_room:
+        row = (
+            await s.execute(
+                select(RoomDB, UserDB.username)
+                .join(UserDB, RoomDB.user_id == UserDB.id)
+                .where(RoomDB.slug == normalized_slug)
+            )
+        ).first()
+        if not row:
             raise HTTPException(status_code=404, detail="Room niet gevonden")
 
-        room_owner_username = target_room.owner.username
+        target_room, room_owner_username = row
         room_name = f"{target_room.slug}-room"
         room_id = target_room.id
         room_display_name = target_room.name
@@ -419,7 +358,11 @@ async def create_livekit_token(
             identity = f"gast-{uuid4().hex[:6]}"
             can_chat = False
 
-    enforce_room_access_controls(s, room_id, identity, is_owner=is_owner)      
+    await s.run_sync(
+        lambda sync_s: enforce_room_access_controls(
+            sync_s, room_id, identity, is_owner=is_owner
+        )
+    )
 
     metadata = None
     if user:
@@ -433,7 +376,7 @@ async def create_livekit_token(
 
     if room_id:
         try:
-            subject_row = s.execute(
+            subject_row = (await s.execute(
                 text(
                     """
                 SELECT COALESCE(temp_subject, name) AS subject
@@ -442,7 +385,7 @@ async def create_livekit_token(
                 """
                 ),
                 {"id": room_id},
-            ).fetchone()
+            )).fetchone()
             if subject_row:
                 room_subject = subject_row._mapping.get("subject")
         except Exception:
@@ -499,7 +442,7 @@ async def create_livekit_token(
 # 🚀 Go live / einde uitzending
 # ===============================================================
 @_public_router.post("/api/go-live")
-def go_live(user: UserDB = Depends(get_current_user), s: Session = Depends(get_db)):
+def go_live(user: Principal = Depends(get_current_user), s: Session = Depends(get_db)):
     owner_room = s.query(RoomDB).filter(RoomDB.user_id == user.id).first()
     if not owner_room:
         owner_room = ensure_user_room(user, s)
@@ -507,6 +450,12 @@ def go_live(user: UserDB = Depends(get_current_user), s: Session = Depends(get_d
     room_slug = owner_room.slug
     room_id = owner_room.id
     with engine.connect() as conn:
+        # De nieuwe sessie begint zonder preview; de oude blijft één generatie
+        # staan (zie _set_live_snapshot), die van daarvoor mag weg.
+        current, older = conn.execute(
+            text("SELECT snapshot, previous_snapshot FROM live_sessions WHERE user_id = :uid"),
+            {"uid": user.id},
+        ).first() or (None, None)
         conn.execute(
             text(
                 """
@@ -517,19 +466,25 @@ def go_live(user: UserDB = Depends(get_current_user), s: Session = Depends(get_d
                           started_at=NOW(),
                           ended_at=NULL,
                           viewers=0,
-                          snapshot=NULL
+                          unique_viewers=0,
+                          snapshot=NULL,
+                          previous_snapshot=:previous
             """
             ),
-            {"uid": user.id, "slug": room_slug},
+            {"uid": user.id, "slug": room_slug, "previous": current or older},
         )
         conn.commit()
 
-    
+    if current and older != current:
+        remove_preview(PREVIEW_DIR, older)
+    viewer_presence.forget(room_slug)
+    owner = s.get(UserDB, user.id)
+    live_directory.start(user.id, user.username, room_slug, owner.avatar_url if owner else None)
     return {"ok": True, "room": room_slug}
 
 @_public_router.post("/api/end-live")
 def end_live(
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(get_db),
 ):
     owner_room = s.query(RoomDB).filter(RoomDB.user_id == user.id).first()
@@ -553,91 +508,126 @@ def end_live(
         )
         conn.commit()
 
-    
+    viewer_presence.forget(room_slug)
+    live_directory.end(user.id)
     return {"ok": True}
 
 # ===============================================================
 # 👥 View counters
 # ===============================================================
 @room_router.post("/view-start")
-async def room_view_start(request: Request):
+async def room_view_start(request: Request, s: AsyncSession = Depends(get_async_db)):
     data = await request.json()
     room = data.get("room")
     if not room:
         raise HTTPException(400, "Missing room")
+    if LIVEKIT_WEBHOOK_PRESENCE:
+        # Kijkers komen binnen via de LiveKit-webhook.
+        return {"ok": True}
     ip = request.client.host
 
-    conn = _psql()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id FROM live_sessions WHERE room_slug=%s AND ended_at IS NULL",
-        (room,),
-    )
-    sess = cur.fetchone()
-    if not sess:
-        conn.close()
+    session = await viewer_presence.session_for(s, room)
+    if not session:
         raise HTTPException(404, "No active live found")
-    session_id = sess[0]
-    cur.execute(
-        "SELECT id FROM live_viewers WHERE session_id=%s AND viewer_ip=%s AND left_at IS NULL",
-        (session_id, ip),
-    )
-    if cur.fetchone():
-        conn.close()
-        return {"ok": True}
+    session_id, member = session
+
+    if viewer_presence.redis is not None:
+        # Redis-pad: set + HLL, de flusher schrijft naar de DB.
+        try:
+            if await viewer_presence.join(member, ip):
+                live_directory.adjust_viewers(room, +1)
+            return {"ok": True}
+        except RedisError as exc:
+            print(f"⚠️  Viewer presence via Redis mislukt, direct naar DB: {exc}")
+
+    if await _view_start_db(s, session_id, ip):
+        live_directory.adjust_viewers(room, +1)
+    return {"ok": True}
+
 
-    cur.execute(
-        "UPDATE live_viewers SET left_at=NULL, joined_at=NOW() WHERE session_id=%s AND viewer_ip=%s",
-        (session_id, ip),
+async def _view_start_db(s: AsyncSession, session_id: int, ip: str) -> bool:
+    params = {"sid": session_id, "ip": ip}
+
+    existing = (
+        await s.execute(
+            text(
+                "SELECT id FROM live_viewers"
+                " WHERE session_id = :sid AND viewer_ip = :ip AND left_at IS NULL"
+            ),
+            params,
+        )
+    ).first()
+    if existing:
+        return False
+
+    res = await s.execute(
+        text(
+            "UPDATE live_viewers SET left_at = NULL, joined_at = CURRENT_TIMESTAMP"
+            " WHERE session_id = :sid AND viewer_ip = :ip"
+        ),
+        params,
     )
-    if cur.rowcount == 0:
-        cur.execute(
-            "INSERT INTO live_viewers (session_id, viewer_ip, joined_at) VALUES (%s,%s,NOW())",
-            (session_id, ip),
+    if res.rowcount == 0:
+        await s.execute(
+            text(
+                "INSERT INTO live_viewers (session_id, viewer_ip, joined_at)"
+                " VALUES (:sid, :ip, CURRENT_TIMESTAMP)"
+            ),
+            params,
         )
-    cur.execute(
-        "UPDATE live_sessions SET viewers = COALESCE(viewers, 0) + 1 WHERE id=%s",
-        (session_id,),
+    await s.execute(
+        text("UPDATE live_sessions SET viewers = COALESCE(viewers, 0) + 1 WHERE id = :sid"),
+        params,
     )
-    conn.commit()
-    conn.close()
-    return {"ok": True}
+    await s.commit()
+    return True
 
 
 @room_router.post("/view-end")
-async def room_view_end(request: Request):
+async def room_view_end(request: Request, s: AsyncSession = Depends(get_async_db)):
     data = await request.json()
     room = data.get("room")
-    if not room:
+    if not room or LIVEKIT_WEBHOOK_PRESENCE:
         return {"ok": True}
     ip = request.client.host
 
-    conn = _psql()
-    cur = conn.cursor()
+    session = await viewer_presence.session_for(s, room)
+    if not session:
+        return {"ok": True}
+    session_id, member = session
 
-    cur.execute(
-        "SELECT id FROM live_sessions WHERE room_slug=%s AND ended_at IS NULL",
-        (room,),
-    )
+    if viewer_presence.redis is not None:
+        try:
+            if await viewer_presence.leave(member, ip):
+                live_directory.adjust_viewers(room, -1)
+            return {"ok": True}
+        except RedisError as exc:
+            print(f"⚠️  Viewer presence via Redis mislukt, direct naar DB: {exc}")
 
-    sess = cur.fetchone()
-    if not sess:
-        conn.close()
-        return {"ok": True}
+    if await _view_end_db(s, session_id, ip):
+        live_directory.adjust_viewers(room, -1)
+    return {"ok": True}
 
-    session_id = sess[0]
-    cur.execute(
-        "UPDATE live_viewers SET left_at=NOW() WHERE session_id=%s AND viewer_ip=%s AND left_at IS NULL",
-        (session_id, ip),
+
+async def _view_end_db(s: AsyncSession, session_id: int, ip: str) -> bool:
+    params = {"sid": session_id, "ip": ip}
+    res = await s.execute(
+        text(
+            "UPDATE live_viewers SET left_at = CURRENT_TIMESTAMP"
+            " WHERE session_id = :sid AND viewer_ip = :ip AND left_at IS NULL"
+        ),
+        params,
     )
-    if cur.rowcount:
-        cur.execute(
-            "UPDATE live_sessions SET viewers = GREATEST(COALESCE(viewers, 0) - 1, 0) WHERE id=%s",
-            (session_id,),
+    if res.rowcount:
+        await s.execute(
+            text(
+                "UPDATE live_sessions SET viewers = GREATEST(COALESCE(viewers, 0) - 1, 0)"
+                " WHERE id = :sid"
+            ),
+            params,
         )
-        conn.commit()
-    conn.close()
-    return {"ok": True}
+        await s.commit()
+    return bool(res.rowcount)
 
 
 # ===============================================================
@@ -646,7 +636,7 @@ async def room_view_end(request: Request):
 @room_router.post("/set-subject")
 def set_room_subject(
     payload: dict,
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(get_db),
 ):
     room = _ensure_owner_room(payload.get("room_id"), user, s)
@@ -663,7 +653,7 @@ def set_room_subject(
 @room_router.post("/reset-subject")
 def reset_room_subject(
     payload: dict,
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(get_db),
 ):
     room = _ensure_owner_room(payload.get("room_id"), user, s)
@@ -673,86 +663,169 @@ def reset_room_subject(
 
 
 @room_router.get("/current/{room_id}")
-def get_room_subject(room_id: int, s: Session = Depends(get_db)):
-    room = s.get(RoomDB, room_id)
-    if not room:
+def get_room_subject(room_id: int, request: Request, s: Session = Depends(get_db)):
+    row = s.execute(
+        select(RoomDB.name, RoomDB.temp_subject).where(RoomDB.id == room_id)
+    ).first()
+    s.close()
+    if not row:
         raise HTTPException(status_code=404, detail="Room niet gevonden")
-    return {"subject": room.temp_subject or room.name}
+    subject = row.temp_subject or row.name
+    etag = validator("subject", room_id, subject)
+    if (hit := not_modified(request, etag, max_age=5)) is not None:
+        return hit
+    return cached_json(request, {"subject": subject}, etag=etag, max_age=5)
 
 
 # ===============================================================
 # 📸 Snapshots (JPG + GIF)
 # ===============================================================
+async def _current_snapshot(s: AsyncSession, user_id: int) -> Optional[str]:
+    """Huidige preview van de open sessie; 409 als de gebruiker niet live is."""
+
+    row = (
+        await s.execute(
+            text("SELECT snapshot FROM live_sessions WHERE user_id = :uid AND ended_at IS NULL"),
+            {"uid": user_id},
+        )
+    ).first()
+    # Connectie niet vasthouden terwijl de image pool werkt.
+    await s.commit()
+    if row is None:
+        raise HTTPException(409, "Niet live")
+    return row[0]
+
+
+async def _set_live_snapshot(s: AsyncSession, user_id: int, filename: str) -> None:
+    """Nieuwe preview zetten; de vervangen preview blijft één generatie staan.
+
+    Andere workers (``live_directory``, tot ``LIVE_DIRECTORY_MAX_AGE``) en de
+    cache van ``/api/public/streams`` kunnen nog even naar de vorige wijzen.
+    Pas de preview van twee uploads terug gaat weg.
+    """
+
+    row = (
+        await s.execute(
+            text(
+                "SELECT snapshot, previous_snapshot FROM live_sessions"
+                " WHERE user_id = :uid AND ended_at IS NULL"
+            ),
+            {"uid": user_id},
+        )
+    ).first()
+    if row is None:
+        # Intussen gestopt: het bestand is voor de orphan-sweep.
+        await s.commit()
+        return
+    current, older = row
+    stale = None
+    if filename != current:
+        await s.execute(
+            text(
+                "UPDATE live_sessions SET snapshot = :file, previous_snapshot = :current"
+                " WHERE user_id = :uid AND ended_at IS NULL"
+            ),
+            {"file": filename, "current": current, "uid": user_id},
+        )
+        stale = older if older not in (filename, current) else None
+    await s.commit()
+    live_directory.set_snapshot(user_id, filename)
+    if stale:
+        await run_in_threadpool(remove_preview, PREVIEW_DIR, stale)
+
+
 @room_router.post("/snapshot")
-async def upload_snapshot(request: Request, user: UserDB = Depends(get_current_user)):
-    data = await request.json()
+async def upload_snapshot(
+    request: Request,
+    user: Principal = Depends(get_current_user),
+    s: AsyncSession = Depends(get_async_db),
+):
+    """Preview van de stream.
+
+    Bij voorkeur raw (``Content-Type: image/jpeg``) of multipart; de body gaat
+    dan chunk per chunk naar schijf.  JSON met een base64 data-URL blijft
+    werken voor oudere clients.  Decoderen/valideren gebeurt in de image pool.
+
+    Previews heten ``{user_id}-{digest}.{ext}``; per live room blijven de
+    huidige en de vorige preview staan (zie ``_set_live_snapshot``).
+    """
+
+    previous = await _current_snapshot(s, user.id)
+    if media_type(request) != "application/json":
+        received = (await receive_files(request, PREVIEW_DIR, max_bytes=SNAPSHOT_MAX_BYTES))[0]
+        if sniff_image(received.path) not in ("jpg", "gif"):
+            discard([received])
+            raise HTTPException(415, "Enkel JPEG of GIF")
+        try:
+            filename = await image_pool.run(
+                store_preview, received.path, PREVIEW_DIR, user.id, ("JPEG", "GIF"), previous
+            )
+        except InvalidImage as exc:
+            raise HTTPException(415, str(exc))
+        finally:
+            discard([received])
+        await _set_live_snapshot(s, user.id, filename)
+        return {"status": "ok", "file": filename}
+
+    data = await read_json(request, max_bytes=SNAPSHOT_MAX_BYTES * 4 // 3 + 1024)
     img_b64 = data.get("image")
     if not img_b64:
         raise HTTPException(400, "No image provided")
+    if not isinstance(img_b64, str):
+        raise HTTPException(400, "Invalid image data")
 
-    header, _, encoded = img_b64.partition(",")
     try:
-        img_data = base64.b64decode(encoded or img_b64)
-    except Exception:
+        filename = await image_pool.run(
+            store_data_url_preview, img_b64, PREVIEW_DIR, user.id, previous
+        )
+    except InvalidImage:
         raise HTTPException(400, "Invalid image data")
 
-    ext = "jpg"
-    if header.endswith("gif"):
-        ext = "gif"
-    filename = f"{user.username}_{int(time.time())}.{ext}"
-    filepath = os.path.join(PREVIEW_DIR, filename)
-    with open(filepath, "wb") as f:
-        f.write(img_data)
-
-    conn = _psql()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE live_sessions SET snapshot=%s WHERE user_id=%s AND ended_at IS NULL",
-        (filename, user.id),
-    )
-    conn.commit()
-    conn.close()
-
+    await _set_live_snapshot(s, user.id, filename)
     return {"status": "ok", "file": filename}
 
 
 @room_router.post("/snapshot-seq")
 async def upload_snapshot_sequence(
-    request: Request, user: UserDB = Depends(get_current_user)
+    request: Request,
+    user: Principal = Depends(get_current_user),
+    s: AsyncSession = Depends(get_async_db),
 ):
-    data = await request.json()
-    frames_b64 = data.get("frames", [])
-    if not frames_b64:
-        raise HTTPException(400, "Geen frames ontvangen")
-
-    frames = []
-    for img_b64 in frames_b64:
-        try:
-            img_data = base64.b64decode(img_b64.split(",")[1])
-            frame = Image.open(BytesIO(img_data)).convert("RGB")
-            frames.append(frame)
-        except Exception as exc:
-            print("Frame fout:", exc)
-
-    if not frames:
-        raise HTTPException(400, "Geen geldige frames ontvangen")
-
-    gif_filename = f"{user.username}_{int(time.time())}.gif"
-    gif_path = os.path.join(PREVIEW_DIR, gif_filename)
-
-    frames[0].save(
-        gif_path, save_all=True, append_images=frames[1:], duration=500, loop=0
-    )
+    """Korte geanimeerde GIF uit N frames (multipart ``frames`` of JSON/base64)."""
+
+    previous = await _current_snapshot(s, user.id)
+    received = []
+    paths, data_urls = [], []
+    if media_type(request) == "multipart/form-data":
+        received = await receive_multipart(
+            request,
+            PREVIEW_DIR,
+            max_bytes=SNAPSHOT_MAX_BYTES,
+            max_files=SNAPSHOT_SEQ_MAX_FRAMES,
+            field="frames",
+        )
+        paths = [part.path for part in received]
+    else:
+        data = await read_json(
+            request, max_bytes=SNAPSHOT_MAX_BYTES * SNAPSHOT_SEQ_MAX_FRAMES * 4 // 3 + 4096
+        )
+        data_urls = data.get("frames", [])
+        if not isinstance(data_urls, list) or not all(isinstance(f, str) for f in data_urls):
+            raise HTTPException(400, "frames moet een lijst van strings zijn")
+        data_urls = data_urls[:SNAPSHOT_SEQ_MAX_FRAMES]
+        if not data_urls:
+            raise HTTPException(400, "Geen frames ontvangen")
 
-    conn = _psql()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE live_sessions SET snapshot=%s WHERE user_id=%s AND ended_at IS NULL",
-        (gif_filename, user.id),
-    )
-    conn.commit()
-    conn.close()
+    try:
+        gif_filename = await image_pool.run(
+            build_gif_preview, paths, data_urls, PREVIEW_DIR, user.id, previous
+        )
+    except InvalidImage as exc:
+        raise HTTPException(400, str(exc))
+    finally:
+        discard(received)
 
+    await _set_live_snapshot(s, user.id, gif_filename)
     return {"status": "ok", "file": gif_filename}
 
 
@@ -760,7 +833,7 @@ async def upload_snapshot_sequence(
 # ❤️ Live heartbeat voor frontend
 # ===============================================================
 @_public_router.post("/api/live/start")
-async def live_start(u: UserDB = Depends(get_current_user)):
+async def live_start(u: Principal = Depends(get_current_user)):
     """Room.js heartbeat: streamer bevestigt dat die live is."""
 
     if redis:
@@ -773,7 +846,7 @@ async def live_start(u: UserDB = Depends(get_current_user)):
 
 
 @_public_router.post("/api/live/stop")
-async def live_stop(u: UserDB = Depends(get_current_user)):
+async def live_stop(u: Principal = Depends(get_current_user)):
     if redis:
         try:
             await redis.delete(f"live:{u.username}")
@@ -811,7 +884,7 @@ class PrivateRoomIn(BaseModel):
 @router.post("/api/room/create-private")
 def create_private_room(
     data: PrivateRoomIn,
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(db)
 ):
     if data.access_mode not in ("invite", "password", "token"):
@@ -858,7 +931,7 @@ class PrivateJoinIn(BaseModel):
 @router.post("/api/room/join-private")
 def join_private_room(
     data: PrivateJoinIn,
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(db)
 ):
     room = s.query(RoomDB).filter_by(slug=data.slug, is_private=True).first()
@@ -931,7 +1004,7 @@ class RoomUpdateIn(BaseModel):
 @room_router.post("/update-access")
 def update_room_access(
     data: RoomUpdateIn,
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(db)
 ):
     room = s.query(RoomDB).filter_by(slug=data.slug, user_id=user.id).first()
@@ -962,7 +1035,7 @@ def build_livekit_server_token(room_name: Optional[str] = None) -> str:
 @router.post("/mod/kick")
 async def kick_user(
     payload: KickRequest = Body(...),
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(db),
 ):
     # 1. input check
@@ -1020,7 +1093,7 @@ async def kick_user(
 @router.post("/mod/ban")
 async def ban_user(
     payload: BanRequest = Body(...),
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(db)
 ):
     # 1. Check of dit wel jouw eigen room is
@@ -1066,7 +1139,7 @@ async def ban_user(
 @router.post("/mod/timeout")
 async def timeout_user(
     payload: TimeoutRequest = Body(...),
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(db)
 ):
     slug = payload.room.replace("-room", "")
@@ -1106,7 +1179,7 @@ async def timeout_user(
 @router.post("/mod/unban")
 async def unban_user(
     payload: BanRequest = Body(...),
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(db)
 ):
     slug = payload.room.replace("-room", "")
@@ -1138,7 +1211,7 @@ async def unban_user(
 @router.post("/mod/addmod")
 async def add_moderator(
     payload: ModRequest = Body(...),
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(db)
 ):
     slug = payload.room.replace("-room", "")
@@ -1174,7 +1247,7 @@ async def add_moderator(
 @router.post("/mod/removemod")
 async def remove_moderator(
     payload: ModRequest = Body(...),
-    user: UserDB = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
     s: Session = Depends(db)
 ):
     slug = payload.room.replace("-room", "")
@@ -0,0 +1,118 @@
+"""``/static`` met lange caching en optionele offload naar de proxy.
+
+Starlette's ``StaticFiles`` stuurt geen ``Cache-Control`` mee, dus elke
+avatar, galerijfoto en preview komt telkens opnieuw door een API-worker.
+:class:`UploadStaticFiles` voegt daar toe:
+
+* content-addressed namen (``{id}-{hash}.jpg``, varianten ``-240w.webp``) en
+  URLs met een kloppende ``?v=`` (zie :func:`static_url`) zijn onveranderlijk:
+  ``Cache-Control: public, max-age=31536000, immutable``;
+* een sterke ``ETag`` die de inhoud volgt (de hash uit de naam, anders mtime
+  en grootte), identiek over workers en hosts.  ``If-Range`` en ``Range``
+  werken daardoor ook correct achter een CDN;
+* ``STATIC_OFFLOAD=x-accel`` (nginx, Caddy ``handle_response``) of
+  ``x-sendfile`` (Apache, lighttpd): de worker doet enkel de ``stat`` en
+  de 304-check, de proxy stuurt de bytes (en handelt ranges zelf af).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from typing import Optional
+from urllib.parse import parse_qs
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.types import Scope
+
+STATIC_OFFLOAD = os.getenv("STATIC_OFFLOAD", "").lower()
+STATIC_ACCEL_PREFIX = os.getenv("STATIC_ACCEL_PREFIX", "/_static").rstrip("/")
+STATIC_MUTABLE_MAX_AGE = int(os.getenv("STATIC_MUTABLE_MAX_AGE", "300"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# ``{prefix}-{hex}[-{breedte}w].{ext}``: de hash bepaalt de inhoud.
+_HASHED_RE = re.compile(r"[-_]([0-9a-f]{16,64})(?:-\d+w)?\.[a-z0-9]+$")
+
+
+def content_hash(filename: str) -> Optional[str]:
+    """Hash uit een content-addressed bestandsnaam, of None."""
+
+    match = _HASHED_RE.search(os.path.basename(filename))
+    return match.group(1) if match else None
+
+
+def file_version(stat_result: os.stat_result) -> str:
+    """Korte versie-token op basis van mtime en grootte (voor ``?v=``)."""
+
+    base = f"{stat_result.st_mtime_ns}-{stat_result.st_size}".encode()
+    return hashlib.blake2b(base, digest_size=6).hexdigest()
+
+
+def static_url(path: str, *, root: str = "/app/static", base: str = "/static") -> str:
+    """Publieke URL voor ``root/path``; niet-gehashte namen krijgen ``?v=``.
+
+    Zo kan ook een bestand dat ter plaatse overschreven wordt onveranderlijk
+    gecachet worden: na een wijziging verandert de URL.
+    """
+
+    path = path.lstrip("/")
+    url = f"{base}/{path}"
+    if content_hash(path):
+        return url
+    try:
+        return f"{url}?v={file_version(os.stat(os.path.join(root, path)))}"
+    except OSError:
+        return url
+
+
+class UploadStaticFiles(StaticFiles):
+    def __init__(self, *args, offload: Optional[str] = None, accel_prefix: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.offload = STATIC_OFFLOAD if offload is None else offload
+        self.accel_prefix = STATIC_ACCEL_PREFIX if accel_prefix is None else accel_prefix.rstrip("/")
+
+    def cache_headers(self, full_path: str, stat_result: os.stat_result, scope: Scope) -> dict:
+        digest = content_hash(full_path)
+        version = file_version(stat_result)
+        requested = parse_qs(scope.get("query_string", b"").decode()).get("v", [None])[0]
+        immutable = digest is not None or requested == version
+        return {
+            "etag": f'"{digest or version}"',
+            "cache-control": IMMUTABLE if immutable else f"public, max-age={STATIC_MUTABLE_MAX_AGE}",
+        }
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        headers = self.cache_headers(str(full_path), stat_result, scope)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return Response(status_code=304, headers={k: response.headers[k] for k in ("etag", "cache-control")})
+        if self.offload and status_code == 200:
+            return self.offload_response(str(full_path), response)
+        return response
+
+    def offload_response(self, full_path: str, response: FileResponse) -> Response:
+        """Lege response met een redirect-header; de proxy levert het bestand."""
+
+        headers = {
+            key: response.headers[key]
+            for key in ("etag", "cache-control", "last-modified", "content-type")
+        }
+        if self.offload == "x-sendfile":
+            headers["x-sendfile"] = full_path
+        else:
+            relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+            headers["x-accel-redirect"] = f"{self.accel_prefix}/{relative}"
+        return Response(status_code=200, headers=headers)
+
+
+__all__ = ["UploadStaticFiles", "static_url", "content_hash", "file_version", "IMMUTABLE"]
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+os.environ.setdefault("POSTGRES_PASSWORD", "test-password")
+os.environ.setdefault("SQLALCHEMY_URL", "sqlite:///:memory:")
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+import auth  # noqa: E402
+from database import Base  # noqa: E402
+from models import UserDB  # noqa: E402
+
+
+@pytest.fixture()
+def db_session(monkeypatch):
+    monkeypatch.setenv("JWT_SECRET", "cache-secret")
+    engine = create_engine("sqlite:///:memory:", future=True)
+    Base.metadata.create_all(bind=engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    session = sessionmaker(bind=engine)()
+    session.statements = statements
+    auth.principal_cache.clear()
+    try:
+        yield session
+    finally:
+        session.close()
+        auth.principal_cache.clear()
+
+
+def _user(session, username="alice", gender="female"):
+    user = UserDB(username=username, email=f"{username}@example.com", password_hash="x", gender=gender)
+    session.add(user)
+    session.commit()
+    return user
+
+
+def _header(user_id, exp_in=3600):
+    now = int(time.time())
+    token = jwt.encode({"sub": str(user_id), "iat": now, "exp": now + exp_in}, "cache-secret", algorithm="HS256")
+    return f"Bearer {token}"
+
+
+def test_cached_token_skips_database(db_session):
+    user = _user(db_session)
+    header = _header(user.id)
+
+    first = auth.resolve_principal(header, db_session)
+    queries_after_first = len(db_session.statements)
+    second = auth.resolve_principal(header, db_session)
+
+    assert first == second
+    assert first.username == "alice" and first.gender == "female"
+    assert len(db_session.statements) == queries_after_first
+
+
+def test_invalidate_user_forces_reload(db_session):
+    user = _user(db_session)
+    header = _header(user.id)
+    assert auth.resolve_principal(header, db_session).gender == "female"
+
+    user.gender = "trans"
+    db_session.commit()
+    assert auth.resolve_principal(header, db_session).gender == "female"
+
+    auth.invalidate_user(user.id)
+    assert auth.resolve_principal(header, db_session).gender == "trans"
+
+
+def test_deleted_user_is_rejected_after_invalidation(db_session):
+    user = _user(db_session)
+    header = _header(user.id)
+    auth.resolve_principal(header, db_session)
+
+    db_session.delete(user)
+    db_session.commit()
+    auth.invalidate_user(user.id)
+
+    with pytest.raises(HTTPException) as exc:
+        auth.resolve_principal(header, db_session)
+    assert exc.value.status_code == 401
+
+
+def test_cache_evicts_least_recently_used_and_expired():
+    cache = auth.PrincipalCache(ttl=60, maxsize=2)
+    a, b, c = (auth.Principal(id=i, username=f"u{i}") for i in range(3))
+    cache.put("a", a)
+    cache.put("b", b)
+    assert cache.get("a") == a
+    cache.put("c", c)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == a and cache.get("c") == c
+
+    cache.put("expired", a, token_exp=time.time() - 1)
+    assert cache.get("expired") is None
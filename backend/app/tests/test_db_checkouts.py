@@ -0,0 +1,131 @@
+import sys
+from importlib import reload
+from pathlib import Path
+
+import pytest
+from fastapi import Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+    monkeypatch.setattr(sys.modules["room"], "redis", None)
+
+    yield main
+
+
+@pytest.fixture
+def checkouts(app_module):
+    counter = {"n": 0}
+
+    def _on_checkout(*_args):
+        counter["n"] += 1
+
+    event.listen(app_module.engine, "checkout", _on_checkout)
+    yield counter
+    event.remove(app_module.engine, "checkout", _on_checkout)
+
+
+def _count(client, checkouts, method, url, **kwargs):
+    before = checkouts["n"]
+    response = client.request(method, url, **kwargs)
+    return response, checkouts["n"] - before
+
+
+def test_checkouts_per_route(app_module, checkouts):
+    main = app_module
+    with main.SessionLocal() as session:
+        user = main.UserDB(username="alice", email="alice@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        session.add(main.Wallet(user_id=user.id, balance=10))
+        session.commit()
+        user_id = user.id
+
+    token = main.create_access_token({"sub": str(user_id), "username": "alice"})
+    auth = {"Authorization": f"Bearer {token}"}
+
+    with TestClient(main.app) as client:
+        response, used = _count(client, checkouts, "GET", "/api/health")
+        assert response.status_code == 200
+        assert used == 0
+
+        response, used = _count(client, checkouts, "GET", "/api/wallet")
+        assert response.status_code == 401
+        assert used == 0
+
+        # Eerste request: token nog niet gecachet -> één lookup.
+        response, used = _count(client, checkouts, "POST", "/api/live/start", headers=auth)
+        assert response.status_code == 200
+        assert used == 1
+
+        # Heartbeat met warme cache gebruikt enkel Redis: geen pool-slot.
+        response, used = _count(client, checkouts, "POST", "/api/live/start", headers=auth)
+        assert response.status_code == 200
+        assert used == 0
+
+        response, used = _count(client, checkouts, "GET", "/api/wallet/history", headers=auth)
+        assert response.status_code == 200
+        assert used == 1
+
+
+def test_auth_lookup_is_released_before_handler_runs(app_module):
+    main = app_module
+    with main.SessionLocal() as session:
+        user = main.UserDB(username="bob", email="bob@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+    token = main.create_access_token({"sub": str(user_id), "username": "bob"})
+    seen = []
+
+    @main.app.get("/api/_probe/checkedout")
+    def probe(_user=Depends(sys.modules["auth"].get_current_user)):
+        seen.append(main.engine.pool.checkedout())
+        return {}
+
+    with TestClient(main.app) as client:
+        response = client.get("/api/_probe/checkedout", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    # De user-lookup liep, maar de connectie is terug in de pool.
+    assert seen == [0]
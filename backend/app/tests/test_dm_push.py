@@ -0,0 +1,195 @@
+import sys
+import asyncio
+import json
+from importlib import reload
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "dm_hub",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+    monkeypatch.setattr(sys.modules["dm_hub"].dm_hub, "redis", None)
+
+    yield main
+
+
+def _users(main):
+    with main.SessionLocal() as session:
+        alice = main.UserDB(username="alice", email="alice@example.com", password_hash="x")
+        bob = main.UserDB(username="bob", email="bob@example.com", password_hash="x")
+        session.add_all([alice, bob])
+        session.commit()
+        return alice.id, bob.id
+
+
+def _auth(main, user_id, username):
+    token = main.create_access_token({"sub": str(user_id), "username": username})
+    return token, {"Authorization": f"Bearer {token}"}
+
+
+def test_hub_delivers_locally_and_drops_slow_subscribers():
+    from dm_hub import CLOSE, DMHub
+
+    async def scenario():
+        hub = DMHub(None)
+        alice = hub.subscribe(1)
+        bob = hub.subscribe(2)
+        await hub.publish([1, 2], {"id": 1})
+        assert alice.get_nowait() == {"id": 1} and bob.get_nowait() == {"id": 1}
+
+        for i in range(alice.maxsize + 1):
+            hub.deliver([1], {"id": i})
+        assert alice.get_nowait() is CLOSE
+        assert hub.subscriber_count() == 1 and hub.dropped == 1
+
+    asyncio.run(scenario())
+
+
+def test_hub_fans_out_through_redis_backplane():
+    from dm_hub import DMHub
+
+    class FakePubSub:
+        def __init__(self, bus):
+            self.bus = bus
+
+        async def subscribe(self, channel):
+            self.channel = channel
+
+        async def get_message(self, ignore_subscribe_messages=True, timeout=None):
+            try:
+                return await asyncio.wait_for(self.bus.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        async def aclose(self):
+            pass
+
+    class FakeRedis:
+        def __init__(self):
+            self.bus = asyncio.Queue()
+            self.published = []
+
+        async def publish(self, channel, data):
+            self.published.append(channel)
+            await self.bus.put({"type": "message", "data": data})
+
+        def pubsub(self):
+            return FakePubSub(self.bus)
+
+    async def scenario():
+        redis = FakeRedis()
+        hub = DMHub(redis)
+        queue = hub.subscribe(7)
+        await hub.publish([7], {"id": 42})
+        event = await asyncio.wait_for(queue.get(), 1)
+        assert event == {"id": 42}
+        assert redis.published == ["dm:events"]
+        hub.unsubscribe(7, queue)
+        hub._listener.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_send_dm_publishes_after_commit(app_module, monkeypatch):
+    main = app_module
+    alice_id, bob_id = _users(main)
+    _, headers = _auth(main, alice_id, "alice")
+    published = []
+
+    async def _record(user_ids, event):
+        published.append((sorted(user_ids), event))
+
+    monkeypatch.setattr(sys.modules["dm_hub"].dm_hub, "publish", _record)
+    with TestClient(main.app) as client:
+        response = client.post("/api/dm/send", json={"to_username": "bob", "message": "hoi"}, headers=headers)
+        assert response.status_code == 200
+
+    assert len(published) == 1
+    user_ids, event = published[0]
+    assert user_ids == sorted([alice_id, bob_id])
+    assert event["from"] == "alice" and event["to"] == "bob" and event["message"] == "hoi"
+    assert isinstance(event["id"], int)
+
+
+def test_stream_replays_missed_messages(app_module, monkeypatch):
+    main = app_module
+    from dm_hub import CLOSE
+    from models import PrivateMessage
+
+    alice_id, bob_id = _users(main)
+    with main.SessionLocal() as session:
+        for i in range(3):
+            session.add(PrivateMessage(sender_id=bob_id, receiver_id=alice_id, message=f"m{i}"))
+        session.commit()
+        first_id = session.query(PrivateMessage.id).order_by(PrivateMessage.id).first()[0]
+
+    hub = sys.modules["dm_hub"].dm_hub
+
+    def _closed_queue(user_id):
+        queue = asyncio.Queue()
+        queue.put_nowait(CLOSE)
+        return queue
+
+    monkeypatch.setattr(hub, "subscribe", _closed_queue)
+    token, headers = _auth(main, alice_id, "alice")
+    with TestClient(main.app) as client:
+        ticket = client.post("/api/dm/stream-ticket", headers=headers).json()["ticket"]
+        response = client.get(
+            f"/api/dm/stream?ticket={ticket}", headers={"Last-Event-ID": str(first_id)}
+        )
+        assert client.get("/api/dm/stream?ticket=nope").status_code == 401
+        # Het sessietoken hoort niet in de URL, en een ticket is geen Bearer-token.
+        assert client.get(f"/api/dm/stream?ticket={token}").status_code == 401
+        assert client.get(f"/api/dm/stream?token={token}").status_code == 401
+        assert client.get("/api/dm/inbox", headers={"Authorization": f"Bearer {ticket}"}).status_code == 401
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        json.loads(line[len("data: "):])
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
+    ]
+    assert [e["message"] for e in events] == ["m1", "m2"]
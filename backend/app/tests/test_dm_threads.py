@@ -0,0 +1,184 @@
+import sys
+from importlib import reload
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "dm_hub",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+    monkeypatch.setattr(sys.modules["dm_hub"].dm_hub, "redis", None)
+
+    yield main
+
+
+def _login(main, client_headers, username):
+    with main.SessionLocal() as session:
+        user = main.UserDB(username=username, email=f"{username}@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        token = main.create_access_token({"sub": str(user.id), "username": username})
+        client_headers[username] = {"Authorization": f"Bearer {token}"}
+        return user.id
+
+
+def _send(client, headers, sender, to, text):
+    response = client.post(
+        "/api/dm/send", json={"to_username": to, "message": text}, headers=headers[sender]
+    )
+    assert response.status_code == 200
+
+
+def test_threads_track_last_message_and_unread(app_module):
+    main = app_module
+    headers = {}
+    for name in ("alice", "bob", "carol"):
+        _login(main, headers, name)
+
+    with TestClient(main.app) as client:
+        _send(client, headers, "alice", "bob", "hoi bob")
+        _send(client, headers, "alice", "bob", "ben je er?")
+        _send(client, headers, "bob", "alice", "ja!")
+        _send(client, headers, "carol", "bob", "hallo")
+
+        bob = client.get("/api/dm/threads", headers=headers["bob"]).json()
+        assert [t["with"] for t in bob["threads"]] == ["carol", "alice"]
+        assert [t["unread"] for t in bob["threads"]] == [1, 2]
+        assert bob["threads"][1]["last_message"] == "ja!"
+        assert bob["threads"][1]["last_from_me"] is True
+
+        alice = client.get("/api/dm/threads", headers=headers["alice"]).json()["threads"]
+        assert len(alice) == 1 and alice[0]["unread"] == 1
+        thread_id = alice[0]["id"]
+
+        page = client.get(
+            f"/api/dm/threads/{thread_id}/messages?limit=2", headers=headers["alice"]
+        ).json()
+        assert [m["message"] for m in page["messages"]] == ["ja!", "ben je er?"]
+        rest = client.get(
+            f"/api/dm/threads/{thread_id}/messages?before={page['next_before']}",
+            headers=headers["alice"],
+        ).json()
+        assert [m["message"] for m in rest["messages"]] == ["hoi bob"]
+        assert rest["next_before"] is None
+
+        assert client.post(f"/api/dm/threads/{thread_id}/read", headers=headers["bob"]).json()["ok"]
+        bob = client.get("/api/dm/threads", headers=headers["bob"]).json()["threads"]
+        assert [t["unread"] for t in bob] == [1, 0]
+        # Enkel de berichten aan bob zijn nu gelezen.
+        msgs = client.get(f"/api/dm/threads/{thread_id}/messages", headers=headers["bob"]).json()
+        assert [m["read"] for m in msgs["messages"]] == [False, True, True]
+
+        # Carol heeft geen toegang tot het gesprek alice/bob.
+        assert client.get(
+            f"/api/dm/threads/{thread_id}/messages", headers=headers["carol"]
+        ).status_code == 404
+
+
+def test_thread_list_is_one_statement_and_paginates(app_module):
+    main = app_module
+    headers = {}
+    _login(main, headers, "hub")
+    names = [f"fan{i}" for i in range(5)]
+    for name in names:
+        _login(main, headers, name)
+
+    with TestClient(main.app) as client:
+        for name in names:
+            _send(client, headers, name, "hub", f"van {name}")
+
+        queries = []
+        listener = lambda *a: queries.append(a[2])  # noqa: E731
+        client.get("/api/dm/threads", headers=headers["hub"])
+        event.listen(main.engine, "before_cursor_execute", listener)
+        try:
+            first = client.get("/api/dm/threads?limit=3", headers=headers["hub"]).json()
+        finally:
+            event.remove(main.engine, "before_cursor_execute", listener)
+        assert len(queries) == 1
+
+        second = client.get(
+            "/api/dm/threads", params={"limit": 3, "cursor": first["next_cursor"]},
+            headers=headers["hub"],
+        ).json()
+
+    seen = [t["with"] for t in first["threads"] + second["threads"]]
+    assert sorted(seen) == sorted(names) and len(set(seen)) == 5
+    assert second["next_cursor"] is None
+
+
+def test_inbox_since_returns_delta_and_304(app_module):
+    main = app_module
+    headers = {}
+    for name in ("alice", "bob", "carol"):
+        _login(main, headers, name)
+
+    with TestClient(main.app) as client:
+        _send(client, headers, "alice", "bob", "een")
+        _send(client, headers, "carol", "alice", "twee")
+
+        full = client.get("/api/dm/inbox", headers=headers["bob"])
+        assert [m["message"] for m in full.json()] == ["een"]
+        cursor = full.headers["x-inbox-cursor"]
+
+        empty = client.get(f"/api/dm/inbox?since={cursor}", headers=headers["bob"])
+        assert empty.status_code == 200 and empty.json() == []
+        assert empty.headers["x-inbox-cursor"] == cursor
+        not_modified = client.get(
+            f"/api/dm/inbox?since={cursor}",
+            headers={**headers["bob"], "If-None-Match": empty.headers["etag"]},
+        )
+        assert not_modified.status_code == 304 and not_modified.content == b""
+
+        _send(client, headers, "bob", "alice", "drie")
+        _send(client, headers, "alice", "bob", "vier")
+        delta = client.get(
+            f"/api/dm/inbox?since={cursor}",
+            headers={**headers["bob"], "If-None-Match": empty.headers["etag"]},
+        )
+        assert delta.status_code == 200
+        assert [m["message"] for m in delta.json()] == ["vier", "drie"]
+        assert int(delta.headers["x-inbox-cursor"]) == delta.json()[0]["id"]
+        assert delta.headers["etag"] != empty.headers["etag"]
@@ -0,0 +1,160 @@
+import sys
+from importlib import reload
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+
+    yield main
+
+
+def _seed(main):
+    with main.SessionLocal() as session:
+        user = main.UserDB(username="alice", email="alice@example.com", password_hash="x", bio="hoi")
+        session.add(user)
+        session.commit()
+        room = main.RoomDB(user_id=user.id, name="Alice", slug="alice")
+        session.add(room)
+        session.commit()
+        return user.id, room.id
+
+
+def _revalidate(client, url):
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith('"') and "max-age=" in first.headers["cache-control"]
+
+    second = client.get(url, headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    return first
+
+
+def test_public_endpoints_answer_304_for_unchanged_bodies(app_module):
+    main = app_module
+    _, room_id = _seed(main)
+
+    with TestClient(main.app) as client:
+        for url in (
+            "/api/public/streams",
+            "/api/rooms/alice",
+            "/api/creator/alice",
+            f"/api/room/current/{room_id}",
+        ):
+            _revalidate(client, url)
+
+
+def test_etag_changes_with_content(app_module):
+    main = app_module
+    user_id, room_id = _seed(main)
+
+    with TestClient(main.app) as client:
+        before = _revalidate(client, "/api/creator/alice")
+        with main.SessionLocal() as session:
+            session.get(main.UserDB, user_id).bio = "nieuwe bio"
+            session.commit()
+
+        after = client.get("/api/creator/alice", headers={"If-None-Match": before.headers["etag"]})
+        assert after.status_code == 200
+        assert after.json()["bio"] == "nieuwe bio"
+        assert after.headers["etag"] != before.headers["etag"]
+
+        streams = client.get("/api/public/streams")
+        main.live_directory.start(user_id, "alice", "alice")
+        changed = client.get("/api/public/streams", headers={"If-None-Match": streams.headers["etag"]})
+        assert changed.status_code == 200
+        assert changed.json()[0]["username"] == "alice"
+
+
+def test_revalidation_is_one_query_and_skips_the_body(app_module):
+    main = app_module
+    user_id, room_id = _seed(main)
+
+    with TestClient(main.app) as client:
+        tags = {url: client.get(url).headers["etag"] for url in ("/api/rooms/alice", "/api/creator/alice")}
+
+        for url, etag in tags.items():
+            queries = []
+            listener = lambda *a: queries.append(a[2])  # noqa: E731
+            event.listen(main.engine, "before_cursor_execute", listener)
+            try:
+                response = client.get(url, headers={"If-None-Match": etag})
+            finally:
+                event.remove(main.engine, "before_cursor_execute", listener)
+            assert response.status_code == 304
+            assert len(queries) == 1, queries
+            assert "gallery_items" not in queries[0]
+
+        # Een galerijwijziging verhoogt gallery_version en dus de ETag.
+        with main.SessionLocal() as session:
+            session.execute(
+                text("INSERT INTO gallery_items (user_id, url) VALUES (:uid, 'https://x/1.jpg')"),
+                {"uid": user_id},
+            )
+            session.execute(
+                text("UPDATE users SET gallery_version = gallery_version + 1 WHERE id = :uid"),
+                {"uid": user_id},
+            )
+            session.commit()
+        changed = client.get("/api/creator/alice", headers={"If-None-Match": tags["/api/creator/alice"]})
+        assert changed.status_code == 200
+        assert changed.json()["gallery"] == ["https://x/1.jpg"]
+
+
+def test_if_none_match_parsing():
+    from http_cache import if_none_match
+
+    class _Req:
+        def __init__(self, value):
+            self.headers = {"if-none-match": value} if value is not None else {}
+
+    assert if_none_match(_Req('"a", W/"b"'), '"b"')
+    assert if_none_match(_Req("*"), '"x"')
+    assert not if_none_match(_Req('"a"'), '"b"')
+    assert not if_none_match(_Req(None), '"b"')
@@ -0,0 +1,118 @@
+import sys
+from datetime import datetime, timedelta
+from importlib import reload
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+
+    yield main
+
+
+def _seed_live(main, username, minutes_ago):
+    from models import LiveSession
+
+    with main.SessionLocal() as session:
+        user = main.UserDB(username=username, email=f"{username}@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        session.add(
+            LiveSession(
+                user_id=user.id,
+                room_slug=username,
+                started_at=datetime.utcnow() - timedelta(minutes=minutes_ago),
+            )
+        )
+        session.commit()
+        return user.id
+
+
+def test_streams_served_from_memory_after_cold_rebuild(app_module):
+    main = app_module
+    directory = main.live_directory
+    alice = _seed_live(main, "alice", minutes_ago=10)
+    _seed_live(main, "bob", minutes_ago=1)
+
+    queries = []
+    listener = lambda *a: queries.append(a[2])  # noqa: E731
+    event.listen(main.engine, "before_cursor_execute", listener)
+    try:
+        with TestClient(main.app) as client:
+            queries.clear()
+            first = client.get("/api/public/streams")
+            rebuild_queries = len(queries)
+            second = client.get("/api/public/streams")
+            assert len(queries) == rebuild_queries
+
+            directory.set_snapshot(alice, "alice-1.jpg")
+            directory.adjust_viewers("alice", +2)
+            third = client.get("/api/public/streams").json()
+    finally:
+        event.remove(main.engine, "before_cursor_execute", listener)
+
+    assert rebuild_queries == 1
+    assert first.json() == second.json()
+    assert [s["username"] for s in first.json()] == ["bob", "alice"]
+
+    alice_entry = next(s for s in third if s["username"] == "alice")
+    assert alice_entry["viewers"] == 2
+    assert alice_entry["preview_url"].endswith("/previews/alice-1.jpg")
+    assert len(queries) == rebuild_queries
+
+
+def test_end_live_falls_back_to_demo(app_module):
+    main = app_module
+    directory = main.live_directory
+    alice = _seed_live(main, "alice", minutes_ago=1)
+
+    body, version = directory.body()
+    assert b'"alice"' in body
+
+    directory.end(alice)
+    body, new_version = directory.body()
+    assert new_version > version
+    assert b'"alice"' not in body and b'"Luna"' in body
@@ -0,0 +1,171 @@
+import sys
+import asyncio
+from importlib import reload
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+APP_DIR = Path(__file__).resolve().parents[1]
+if str(APP_DIR) not in sys.path:
+    sys.path.append(str(APP_DIR))
+
+from fake_livekit import event_body, signed_request  # noqa: E402
+
+SECRET = "test-livekit-secret"
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_KEY", "johka_live_key")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", SECRET)
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+    monkeypatch.setenv("LIVEKIT_WEBHOOK_PRESENCE", "1")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "dm_hub",
+        "viewer_presence",
+        "livekit_webhook",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+
+    with main.SessionLocal() as session:
+        user = main.UserDB(username="luna", email="luna@example.com", password_hash="x")
+        session.add(user)
+        session.flush()
+        session.add(main.LiveSession(user_id=user.id, room_slug="luna"))
+        session.commit()
+
+    monkeypatch.setattr(sys.modules["livekit_webhook"].presence_batcher, "flush_interval", 3600)
+    yield main
+
+
+def _post(client, body, secret=SECRET):
+    return client.post(
+        "/api/livekit/webhook", content=body, headers=signed_request(body, "johka_live_key", secret)
+    )
+
+
+def _session(main):
+    with main.engine.connect() as conn:
+        return conn.execute(
+            text("SELECT id, viewers, unique_viewers, ended_at FROM live_sessions")
+        ).one()
+
+
+def test_webhook_events_are_coalesced_into_presence(app_module):
+    main = app_module
+    batcher = sys.modules["livekit_webhook"].presence_batcher
+
+    with TestClient(main.app) as client:
+        assert _post(client, event_body("participant_joined", "luna", "alice")).status_code == 200
+        assert _post(client, event_body("participant_joined", "luna", "bob")).status_code == 200
+        assert _post(client, event_body("participant_left", "luna", "bob")).status_code == 200
+        # De creator zelf (publish-recht) is geen kijker.
+        assert _post(
+            client, event_body("participant_joined", "luna", "luna", can_publish=True)
+        ).status_code == 200
+        assert _post(client, event_body("participant_joined", "ghost", "carol")).status_code == 200
+
+        forged = event_body("participant_joined", "luna", "mallory")
+        assert _post(client, forged, secret="verkeerd").status_code == 401
+        assert client.post("/api/livekit/webhook", content=forged).status_code == 401
+
+        # view-start is een no-op zodra de webhook de bron is.
+        assert client.post("/api/room/view-start", json={"room": "luna"}).json()["ok"]
+
+        assert batcher.pending() == 3
+        assert asyncio.run(batcher.flush()) == 3
+        sid, viewers, unique_viewers, ended_at = _session(main)
+        assert (viewers, unique_viewers, ended_at) == (1, 2, None)
+        with main.engine.connect() as conn:
+            rows = dict(
+                conn.execute(
+                    text("SELECT viewer_ip, left_at IS NULL FROM live_viewers WHERE session_id = :sid"),
+                    {"sid": sid},
+                ).all()
+            )
+        assert rows == {"alice": 1, "bob": 0}
+
+        assert _post(client, event_body("room_finished", "luna")).status_code == 200
+        asyncio.run(batcher.flush())
+        _sid, viewers, _unique, ended_at = _session(main)
+        assert viewers == 0 and ended_at is not None
+        with main.engine.connect() as conn:
+            assert conn.execute(
+                text("SELECT COUNT(*) FROM live_viewers WHERE left_at IS NULL")
+            ).scalar_one() == 0
+
+
+def test_webhook_is_ignored_while_view_start_is_the_source(app_module, monkeypatch):
+    main = app_module
+    batcher = sys.modules["livekit_webhook"].presence_batcher
+    monkeypatch.setattr(sys.modules["livekit_webhook"], "LIVEKIT_WEBHOOK_PRESENCE", False)
+    monkeypatch.setattr(sys.modules["room"], "LIVEKIT_WEBHOOK_PRESENCE", False)
+    monkeypatch.setattr(sys.modules["viewer_presence"].viewer_presence, "redis", None)
+
+    with TestClient(main.app) as client:
+        assert client.post("/api/room/view-start", json={"room": "luna"}).json()["ok"]
+        response = _post(client, event_body("participant_joined", "luna", "alice"))
+        assert response.status_code == 200 and response.json()["ignored"]
+        assert _post(client, event_body("room_finished", "luna")).json()["ignored"]
+        # Handtekening wordt ook zonder vlag gecontroleerd.
+        forged = event_body("participant_joined", "luna", "mallory")
+        assert _post(client, forged, secret="verkeerd").status_code == 401
+
+    assert batcher.pending() == 0 and asyncio.run(batcher.flush()) == 0
+    _sid, viewers, _unique, ended_at = _session(main)
+    assert viewers == 1 and ended_at is None
+    with main.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM live_viewers")).scalar_one() == 1
+
+
+def test_out_of_order_leave_does_not_undo_a_later_join():
+    from livekit_webhook import PresenceBatcher
+
+    async def scenario():
+        batcher = PresenceBatcher(flush_interval=3600)
+        batcher.add("participant_joined", "luna", "alice", ts=100)
+        batcher.add("participant_left", "luna", "alice", ts=200)
+        batcher.add("participant_joined", "luna", "alice", ts=300)
+        batcher.add("participant_left", "luna", "alice", ts=250)
+        state = batcher._viewers[("luna", "alice")]
+        batcher._flusher.cancel()
+        return state
+
+    state = asyncio.run(scenario())
+    assert state["left"] is None and state["joined"].timestamp() > 0
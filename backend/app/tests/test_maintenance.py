@@ -0,0 +1,261 @@
+import sys
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from importlib import reload
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class FakeRedis:
+    """Gedeelde key-value store voor twee schedulers (SET NX EX en de compare-scripts)."""
+
+    def __init__(self):
+        self.values = {}
+        self.commands = []
+
+    async def set(self, key, value, nx=False, ex=None):
+        self.commands.append("set")
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, node_id, *args):
+        # Atomair zoals in Redis: vergelijken en verlengen/wissen in één stap.
+        self.commands.append("eval")
+        if self.values.get(key) != node_id:
+            return 0
+        if "'del'" in script:
+            del self.values[key]
+        return 1
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "maintenance",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+
+    previews = tmp_path / "previews"
+    previews.mkdir()
+    yield main, sys.modules["maintenance"], previews
+
+
+def _touch(previews, name, age_hours=0):
+    path = previews / name
+    path.write_bytes(b"x")
+    stamp = time.time() - age_hours * 3600
+    os.utime(path, (stamp, stamp))
+
+
+def _add_sessions(main, specs):
+    """``specs``: (username, snapshot, ended uur geleden of None)."""
+
+    now = datetime.utcnow()
+    with main.SessionLocal() as session:
+        for username, snapshot, ended in specs:
+            user = main.UserDB(username=username, email=f"{username}@example.com", password_hash="x")
+            session.add(user)
+            session.flush()
+            session.add(
+                main.LiveSession(
+                    user_id=user.id,
+                    room_slug=username,
+                    snapshot=snapshot,
+                    ended_at=None if ended is None else now - timedelta(hours=ended),
+                )
+            )
+        session.commit()
+
+
+def test_reaper_removes_ended_previews_in_batches(app_module):
+    main, maintenance, previews = app_module
+    _add_sessions(
+        main,
+        [
+            ("old1", "1-aaaaaaaaaaaaaaaa.jpg", 30),
+            ("old2", "2-bbbbbbbbbbbbbbbb.jpg", 20),
+            ("recent", "3-cccccccccccccccc.jpg", 1),
+            ("live", "4-dddddddddddddddd.jpg", None),
+        ],
+    )
+    for name in ("1-aaaaaaaaaaaaaaaa", "2-bbbbbbbbbbbbbbbb", "3-cccccccccccccccc", "4-dddddddddddddddd"):
+        _touch(previews, f"{name}.jpg")
+        _touch(previews, f"{name}-160w.webp")
+
+    reap = maintenance.reap_ended_previews
+    assert reap(str(previews), retention_hours=6, batch=1, bind=main.engine) == 1
+    assert not (previews / "1-aaaaaaaaaaaaaaaa.jpg").exists()
+    assert not (previews / "1-aaaaaaaaaaaaaaaa-160w.webp").exists()
+    assert (previews / "2-bbbbbbbbbbbbbbbb.jpg").exists()
+
+    assert reap(str(previews), retention_hours=6, batch=1, bind=main.engine) == 1
+    assert reap(str(previews), retention_hours=6, batch=1, bind=main.engine) == 0
+
+    assert sorted(p.name for p in previews.iterdir()) == [
+        "3-cccccccccccccccc-160w.webp",
+        "3-cccccccccccccccc.jpg",
+        "4-dddddddddddddddd-160w.webp",
+        "4-dddddddddddddddd.jpg",
+    ]
+    with main.engine.connect() as conn:
+        snapshots = dict(
+            conn.execute(
+                text("SELECT room_slug, snapshot FROM live_sessions")
+            ).all()
+        )
+    assert snapshots["old1"] is None and snapshots["old2"] is None
+    assert snapshots["recent"] == "3-cccccccccccccccc.jpg"
+
+
+def test_reaper_keeps_file_still_referenced_elsewhere(app_module):
+    main, maintenance, previews = app_module
+    # Zelfde beeld opnieuw geüpload in een nieuwe uitzending: zelfde naam.
+    _add_sessions(
+        main,
+        [("a", "1-aaaaaaaaaaaaaaaa.jpg", 30), ("b", "1-aaaaaaaaaaaaaaaa.jpg", None)],
+    )
+    _touch(previews, "1-aaaaaaaaaaaaaaaa.jpg")
+
+    assert maintenance.reap_ended_previews(str(previews), bind=main.engine) == 1
+    assert (previews / "1-aaaaaaaaaaaaaaaa.jpg").exists()
+
+
+def test_reaper_removes_previous_generation(app_module):
+    main, maintenance, previews = app_module
+    _add_sessions(main, [("a", "1-aaaaaaaaaaaaaaaa.jpg", 30), ("b", None, 30)])
+    with main.engine.begin() as conn:
+        conn.execute(
+            text(
+                "UPDATE live_sessions SET previous_snapshot = '1-bbbbbbbbbbbbbbbb.jpg'"
+                " WHERE room_slug = 'a'"
+            )
+        )
+        conn.execute(
+            text(
+                "UPDATE live_sessions SET previous_snapshot = '2-cccccccccccccccc.jpg'"
+                " WHERE room_slug = 'b'"
+            )
+        )
+    for name in ("1-aaaaaaaaaaaaaaaa.jpg", "1-bbbbbbbbbbbbbbbb.jpg", "2-cccccccccccccccc.jpg"):
+        _touch(previews, name)
+
+    assert maintenance.reap_ended_previews(str(previews), bind=main.engine) == 2
+    assert list(previews.iterdir()) == []
+
+
+def test_orphan_sweep_is_bounded_and_keeps_referenced(app_module):
+    main, maintenance, previews = app_module
+    _add_sessions(main, [("live", "4-dddddddddddddddd.jpg", None)])
+    _touch(previews, "4-dddddddddddddddd.jpg", age_hours=48)
+    _touch(previews, "4-dddddddddddddddd-240w.jpg", age_hours=48)
+    for i in range(5):
+        _touch(previews, f"legacy_{i}.jpg", age_hours=48)
+    _touch(previews, ".upload-fresh.part")
+
+    sweep = maintenance.sweep_orphan_previews
+    assert sweep(str(previews), max_age_hours=6, limit=3, bind=main.engine) == 3
+    assert sweep(str(previews), max_age_hours=6, limit=3, bind=main.engine) == 2
+    assert sweep(str(previews), max_age_hours=6, limit=3, bind=main.engine) == 0
+    assert sorted(p.name for p in previews.iterdir()) == [
+        ".upload-fresh.part",
+        "4-dddddddddddddddd-240w.jpg",
+        "4-dddddddddddddddd.jpg",
+    ]
+
+
+def test_only_one_scheduler_runs_jobs(app_module):
+    _main, maintenance, _previews = app_module
+    redis = FakeRedis()
+    calls = []
+    schedulers = [maintenance.MaintenanceScheduler(redis, tick=60) for _ in range(2)]
+    for scheduler in schedulers:
+        scheduler.add("job", 0, lambda name=scheduler.node_id: calls.append(name) or 1)
+
+    async def ticks():
+        for _ in range(3):
+            for scheduler in schedulers:
+                await scheduler.run_pending()
+
+    asyncio.run(ticks())
+    first, second = schedulers
+    assert calls == [first.node_id] * 3
+    assert first.is_leader and not second.is_leader
+    assert first.stats()["jobs"]["job"]["runs"] == 3
+
+    # Leider stopt: de lock komt vrij en de andere neemt over.
+    asyncio.run(first.stop())
+    asyncio.run(second.run_pending())
+    assert second.is_leader
+    assert calls[-1] == second.node_id
+
+
+def test_leadership_is_renewed_and_released_atomically(app_module):
+    _main, maintenance, _previews = app_module
+    redis = FakeRedis()
+    first, second = (maintenance.MaintenanceScheduler(redis, tick=60) for _ in range(2))
+
+    async def scenario():
+        assert await first._acquire()
+        # De key verloopt en een andere node neemt de lock.
+        redis.values.clear()
+        assert await second._acquire()
+        assert not await first._acquire()
+        first.is_leader = True
+        await first._release()
+        assert redis.values[maintenance.LEADER_KEY] == second.node_id
+
+    asyncio.run(scenario())
+    assert redis.commands == ["set", "set", "set", "eval", "eval"]
+
+
+def test_import_starts_no_cleanup_thread(app_module):
+    main, maintenance, _previews = app_module
+    assert not any(isinstance(t, threading.Timer) for t in threading.enumerate())
+
+    with TestClient(main.app):
+        assert maintenance.maintenance._task is not None
+    assert maintenance.maintenance._task is None
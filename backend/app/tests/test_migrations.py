@@ -0,0 +1,131 @@
+import re
+import sys
+from importlib import reload
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import create_engine, event, inspect
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+    monkeypatch.setenv("IMAGE_EXECUTOR", "thread")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "images",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+    monkeypatch.setattr(main, "AVATAR_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "GALLERY_DIR", str(tmp_path))
+
+    yield main
+
+
+def test_versions_are_unique_and_ordered(app_module):
+    import migrations
+
+    versions = [m.version for m in migrations.MIGRATIONS]
+    assert versions == sorted(set(versions))
+    assert versions[0] == 1
+
+
+def test_upgrade_on_sqlite_creates_live_tables(app_module, tmp_path):
+    import migrations
+
+    bind = create_engine(f"sqlite:///{tmp_path/'fresh.db'}", future=True)
+    assert migrations.upgrade(bind) == []
+    assert migrations.pending(bind) == []
+
+    tables = set(inspect(bind).get_table_names())
+    assert {"live_sessions", "live_viewers", "room_logs"} <= tables
+    columns = {c["name"] for c in inspect(bind).get_columns("users")}
+    assert {"bio", "avatar_url", "gallery_json", "blocked"} <= columns
+
+
+def test_profile_routes_run_no_ddl(app_module):
+    main = app_module
+    with main.SessionLocal() as session:
+        user = main.UserDB(username="alice", email="alice@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    statements = []
+
+    def _record(_conn, _cursor, statement, *_args):
+        statements.append(statement.lstrip().upper())
+
+    engines = [main.engine, sys.modules["database"].get_async_engine().sync_engine]
+    for bind in engines:
+        event.listen(bind, "before_cursor_execute", _record)
+
+    token = main.create_access_token({"sub": str(user_id), "username": "alice"})
+    auth = {"Authorization": f"Bearer {token}"}
+    buf = BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buf, "PNG")
+    png = buf.getvalue()
+    try:
+        with TestClient(main.app) as client:
+            statements.clear()
+            response = client.post("/api/me/update", json={"bio": "hallo"}, headers=auth)
+            assert response.status_code == 200
+            response = client.post(
+                "/api/me/avatar", files={"file": ("a.png", png, "image/png")}, headers=auth
+            )
+            assert response.status_code == 200
+            response = client.post(
+                "/api/me/gallery", files={"file": ("g.png", png, "image/png")}, headers=auth
+            )
+            assert response.status_code == 200
+    finally:
+        for bind in engines:
+            event.remove(bind, "before_cursor_execute", _record)
+
+    assert statements
+    assert not [s for s in statements if s.startswith(("ALTER", "CREATE", "DROP"))]
+
+    with main.SessionLocal() as session:
+        user = session.get(main.UserDB, user_id)
+        assert user.bio == "hallo"
+        assert re.search(r"/avatars/1-[0-9a-f]{16}\.jpg$", user.avatar_url)
+        assert user.gallery_json is None
+        urls = session.query(sys.modules["models"].GalleryItem.url).filter_by(user_id=user_id).all()
+        assert len(urls) == 1 and re.search(r"/gallery/1/1-[0-9a-f]{16}\.jpg$", urls[0].url)
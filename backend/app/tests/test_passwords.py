@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from fastapi import HTTPException
+
+os.environ.setdefault("POSTGRES_PASSWORD", "test-password")
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+import passwords  # noqa: E402
+from workers import BoundedPool  # noqa: E402
+
+
+def test_hash_and_verify_run_in_process_pool():
+    pool = BoundedPool("test-passwords", max_workers=2, max_queue=4)
+    try:
+        hashed = asyncio.run(pool.run(passwords.hash_password, "secret"))
+        assert passwords.pwd_ctx.verify("secret", hashed)
+        assert asyncio.run(pool.run(passwords.verify_password, "secret", hashed)) is True
+        assert asyncio.run(pool.run(passwords.verify_password, "wrong", hashed)) is False
+    finally:
+        pool.shutdown()
+
+    stats = pool.stats()
+    assert stats["completed"] == 3
+    assert stats["pending"] == 0
+    assert stats["rejected"] == 0
+
+
+def test_pool_rejects_when_queue_is_full():
+    pool = BoundedPool("test-busy", max_workers=1, max_queue=1, kind="thread")
+
+    async def burst():
+        jobs = [pool.run(time.sleep, 0.2) for _ in range(3)]
+        return await asyncio.gather(*jobs, return_exceptions=True)
+
+    try:
+        results = asyncio.run(burst())
+    finally:
+        pool.shutdown()
+
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1
+    assert rejected[0].status_code == 503
+    assert pool.stats()["rejected"] == 1
+    assert pool.stats()["completed"] == 2
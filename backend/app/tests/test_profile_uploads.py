@@ -0,0 +1,210 @@
+import sys
+from importlib import reload
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+    monkeypatch.setenv("IMAGE_EXECUTOR", "thread")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "images",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+
+    avatars, gallery = tmp_path / "avatars", tmp_path / "gallery"
+    avatars.mkdir()
+    gallery.mkdir()
+    monkeypatch.setattr(main, "AVATAR_DIR", str(avatars))
+    monkeypatch.setattr(main, "GALLERY_DIR", str(gallery))
+
+    with main.SessionLocal() as session:
+        user = main.UserDB(username="luna", email="luna@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        token = main.create_access_token({"sub": str(user.id), "username": "luna"})
+
+    yield main, avatars, gallery, {"Authorization": f"Bearer {token}"}
+
+
+def _image(size, color="red", fmt="JPEG", mode="RGB", exif=False):
+    img = Image.new(mode, size, color)
+    buf = BytesIO()
+    kwargs = {}
+    if exif:
+        tags = Image.Exif()
+        tags[0x010F] = "SecretCam"  # Make
+        tags[0x0112] = 6  # Orientation: 90° gedraaid
+        kwargs["exif"] = tags.tobytes()
+    img.save(buf, fmt, **kwargs)
+    return buf.getvalue()
+
+
+def _names(folder):
+    return sorted(p.name for p in folder.rglob("*") if p.is_file())
+
+
+def test_avatar_is_normalized_stripped_and_deduped(app_module):
+    main, avatars, _gallery, headers = app_module
+    original = _image((1200, 800), exif=True)
+    with TestClient(main.app) as client:
+        res = client.post(
+            "/api/me/avatar", files={"file": ("me.jpg", original, "image/jpeg")}, headers=headers
+        )
+        assert res.status_code == 200
+        url = res.json()["url"]
+        name = url.rsplit("/", 1)[1]
+        assert name.startswith("1-") and name.endswith(".jpg") and "?" not in url
+        assert _names(avatars) == sorted([name, name.replace(".jpg", "-96w.jpg")])
+
+        with Image.open(avatars / name) as img:
+            assert img.size == (256, 256)
+            assert not img.getexif()
+        with Image.open(avatars / name.replace(".jpg", "-96w.jpg")) as img:
+            assert img.size == (96, 96)
+
+        # Zelfde bytes (raw body): zelfde bestand, niets nieuws op schijf.
+        again = client.post(
+            "/api/me/avatar", content=original, headers={**headers, "Content-Type": "image/jpeg"}
+        )
+        assert again.json()["url"] == url
+        assert len(_names(avatars)) == 2
+
+        creator = client.get("/api/creator/luna").json()
+        assert creator["avatar"] == url
+        assert creator["avatar_thumb"] == url.replace(".jpg", "-96w.jpg")
+
+        # Nieuwe avatar: de vorige (met variant) verdwijnt.
+        other = client.post(
+            "/api/me/avatar", files={"file": ("x.png", _image((300, 300), "blue", "PNG"), "image/png")},
+            headers=headers,
+        ).json()["url"]
+    assert other != url
+    assert len(_names(avatars)) == 2 and name not in _names(avatars)
+
+
+def test_gallery_renditions_and_dedupe(app_module):
+    main, _avatars, gallery, headers = app_module
+    png = _image((2000, 1000), (0, 0, 0, 0), "PNG", mode="RGBA")
+    with TestClient(main.app) as client:
+        first = client.post("/api/me/gallery", files={"file": ("../evil.png", png, "image/png")}, headers=headers)
+        second = client.post("/api/me/gallery", files={"file": ("copy.png", png, "image/png")}, headers=headers)
+        assert first.status_code == second.status_code == 200
+        assert first.json()["url"] == second.json()["url"]
+        assert client.get("/api/creator/luna").json()["gallery"] == [first.json()["url"]]
+
+    name = first.json()["url"].rsplit("/", 1)[1]
+    assert _names(gallery) == sorted([name, name.replace(".jpg", "-480w.jpg")])
+    with Image.open(gallery / "1" / name) as img:
+        assert img.format == "JPEG" and img.size == (1280, 640)
+        # Transparant wordt wit, niet zwart.
+        assert img.getpixel((10, 10)) == (255, 255, 255)
+    with Image.open(gallery / "1" / name.replace(".jpg", "-480w.jpg")) as img:
+        assert img.size == (480, 240)
+
+
+def test_upload_limits_and_validation(app_module, monkeypatch):
+    main, avatars, gallery, headers = app_module
+    monkeypatch.setattr(main, "AVATAR_MAX_BYTES", 1024)
+    with TestClient(main.app) as client:
+        too_big = client.post(
+            "/api/me/avatar", files={"file": ("big.jpg", b"\xff\xd8\xff" + b"x" * 4096, "image/jpeg")},
+            headers=headers,
+        )
+        assert too_big.status_code == 413
+
+        not_image = client.post(
+            "/api/me/gallery", files={"file": ("x.jpg", b"<?php echo 1; ?>", "image/jpeg")}, headers=headers
+        )
+        assert not_image.status_code == 415
+
+        broken = client.post(
+            "/api/me/gallery", files={"file": ("x.jpg", b"\xff\xd8\xff\xe0" + b"\0" * 64, "image/jpeg")},
+            headers=headers,
+        )
+        assert broken.status_code == 415
+    assert _names(avatars) == [] and _names(gallery) == []
+
+
+def test_gallery_is_paginated_and_soft_deleted(app_module):
+    main, _avatars, _gallery, headers = app_module
+    with TestClient(main.app) as client:
+        ids = []
+        for color in ("red", "green", "blue", "yellow", "purple"):
+            res = client.post(
+                "/api/me/gallery",
+                files={"file": ("p.jpg", _image((64, 64), color), "image/jpeg")},
+                headers=headers,
+            )
+            ids.append(res.json()["id"])
+
+        page = client.get("/api/creator/luna", params={"gallery_limit": 2}).json()
+        assert [item["id"] for item in page["gallery_items"]] == ids[:2]
+        assert page["gallery_next"] == ids[1]
+        assert page["gallery_items"][0]["thumb"].endswith("-480w.jpg")
+
+        rest = client.get(
+            "/api/creator/luna", params={"gallery_limit": 10, "gallery_after": page["gallery_next"]}
+        ).json()
+        assert [item["id"] for item in rest["gallery_items"]] == ids[2:]
+        assert rest["gallery_next"] is None
+
+        etag = client.get("/api/creator/luna").headers["etag"]
+        assert client.delete(f"/api/me/gallery/{ids[0]}", headers=headers).json()["status"] == "ok"
+        assert client.delete(f"/api/me/gallery/{ids[0]}", headers=headers).status_code == 404
+        visible = client.get("/api/creator/luna", headers={"If-None-Match": etag})
+        assert visible.status_code == 200
+        visible = visible.json()
+        assert [item["id"] for item in visible["gallery_items"]] == ids[1:]
+
+        # Dezelfde foto opnieuw: de rij komt terug, geen duplicaat.
+        again = client.post(
+            "/api/me/gallery",
+            files={"file": ("p.jpg", _image((64, 64), "red"), "image/jpeg")},
+            headers=headers,
+        ).json()
+        assert again["id"] == ids[0]
+        assert len(client.get("/api/creator/luna").json()["gallery"]) == 5
+
+    with main.SessionLocal() as session:
+        assert session.get(main.UserDB, 1).gallery_json is None
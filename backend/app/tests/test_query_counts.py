@@ -0,0 +1,104 @@
+import sys
+from importlib import reload
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+
+    yield main
+
+
+def _seed(main, n):
+    from models import PrivateMessage
+
+    with main.SessionLocal() as session:
+        users = [
+            main.UserDB(username=f"user{i}", email=f"u{i}@example.com", password_hash="x")
+            for i in range(n + 1)
+        ]
+        session.add_all(users)
+        session.flush()
+        me, others = users[0], users[1:]
+        for i, other in enumerate(others):
+            sender, receiver = (me, other) if i % 2 else (other, me)
+            session.add(PrivateMessage(sender_id=sender.id, receiver_id=receiver.id, message=f"hoi {i}"))
+            session.add(main.Tip(from_user_id=sender.id, to_user_id=receiver.id, amount=i + 1))
+        session.commit()
+        return me.id
+
+
+def _statements(main, client, url, headers):
+    queries = []
+    listener = lambda *a: queries.append(a[2])  # noqa: E731
+    event.listen(main.engine, "before_cursor_execute", listener)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(main.engine, "before_cursor_execute", listener)
+    assert response.status_code == 200
+    return response.json(), len(queries)
+
+
+@pytest.mark.parametrize("rows", [3, 30])
+def test_inbox_and_tips_use_constant_statements(app_module, rows):
+    main = app_module
+    user_id = _seed(main, rows)
+    token = main.create_access_token({"sub": str(user_id), "username": "user0"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with TestClient(main.app) as client:
+        # Eerste request warmt de auth-cache op.
+        client.get("/api/wallet/history", headers=headers)
+
+        inbox, inbox_statements = _statements(main, client, "/api/dm/inbox", headers)
+        tips, tip_statements = _statements(main, client, "/api/tips", headers)
+
+    assert inbox_statements == 1
+    assert tip_statements == 1
+    assert len(inbox) == len(tips) == rows
+    assert {m["from"] for m in inbox} | {m["to"] for m in inbox} >= {"user0", "user1"}
+    assert all("user0" in (t["from"], t["to"]) for t in tips)
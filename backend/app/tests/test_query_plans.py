@@ -0,0 +1,291 @@
+"""EXPLAIN-regressietest voor de hete query-vormen.
+
+Draait enkel tegen een echte PostgreSQL (``TEST_POSTGRES_URL``), bv.::
+
+    TEST_POSTGRES_URL=postgresql+psycopg2://johka:pw@localhost:5432/johka_test pytest tests/test_query_plans.py
+
+De test maakt een eigen schema aan, past alle migraties toe, seedt wat rijen
+en faalt als een query-vorm nog op een sequential scan terugvalt.
+"""
+
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+pytestmark = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL niet gezet")
+
+os.environ.setdefault("POSTGRES_PASSWORD", "test-password")
+os.environ.setdefault("SQLALCHEMY_URL", "sqlite:///:memory:")
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+import migrations  # noqa: E402
+
+
+QUERY_SHAPES = {
+    "live_by_user": (
+        "SELECT room_slug FROM live_sessions WHERE user_id = :uid AND ended_at IS NULL LIMIT 1",
+        {"uid": 1},
+    ),
+    "live_by_room": (
+        "SELECT id FROM live_sessions WHERE room_slug = :room AND ended_at IS NULL",
+        {"room": "creator-1"},
+    ),
+    "live_directory": (
+        "SELECT id, user_id FROM live_sessions WHERE ended_at IS NULL ORDER BY started_at DESC",
+        {},
+    ),
+    "viewer_open": (
+        "SELECT id FROM live_viewers WHERE session_id = :sid AND viewer_ip = :ip AND left_at IS NULL",
+        {"sid": 1, "ip": "10.0.0.1"},
+    ),
+    "viewer_reopen": (
+        "SELECT id FROM live_viewers WHERE session_id = :sid AND viewer_ip = :ip",
+        {"sid": 1, "ip": "10.0.0.1"},
+    ),
+    "dm_inbox": (
+        "SELECT id FROM private_messages WHERE receiver_id = :uid OR sender_id = :uid"
+        " ORDER BY created_at DESC LIMIT 50",
+        {"uid": 1},
+    ),
+    "dm_inbox_since": (
+        "SELECT id FROM private_messages WHERE receiver_id = :uid AND id > :since"
+        " UNION ALL SELECT id FROM private_messages WHERE sender_id = :uid AND id > :since",
+        {"uid": 1, "since": 1900},
+    ),
+    "preview_reaper": (
+        "SELECT id, snapshot, previous_snapshot FROM live_sessions"
+        " WHERE ended_at IS NOT NULL"
+        " AND (snapshot IS NOT NULL OR previous_snapshot IS NOT NULL) AND ended_at < NOW()"
+        " ORDER BY ended_at LIMIT 200",
+        {},
+    ),
+    "gallery_page": (
+        "SELECT id, url FROM gallery_items"
+        " WHERE user_id = :uid AND deleted_at IS NULL AND id > :after ORDER BY id LIMIT 25",
+        {"uid": 1, "after": 0},
+    ),
+    "dm_threads": (
+        "SELECT id FROM dm_threads WHERE user_low_id = :uid"
+        " ORDER BY last_activity_at DESC, id DESC LIMIT 20",
+        {"uid": 1},
+    ),
+    "dm_thread_messages": (
+        "SELECT id FROM private_messages WHERE thread_id = :tid AND id < :before"
+        " ORDER BY id DESC LIMIT 50",
+        {"tid": 1, "before": 1000},
+    ),
+    "tips": (
+        "SELECT id FROM tips WHERE from_user_id = :uid OR to_user_id = :uid"
+        " ORDER BY created_at DESC LIMIT 50",
+        {"uid": 1},
+    ),
+    "wallet_history": (
+        "SELECT change FROM wallet_history WHERE user_id = :uid ORDER BY created_at DESC LIMIT 50",
+        {"uid": 1},
+    ),
+    "room_ban": (
+        "SELECT id FROM room_bans WHERE room_id = :rid AND identity = :identity",
+        {"rid": 1, "identity": "viewer-1"},
+    ),
+    "room_timeout": (
+        "SELECT id FROM room_timeouts WHERE room_id = :rid AND identity = :identity",
+        {"rid": 1, "identity": "viewer-1"},
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def pg_engine():
+    schema = f"plan_test_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(TEST_POSTGRES_URL, future=True)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+
+    bind = create_engine(
+        TEST_POSTGRES_URL,
+        future=True,
+        connect_args={"options": f"-csearch_path={schema}"},
+    )
+    try:
+        migrations.upgrade(bind)
+        _seed(bind)
+        yield bind
+    finally:
+        bind.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+def _seed(bind):
+    with bind.begin() as conn:
+        conn.execute(
+            text(
+                """
+            INSERT INTO users (username, email, password_hash, gender, is_verified)
+            SELECT 'creator' || g, 'creator' || g || '@example.com', 'x', 'female', TRUE
+              FROM generate_series(1, 200) g
+            """
+            )
+        )
+        conn.execute(
+            text(
+                """
+            INSERT INTO rooms (user_id, name, slug)
+            SELECT id, username, 'creator-' || id FROM users
+            """
+            )
+        )
+        conn.execute(
+            text(
+                """
+            INSERT INTO live_sessions (user_id, room_slug, started_at, ended_at)
+            SELECT id, 'creator-' || id, NOW() - (id || ' minutes')::interval,
+                   CASE WHEN id % 10 = 0 THEN NULL ELSE NOW() END
+              FROM users
+            """
+            )
+        )
+        conn.execute(
+            text(
+                """
+            INSERT INTO live_viewers (session_id, viewer_ip, left_at)
+            SELECT s.id, '10.0.' || (g / 256) || '.' || (g % 256),
+                   CASE WHEN g % 3 = 0 THEN NULL ELSE NOW() END
+              FROM live_sessions s, generate_series(1, 20) g
+            """
+            )
+        )
+        conn.execute(
+            text(
+                """
+            INSERT INTO private_messages (sender_id, receiver_id, message, created_at)
+            SELECT 1 + g % 200, 1 + (g * 7) % 200, 'hoi', NOW() - (g || ' seconds')::interval
+              FROM generate_series(1, 2000) g
+            """
+            )
+        )
+        conn.execute(
+            text(
+                """
+            INSERT INTO tips (from_user_id, to_user_id, amount, created_at)
+            SELECT 1 + g % 200, 1 + (g * 3) % 200, 5, NOW() - (g || ' seconds')::interval
+              FROM generate_series(1, 2000) g
+            """
+            )
+        )
+        conn.execute(
+            text(
+                """
+            INSERT INTO wallet_history (user_id, change, reason, created_at)
+            SELECT 1 + g % 200, 10, 'mollie', NOW() - (g || ' seconds')::interval
+              FROM generate_series(1, 2000) g
+            """
+            )
+        )
+        conn.execute(
+            text(
+                """
+            INSERT INTO room_bans (room_id, identity, username)
+            SELECT r.id, 'viewer-' || g, 'viewer-' || g
+              FROM rooms r, generate_series(1, 5) g
+            """
+            )
+        )
+        conn.execute(
+            text(
+                """
+            INSERT INTO room_timeouts (room_id, identity, username, until)
+            SELECT r.id, 'viewer-' || g, 'viewer-' || g, NOW()
+              FROM rooms r, generate_series(1, 5) g
+            """
+            )
+        )
+    with bind.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.execute(text("ANALYZE"))
+
+
+def test_migrations_are_idempotent(pg_engine):
+    assert migrations.upgrade(pg_engine) == []
+    assert migrations.pending(pg_engine) == []
+
+
+def test_migrated_schema_matches_models(pg_engine):
+    # v1 is bevroren DDL: alles wat models.py sindsdien kreeg moet uit een migratie komen.
+    inspector = inspect(pg_engine)
+    for table in migrations.Base.metadata.sorted_tables:
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        assert columns == {c.name for c in table.columns}, table.name
+        indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        assert {ix.name for ix in table.indexes} <= indexes, table.name
+
+
+def test_gallery_migration_skips_malformed_json():
+    schema = f"gallery_test_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(TEST_POSTGRES_URL, future=True)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    bind = create_engine(
+        TEST_POSTGRES_URL,
+        future=True,
+        connect_args={"options": f"-csearch_path={schema}"},
+    )
+    blobs = {
+        "ok": '["https://x/a.jpg", 3, null, "https://x/b.jpg"]',
+        "broken": '["https://x/c.jpg"',
+        "object": '{"url": "https://x/d.jpg"}',
+    }
+    try:
+        with bind.connect() as conn:
+            migrations._ensure_version_table(conn)
+            conn.commit()
+            for migration in migrations.MIGRATIONS:
+                if migration.version < 11:
+                    migrations._apply(conn, migration)
+        with bind.begin() as conn:
+            for name, blob in blobs.items():
+                conn.execute(
+                    text(
+                        "INSERT INTO users (username, email, password_hash, is_verified, gallery_json)"
+                        " VALUES (:n, :n || '@example.com', 'x', FALSE, :g)"
+                    ),
+                    {"n": name, "g": blob},
+                )
+
+        assert 11 in migrations.upgrade(bind)
+
+        with bind.connect() as conn:
+            urls = conn.execute(
+                text(
+                    "SELECT g.url FROM gallery_items g JOIN users u ON u.id = g.user_id"
+                    " WHERE u.username = 'ok' ORDER BY g.id"
+                )
+            ).scalars().all()
+            left = dict(conn.execute(text("SELECT username, gallery_json FROM users")).all())
+        assert urls == ["https://x/a.jpg", "https://x/b.jpg"]
+        assert left == {"ok": None, "broken": blobs["broken"], "object": blobs["object"]}
+    finally:
+        bind.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+@pytest.mark.parametrize("shape", sorted(QUERY_SHAPES))
+def test_query_shape_uses_index(pg_engine, shape):
+    sql, params = QUERY_SHAPES[shape]
+    with pg_engine.connect() as conn:
+        # Zonder bruikbare index kiest de planner dan nog steeds een seq scan
+        # (met absurde kost); met index nooit.
+        conn.execute(text("SET enable_seqscan = off"))
+        plan = "\n".join(row[0] for row in conn.execute(text(f"EXPLAIN {sql}"), params))
+    assert "Seq Scan" not in plan, f"{shape} valt terug op een seq scan:\n{plan}"
@@ -0,0 +1,120 @@
+import sys
+from importlib import reload
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+
+    yield main
+
+
+def _seed(main):
+    from models import LiveSession
+
+    with main.SessionLocal() as session:
+        for i, gender in enumerate(["female", "male", "female", "trans", "female"], start=1):
+            user = main.UserDB(
+                username=f"creator{i}", email=f"c{i}@example.com", password_hash="x", gender=gender
+            )
+            session.add(user)
+            session.flush()
+            session.add(
+                main.RoomDB(
+                    user_id=user.id,
+                    name=f"Room {i}",
+                    slug=f"creator{i}",
+                    access_mode="paid" if i == 3 else "public",
+                )
+            )
+            if i in (2, 3):
+                session.add(LiveSession(user_id=user.id, room_slug=f"creator{i}"))
+        session.commit()
+
+
+def test_rooms_keyset_pagination_single_query_per_page(app_module):
+    main = app_module
+    _seed(main)
+
+    queries = []
+    listener = lambda *a: queries.append(a[2])  # noqa: E731
+    event.listen(main.engine, "before_cursor_execute", listener)
+    slugs = []
+    try:
+        with TestClient(main.app) as client:
+            url, pages = "/api/rooms?limit=2", 0
+            while url:
+                queries.clear()
+                response = client.get(url)
+                assert response.status_code == 200
+                assert len(queries) == 1
+                slugs += [r["slug"] for r in response.json()]
+                assert all(r["owner"] == r["slug"] for r in response.json())
+                pages += 1
+                cursor = response.headers.get("x-next-cursor")
+                url = f"/api/rooms?limit=2&cursor={cursor}" if cursor else None
+    finally:
+        event.remove(main.engine, "before_cursor_execute", listener)
+
+    assert pages == 3
+    assert slugs == [f"creator{i}" for i in range(1, 6)]
+
+
+def test_rooms_filters(app_module):
+    main = app_module
+    _seed(main)
+
+    with TestClient(main.app) as client:
+        def slugs(query):
+            response = client.get(f"/api/rooms?{query}")
+            assert response.status_code == 200
+            return [r["slug"] for r in response.json()]
+
+        assert slugs("live=true") == ["creator2", "creator3"]
+        assert slugs("live=false&gender=female") == ["creator1", "creator5"]
+        assert slugs("access_mode=paid") == ["creator3"]
+        assert slugs("gender=trans") == ["creator4"]
+        assert client.get("/api/rooms?limit=0").status_code == 422
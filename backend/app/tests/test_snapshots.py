@@ -0,0 +1,277 @@
+import sys
+import base64
+from importlib import reload
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import text
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+    monkeypatch.setenv("IMAGE_EXECUTOR", "thread")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "images",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+
+    previews = tmp_path / "previews"
+    previews.mkdir()
+    monkeypatch.setattr(sys.modules["room"], "PREVIEW_DIR", str(previews))
+
+    with main.SessionLocal() as session:
+        user = main.UserDB(username="luna", email="luna@example.com", password_hash="x")
+        session.add(user)
+        session.flush()
+        session.add(main.LiveSession(user_id=user.id, room_slug="luna"))
+        session.commit()
+        token = main.create_access_token({"sub": str(user.id), "username": "luna"})
+
+    yield main, previews, {"Authorization": f"Bearer {token}"}
+
+
+def _jpeg(color="red"):
+    buf = BytesIO()
+    Image.new("RGB", (32, 24), color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def _files(previews):
+    return sorted(p.name for p in previews.iterdir())
+
+
+def _with_variants(name):
+    from images import preview_variants
+
+    return sorted([name] + [v[0] for v in preview_variants(name)])
+
+
+def _snapshot(main):
+    with main.engine.connect() as conn:
+        return conn.execute(text("SELECT snapshot FROM live_sessions")).scalar_one()
+
+
+def test_raw_snapshot_streams_to_disk(app_module):
+    main, previews, headers = app_module
+    jpeg = _jpeg()
+    with TestClient(main.app) as client:
+        res = client.post(
+            "/api/room/snapshot", content=jpeg, headers={**headers, "Content-Type": "image/jpeg"}
+        )
+    assert res.status_code == 200
+    name = res.json()["file"]
+    assert name.endswith(".jpg") and _snapshot(main) == name
+    assert (previews / name).read_bytes() == jpeg
+    assert _files(previews) == _with_variants(name)
+
+
+def test_snapshot_size_cap_and_type_check(app_module, monkeypatch):
+    main, previews, headers = app_module
+    monkeypatch.setattr(sys.modules["room"], "SNAPSHOT_MAX_BYTES", 1024)
+    with TestClient(main.app) as client:
+        too_big = client.post(
+            "/api/room/snapshot",
+            content=b"\xff\xd8\xff" + b"x" * 4096,
+            headers={**headers, "Content-Type": "image/jpeg"},
+        )
+        assert too_big.status_code == 413
+
+        def chunks():
+            yield b"\xff\xd8\xff"
+            for _ in range(8):
+                yield b"x" * 512
+
+        # Zonder Content-Length (chunked) grijpt de limiet tijdens het streamen in.
+        streamed = client.post(
+            "/api/room/snapshot",
+            content=chunks(),
+            headers={**headers, "Content-Type": "image/jpeg"},
+        )
+        assert streamed.status_code == 413
+
+        # Ook de JSON/base64-fallback telt de gestreamde bytes, niet enkel Content-Length.
+        def json_chunks():
+            yield b'{"image": "data:image/jpeg;base64,'
+            for _ in range(80):
+                yield b"A" * 512
+            yield b'"}'
+
+        for url in ("/api/room/snapshot", "/api/room/snapshot-seq"):
+            streamed_json = client.post(
+                url, content=json_chunks(), headers={**headers, "Content-Type": "application/json"}
+            )
+            assert streamed_json.status_code == 413, url
+
+        not_image = client.post(
+            "/api/room/snapshot",
+            content=b"<html>",
+            headers={**headers, "Content-Type": "image/jpeg"},
+        )
+        assert not_image.status_code == 415
+    assert list(previews.iterdir()) == []
+
+
+def test_legacy_base64_snapshot_still_works(app_module):
+    main, previews, headers = app_module
+    data_url = "data:image/jpeg;base64," + base64.b64encode(_jpeg()).decode()
+    with TestClient(main.app) as client:
+        res = client.post("/api/room/snapshot", json={"image": data_url}, headers=headers)
+    assert res.status_code == 200
+    assert (previews / res.json()["file"]).exists()
+
+
+def test_legacy_base64_rejects_non_images_and_oversized_frames(app_module, monkeypatch):
+    main, previews, headers = app_module
+    monkeypatch.setattr(sys.modules["images"], "PREVIEW_MAX_PIXELS", 64 * 64)
+    garbage = "data:image/jpeg;base64," + base64.b64encode(b"not an image at all").decode()
+    big = BytesIO()
+    Image.new("RGB", (128, 128), "blue").save(big, "JPEG")
+    big_url = "data:image/jpeg;base64," + base64.b64encode(big.getvalue()).decode()
+    with TestClient(main.app) as client:
+        for image in (garbage, big_url):
+            res = client.post("/api/room/snapshot", json={"image": image}, headers=headers)
+            assert res.status_code == 400
+        frames = client.post(
+            "/api/room/snapshot-seq", json={"frames": [garbage, big_url, "data:,"]}, headers=headers
+        )
+        assert frames.status_code == 400
+    # Niets half weggeschreven of hernoemd.
+    assert _files(previews) == []
+
+
+def test_json_frames_are_never_opened_as_paths(app_module):
+    main, previews, headers = app_module
+    on_disk = previews.parent / "secret.jpg"
+    on_disk.write_bytes(_jpeg())
+    with TestClient(main.app) as client:
+        res = client.post(
+            "/api/room/snapshot-seq", json={"frames": [str(on_disk)]}, headers=headers
+        )
+    assert res.status_code == 400
+    assert _files(previews) == []
+
+
+def test_json_bodies_of_the_wrong_shape_are_rejected(app_module):
+    main, previews, headers = app_module
+    frame = "data:image/jpeg;base64," + base64.b64encode(_jpeg()).decode()
+    with TestClient(main.app) as client:
+        for body in ([frame], "x", None):
+            for url in ("/api/room/snapshot", "/api/room/snapshot-seq"):
+                assert client.post(url, json=body, headers=headers).status_code == 400, (url, body)
+        res = client.post("/api/room/snapshot", json={"image": [frame]}, headers=headers)
+        assert res.status_code == 400
+        for frames in (frame, {"0": frame}, [frame, 1]):
+            res = client.post("/api/room/snapshot-seq", json={"frames": frames}, headers=headers)
+            assert res.status_code == 400, frames
+    assert _files(previews) == []
+
+
+def test_multipart_snapshot_sequence_builds_gif(app_module):
+    main, previews, headers = app_module
+    files = [("frames", (f"f{i}.jpg", _jpeg(c), "image/jpeg")) for i, c in enumerate(("red", "blue"))]
+    with TestClient(main.app) as client:
+        res = client.post("/api/room/snapshot-seq", files=files, headers=headers)
+    assert res.status_code == 200
+    name = res.json()["file"]
+    with Image.open(previews / name) as gif:
+        assert gif.n_frames == 2
+    # Tijdelijke frame-bestanden zijn opgeruimd.
+    assert _files(previews) == _with_variants(name)
+
+
+def test_full_image_pool_returns_503(app_module, monkeypatch):
+    main, previews, headers = app_module
+    pool = sys.modules["images"].image_pool
+    monkeypatch.setattr(pool, "pending", pool.capacity)
+    with TestClient(main.app) as client:
+        res = client.post(
+            "/api/room/snapshot", content=_jpeg(), headers={**headers, "Content-Type": "image/jpeg"}
+        )
+    assert res.status_code == 503 and res.headers["retry-after"] == "1"
+    assert list(previews.iterdir()) == []
+    assert pool.rejected == 1
+
+
+def test_previews_are_content_addressed_and_replaced_in_place(app_module):
+    main, previews, headers = app_module
+    raw = {**headers, "Content-Type": "image/jpeg"}
+    with TestClient(main.app) as client:
+        first = client.post("/api/room/snapshot", content=_jpeg("red"), headers=raw).json()["file"]
+        again = client.post("/api/room/snapshot", content=_jpeg("red"), headers=raw).json()["file"]
+        assert again == first and first.startswith("1-")
+        second = client.post("/api/room/snapshot", content=_jpeg("blue"), headers=raw).json()["file"]
+        assert second != first
+        # Caches en andere workers kunnen nog naar de vorige wijzen: die blijft staan.
+        assert _files(previews) == sorted(_with_variants(first) + _with_variants(second))
+        third = client.post("/api/room/snapshot", content=_jpeg("green"), headers=raw).json()["file"]
+        # Twee uploads terug mag weg: per room hoogstens twee generaties.
+        assert _files(previews) == sorted(_with_variants(second) + _with_variants(third))
+
+        with main.engine.begin() as conn:
+            conn.execute(text("UPDATE live_sessions SET ended_at = CURRENT_TIMESTAMP"))
+        assert client.post("/api/room/snapshot", content=_jpeg(), headers=raw).status_code == 409
+    assert _files(previews) == sorted(_with_variants(second) + _with_variants(third))
+
+
+def test_variants_are_generated_once_at_ingest(app_module):
+    main, previews, headers = app_module
+    buf = BytesIO()
+    Image.new("RGB", (320, 240), "green").save(buf, "JPEG", quality=95)
+    with TestClient(main.app) as client:
+        name = client.post(
+            "/api/room/snapshot",
+            content=buf.getvalue(),
+            headers={**headers, "Content-Type": "image/jpeg"},
+        ).json()["file"]
+        streams = client.get("/api/public/streams").json()
+
+    stem = name[:-4]
+    with Image.open(previews / f"{stem}-160w.jpg") as thumb:
+        assert thumb.size == (160, 120)
+    with Image.open(previews / f"{stem}-240w.webp") as grid:
+        assert grid.format == "WEBP" and grid.size == (240, 180)
+    assert (previews / f"{stem}-160w.jpg").stat().st_size < len(buf.getvalue())
+
+    srcset = streams[0]["preview_srcset"]
+    assert srcset["thumb"].endswith(f"/{stem}-160w.jpg")
+    assert srcset["jpeg"].split(", ")[-1].endswith(f"/{name} 320w")
+    assert [part.rsplit(" ", 1)[1] for part in srcset["webp"].split(", ")] == ["160w", "240w", "320w"]
@@ -0,0 +1,98 @@
+import sys
+import os
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from backend.app.static_files import IMMUTABLE, UploadStaticFiles, file_version, static_url
+
+
+@pytest.fixture
+def static_root(tmp_path):
+    previews = tmp_path / "uploads" / "previews"
+    previews.mkdir(parents=True)
+    (previews / "7-0123456789abcdef.jpg").write_bytes(bytes(range(256)) * 4)
+    (previews / "7-0123456789abcdef-240w.webp").write_bytes(b"RIFF....WEBP")
+    (tmp_path / "uploads" / "avatar.png").write_bytes(b"\x89PNG avatar")
+    return tmp_path
+
+
+def _client(root, **kwargs):
+    app = FastAPI()
+    app.mount("/static", UploadStaticFiles(directory=str(root), **kwargs), name="static")
+    return TestClient(app)
+
+
+def test_hashed_names_are_immutable_with_content_etag(static_root):
+    client = _client(static_root)
+    for name in ("7-0123456789abcdef.jpg", "7-0123456789abcdef-240w.webp"):
+        response = client.get(f"/static/uploads/previews/{name}")
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == IMMUTABLE
+        assert response.headers["etag"] == '"0123456789abcdef"'
+
+    again = client.get(
+        "/static/uploads/previews/7-0123456789abcdef.jpg",
+        headers={"If-None-Match": '"0123456789abcdef"'},
+    )
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["cache-control"] == IMMUTABLE
+
+
+def test_unversioned_names_get_short_cache_and_versioned_urls_immutable(static_root):
+    client = _client(static_root)
+    plain = client.get("/static/uploads/avatar.png")
+    assert plain.headers["cache-control"] == "public, max-age=300"
+
+    url = static_url("uploads/avatar.png", root=str(static_root))
+    version = file_version(os.stat(static_root / "uploads" / "avatar.png"))
+    assert url == f"/static/uploads/avatar.png?v={version}"
+    versioned = client.get(url)
+    assert versioned.headers["cache-control"] == IMMUTABLE
+    assert versioned.headers["etag"] == f'"{version}"'
+    # Een oude ?v= mag niet onveranderlijk gecachet worden.
+    assert client.get("/static/uploads/avatar.png?v=stale").headers["cache-control"] != IMMUTABLE
+    assert static_url("uploads/previews/7-0123456789abcdef.jpg") == (
+        "/static/uploads/previews/7-0123456789abcdef.jpg"
+    )
+
+
+def test_range_requests(static_root):
+    client = _client(static_root)
+    url = "/static/uploads/previews/7-0123456789abcdef.jpg"
+    partial = client.get(url, headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == bytes(range(10, 20))
+    assert partial.headers["content-range"] == "bytes 10-19/1024"
+
+    # If-Range met de sterke ETag: nog steeds een range; met een oude: alles.
+    assert client.get(url, headers={"Range": "bytes=0-3", "If-Range": '"0123456789abcdef"'}).status_code == 206
+    assert client.get(url, headers={"Range": "bytes=0-3", "If-Range": '"other"'}).status_code == 200
+
+
+def test_x_accel_offload(static_root):
+    client = _client(static_root, offload="x-accel", accel_prefix="/_static")
+    response = client.get("/static/uploads/previews/7-0123456789abcdef.jpg")
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["x-accel-redirect"] == "/_static/uploads/previews/7-0123456789abcdef.jpg"
+    assert response.headers["cache-control"] == IMMUTABLE
+    assert response.headers["content-type"] == "image/jpeg"
+
+    assert client.get(
+        "/static/uploads/previews/7-0123456789abcdef.jpg",
+        headers={"If-None-Match": '"0123456789abcdef"'},
+    ).status_code == 304
+    assert client.get("/static/uploads/missing.jpg").status_code == 404
+
+    sendfile = _client(static_root, offload="x-sendfile")
+    response = sendfile.get("/static/uploads/avatar.png")
+    assert response.headers["x-sendfile"] == str(static_root / "uploads" / "avatar.png")
@@ -0,0 +1,239 @@
+import sys
+import asyncio
+from importlib import reload
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.calls.append((name, args))
+            return self
+
+        return queue
+
+    async def execute(self):
+        results = [await getattr(self.redis, name)(*args) for name, args in self.calls]
+        self.calls = []
+        return results
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeRedis:
+    """Net genoeg Redis (sets, lists, HLL als set) voor de presence-code."""
+
+    def __init__(self):
+        self.sets = {}
+        self.lists = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def sadd(self, key, *members):
+        s = self.sets.setdefault(key, set())
+        added = len(set(members) - s)
+        s.update(members)
+        return added
+
+    async def srem(self, key, member):
+        s = self.sets.get(key, set())
+        if member in s:
+            s.remove(member)
+            return 1
+        return 0
+
+    async def scard(self, key):
+        return len(self.sets.get(key, ()))
+
+    async def pfadd(self, key, *members):
+        return await self.sadd(key, *members)
+
+    async def pfcount(self, key):
+        return await self.scard(key)
+
+    async def expire(self, key, seconds):
+        return 1
+
+    async def spop(self, key, count):
+        s = self.sets.get(key, set())
+        popped = [s.pop() for _ in range(min(count, len(s)))]
+        return popped or None
+
+    async def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    async def lpush(self, key, *values):
+        for value in values:
+            self.lists.setdefault(key, []).insert(0, value)
+
+    async def lpop(self, key, count):
+        items = self.lists.get(key, [])
+        popped, self.lists[key] = items[:count], items[count:]
+        return popped or None
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path/'test.db'}"
+    monkeypatch.setenv("SQLALCHEMY_URL", db_url)
+    monkeypatch.setenv("POSTGRES_PASSWORD", "test-password")
+    monkeypatch.setenv("ADMIN_KEY", "test-admin")
+    monkeypatch.setenv("LIVEKIT_API_SECRET", "test-livekit-secret")
+    monkeypatch.setenv("REDIS_PASSWORD", "test-redis-password")
+    monkeypatch.setenv("JWT_SECRET", "test-jwt")
+
+    for module_name in (
+        "database",
+        "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
+        "dm_hub",
+        "viewer_presence",
+        "livekit_webhook",
+        "backend.app.database",
+        "backend.app.models",
+    ):
+        sys.modules.pop(module_name, None)
+
+    import backend.app.database as database_module
+    sys.modules["database"] = database_module
+
+    import backend.app.models as models_module
+    sys.modules["models"] = models_module
+
+    from backend.app import main
+
+    reload(main)
+
+    main.Base.metadata.drop_all(main.engine)
+    main.Base.metadata.create_all(main.engine)
+
+    with main.SessionLocal() as session:
+        user = main.UserDB(username="luna", email="luna@example.com", password_hash="x")
+        session.add(user)
+        session.flush()
+        session.add(main.LiveSession(user_id=user.id, room_slug="luna-room"))
+        session.commit()
+
+    yield main
+
+
+def _session_id(main):
+    with main.engine.connect() as conn:
+        return conn.execute(text("SELECT id FROM live_sessions")).scalar_one()
+
+
+def test_view_start_uses_redis_and_flush_writes_batch(app_module, monkeypatch):
+    main = app_module
+    presence = sys.modules["viewer_presence"].viewer_presence
+    redis = FakeRedis()
+    monkeypatch.setattr(presence, "redis", redis)
+    monkeypatch.setattr(presence, "flush_interval", 3600)
+
+    statements = []
+    with TestClient(main.app) as client:
+        event.listen(
+            main.engine, "before_cursor_execute", lambda *args: statements.append(args[2])
+        )
+        assert client.post("/api/room/view-start", json={"room": "luna-room"}).json()["ok"]
+        statements.clear()
+        # Tweede kijker-request: sessie gecachet, dus geen enkel statement.
+        assert client.post("/api/room/view-start", json={"room": "luna-room"}).json()["ok"]
+        assert statements == []
+
+        sid = _session_id(main)
+        member = presence._sessions["luna-room"][1][1]
+
+        async def more_viewers():
+            for ip in ("10.0.0.2", "10.0.0.3", "10.0.0.4"):
+                assert await presence.join(member, ip)
+            assert await presence.leave(member, "10.0.0.4")
+            assert not await presence.leave(member, "10.0.0.9")
+
+        asyncio.run(more_viewers())
+        # Nog niets in de DB tot de flusher langskomt.
+        with main.engine.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM live_viewers")).scalar_one() == 0
+
+        assert asyncio.run(presence.flush()) == 5
+        assert asyncio.run(presence.flush()) == 0
+
+        with main.engine.connect() as conn:
+            viewers, uniq = conn.execute(
+                text("SELECT viewers, unique_viewers FROM live_sessions WHERE id = :sid"),
+                {"sid": sid},
+            ).one()
+            rows = dict(
+                conn.execute(
+                    text("SELECT viewer_ip, left_at IS NULL FROM live_viewers WHERE session_id = :sid"),
+                    {"sid": sid},
+                ).all()
+            )
+        assert (viewers, uniq) == (3, 4)
+        assert rows == {"testclient": 1, "10.0.0.2": 1, "10.0.0.3": 1, "10.0.0.4": 0}
+
+        assert client.post("/api/room/view-end", json={"room": "luna-room"}).json()["ok"]
+        asyncio.run(presence.flush())
+        with main.engine.connect() as conn:
+            assert conn.execute(
+                text("SELECT viewers FROM live_sessions WHERE id = :sid"), {"sid": sid}
+            ).scalar_one() == 2
+
+
+def test_view_start_falls_back_to_database_without_redis(app_module, monkeypatch):
+    main = app_module
+    presence = sys.modules["viewer_presence"].viewer_presence
+    monkeypatch.setattr(presence, "redis", None)
+
+    with TestClient(main.app) as client:
+        assert client.post("/api/room/view-start", json={"room": "luna-room"}).json()["ok"]
+        assert client.post("/api/room/view-start", json={"room": "luna-room"}).json()["ok"]
+        assert client.post("/api/room/view-start", json={"room": "nope"}).status_code == 404
+
+    with main.engine.connect() as conn:
+        assert conn.execute(text("SELECT viewers FROM live_sessions")).scalar_one() == 1
+        assert conn.execute(text("SELECT COUNT(*) FROM live_viewers")).scalar_one() == 1
+
+
+def test_write_viewer_states_is_batched(app_module):
+    from datetime import datetime
+
+    from viewer_presence import write_viewer_states
+
+    class RecordingSession:
+        def __init__(self):
+            self.calls = []
+
+        async def execute(self, statement, params):
+            self.calls.append((str(statement), len(params)))
+
+    now = datetime.utcnow()
+    states = {(1, f"10.0.{i // 256}.{i % 256}"): {"joined": now, "left": None} for i in range(400)}
+    states.update({(1, f"10.1.0.{i}"): {"joined": None, "left": now} for i in range(100)})
+
+    s = RecordingSession()
+    asyncio.run(write_viewer_states(s, states))
+    assert [n for _sql, n in s.calls] == [100, 400, 400]
+    assert s.calls[-1][0].startswith("INSERT INTO live_viewers")
@@ -11,6 +11,12 @@ ROOT = Path(__file__).resolve().parents[3]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+APP_DIR = Path(__file__).resolve().parents[1]
+if str(APP_DIR) not in sys.path:
+    sys.path.append(str(APP_DIR))
+
+from passwords import pwd_ctx  # noqa: E402
+
 
 @pytest.fixture
 def app_module(tmp_path, monkeypatch):
@@ -26,6 +32,12 @@ def app_module(tmp_path, monkeypatch):
     for module_name in (
         "database",
         "models",
+        "auth",
+        "admin",
+        "dm",
+        "room",
+        "migrations",
+        "live_directory",
         "backend.app.database",
         "backend.app.models",
     ):
@@ -49,7 +61,7 @@ def app_module(tmp_path, monkeypatch):
 
 def test_wallet_history_returns_entries(app_module):
     main = app_module
-    password = main.pwd_ctx.hash("secret")
+    password = pwd_ctx.hash("secret")
 
     with main.SessionLocal() as session:
         user = main.UserDB(username="alice", email="alice@example.com", password_hash=password)
@@ -81,7 +93,7 @@ def test_wallet_history_returns_entries(app_module):
 
 def test_wallet_history_includes_tip_entries(app_module):
     main = app_module
-    password = main.pwd_ctx.hash("secret")
+    password = pwd_ctx.hash("secret")
 
     with main.SessionLocal() as session:
         sender = main.UserDB(username="alice", email="alice@example.com", password_hash=password)
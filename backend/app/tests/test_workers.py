@@ -0,0 +1,45 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from workers import BoundedPool  # noqa: E402
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    pool = BoundedPool("test", max_workers=1, max_queue=0, kind="thread", timeout=0.05)
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(HTTPException) as exc:
+            await pool.run(release.wait, 5)
+        assert exc.value.status_code == 503
+        # De job loopt nog: de worker is bezet en een nieuwe job wordt geweigerd.
+        stats = pool.stats()
+        assert stats["pending"] == 1 and stats["running"] == 1 and stats["queued"] == 0
+        assert stats["timeouts"] == 1 and stats["timed_out_running"] == 1
+        with pytest.raises(HTTPException):
+            await pool.run(release.wait, 5)
+        assert pool.rejected == 1
+
+        release.set()
+        for _ in range(100):
+            if pool.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        stats = pool.stats()
+        assert stats["pending"] == 0 and stats["timed_out_running"] == 0
+        assert await pool.run(sum, [1, 2]) == 3
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
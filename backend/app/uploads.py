@@ -0,0 +1,267 @@
+"""Gestreamde uploads rechtstreeks naar schijf, met een harde groottelimiet.
+
+In plaats van base64 in JSON (33% groter, volledige body in geheugen, daarna
+nog een gedecodeerde kopie) leest de server de body chunk per chunk uit
+``request.stream()`` en schrijft die meteen weg naar een tijdelijk bestand
+naast de bestemming.  Wie de limiet overschrijdt krijgt een 413 en het
+halve bestand wordt opgeruimd.
+
+Twee vormen worden ondersteund:
+
+* raw: ``Content-Type: image/jpeg`` (of een ander type) met de bytes als body;
+* ``multipart/form-data``: één of meer bestandsvelden (bv. ``frames``).
+
+Schrijven (en multipart-parsen) gebeurt in de threadpool, niet op de event
+loop.  ``read_json`` past dezelfde limiet toe op JSON-bodies, ook als de
+client geen ``Content-Length`` meestuurt (chunked).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+# Marge voor multipart-boundaries en part-headers bovenop de bestanden zelf.
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+@dataclass
+class ReceivedFile:
+    path: str
+    size: int
+    content_type: str
+    field: str = ""
+    filename: str = ""
+
+
+def media_type(request: Request) -> str:
+    content_type, _params = parse_options_header(request.headers.get("content-type", ""))
+    return content_type.decode().lower()
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(413, f"Upload te groot (max {max_bytes // 1024} KB)")
+
+
+def check_content_length(request: Request, max_bytes: int) -> None:
+    """413 vóór er iets gelezen wordt als de client al een te grote body aankondigt."""
+
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise _too_large(max_bytes)
+
+
+async def read_json(request: Request, *, max_bytes: int) -> dict:
+    """JSON-object als body met een harde limiet, geteld op de gestreamde bytes."""
+
+    check_content_length(request, max_bytes)
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise _too_large(max_bytes)
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPException(400, "Ongeldige JSON")
+    if not isinstance(data, dict):
+        raise HTTPException(400, "JSON-object verwacht")
+    return data
+
+
+def _temp_path(dest_dir: str) -> str:
+    return os.path.join(dest_dir, f".upload-{uuid4().hex}.part")
+
+
+def discard(files: list[ReceivedFile]) -> None:
+    for received in files:
+        try:
+            os.remove(received.path)
+        except FileNotFoundError:
+            pass
+
+
+class _CappedWriter:
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._fh = open(path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise _too_large(self.max_bytes)
+        self._fh.write(chunk)
+
+    def abort(self) -> None:
+        self._fh.close()
+        os.remove(self.path)
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+async def receive_raw(request: Request, dest_dir: str, *, max_bytes: int) -> ReceivedFile:
+    check_content_length(request, max_bytes)
+    writer = await run_in_threadpool(_CappedWriter, _temp_path(dest_dir), max_bytes)
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(writer.write, chunk)
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+    await run_in_threadpool(writer.close)
+    if not writer.size:
+        os.remove(writer.path)
+        raise HTTPException(400, "Lege upload")
+    return ReceivedFile(writer.path, writer.size, media_type(request))
+
+
+async def receive_multipart(
+    request: Request,
+    dest_dir: str,
+    *,
+    max_bytes: int,
+    max_files: int = 1,
+    field: Optional[str] = None,
+) -> list[ReceivedFile]:
+    """Bestandsvelden (optioneel enkel ``field``) streamen naar ``dest_dir``.
+
+    ``max_bytes`` geldt per bestand; tekstvelden worden genegeerd.
+    """
+
+    _ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(400, "Multipart zonder boundary")
+    check_content_length(request, max_bytes * max_files + MULTIPART_OVERHEAD)
+
+    files: list[ReceivedFile] = []
+    state = {"header": b"", "value": b"", "headers": {}, "writer": None}
+
+    def on_part_begin():
+        state["headers"] = {}
+        state["writer"] = None
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header"].lower()] = state["value"]
+        state["header"] = state["value"] = b""
+
+    def on_headers_finished():
+        _disp, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode()
+        filename = options.get(b"filename")
+        if filename is None or (field and name != field):
+            return
+        if len(files) >= max_files:
+            raise HTTPException(413, f"Maximaal {max_files} bestanden")
+        ctype, _ = parse_options_header(state["headers"].get(b"content-type", b""))
+        writer = _CappedWriter(_temp_path(dest_dir), max_bytes)
+        files.append(
+            ReceivedFile(writer.path, 0, ctype.decode().lower(), name, filename.decode(errors="replace"))
+        )
+        state["writer"] = writer
+
+    def on_part_data(data, start, end):
+        if state["writer"] is not None:
+            state["writer"].write(data[start:end])
+
+    def on_part_end():
+        writer = state["writer"]
+        if writer is not None:
+            writer.close()
+            files[-1].size = writer.size
+            state["writer"] = None
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+        },
+    )
+    try:
+        # De callbacks openen en schrijven bestanden: parser in de threadpool.
+        async for chunk in request.stream():
+            await run_in_threadpool(parser.write, chunk)
+        await run_in_threadpool(parser.finalize)
+    except BaseException as exc:
+        if state["writer"] is not None:
+            state["writer"].close()
+        discard(files)
+        if isinstance(exc, HTTPException):
+            raise
+        if isinstance(exc, Exception):
+            raise HTTPException(400, "Ongeldige multipart-upload")
+        raise
+
+    discard([f for f in files if not f.size])
+    files = [f for f in files if f.size]
+    if not files:
+        raise HTTPException(400, "Geen bestand ontvangen")
+    return files
+
+
+async def receive_files(
+    request: Request,
+    dest_dir: str,
+    *,
+    max_bytes: int,
+    max_files: int = 1,
+    field: Optional[str] = None,
+) -> list[ReceivedFile]:
+    """Raw of multipart, afhankelijk van de ``Content-Type``."""
+
+    if media_type(request) == "multipart/form-data":
+        return await receive_multipart(
+            request, dest_dir, max_bytes=max_bytes, max_files=max_files, field=field
+        )
+    return [await receive_raw(request, dest_dir, max_bytes=max_bytes)]
+
+
+def sniff_image(path: str) -> Optional[str]:
+    """Bestandsextensie op basis van de magic bytes, of None."""
+
+    with open(path, "rb") as fh:
+        head = fh.read(12)
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+__all__ = [
+    "ReceivedFile",
+    "receive_files",
+    "receive_raw",
+    "receive_multipart",
+    "check_content_length",
+    "read_json",
+    "media_type",
+    "discard",
+    "sniff_image",
+]
@@ -0,0 +1,294 @@
+"""Kijkers per live-sessie in Redis, met periodieke flush naar Postgres.
+
+``/api/room/view-start`` deed 4-5 statements per kijker en liet alle kijkers
+van één show op dezelfde ``live_sessions``-rij wachten.  Met Redis:
+
+* aanwezigheid staat in een set per sessie (``viewers:{sid}:{gen}``, lid =
+  viewer-ip) en unieke kijkers in een HyperLogLog ernaast;
+* een nieuwe join/leave zet een event op ``viewers:events`` en markeert de
+  sessie in ``viewers:dirty``;
+* de flusher (één task per worker, gestart bij de eerste join) haalt om de
+  ``VIEWER_FLUSH_SECONDS`` een batch events en dirty sessies op (``LPOP`` /
+  ``SPOP`` zijn atomair, dus elke worker flusht een ander deel) en schrijft
+  die in één transactie weg naar ``live_viewers`` en ``live_sessions``.
+
+``gen`` is de starttijd van de sessie: ``go_live`` hergebruikt de rij van de
+gebruiker, dus zo begint elke uitzending met een lege set.  Zonder Redis
+(of bij een Redis-fout) valt ``room.py`` terug op het directe DB-pad.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, Integer, String, bindparam, text
+
+from database import async_session
+from live_directory import _timestamp
+from redis_client import redis as _redis
+
+VIEWER_FLUSH_SECONDS = float(os.getenv("VIEWER_FLUSH_SECONDS", "5"))
+VIEWER_FLUSH_BATCH = 500
+# Hoe lang de room -> sessie-lookup per worker gecachet blijft.
+SESSION_CACHE_SECONDS = 10.0
+# Sets van afgelopen sessies ruimen zichzelf op.
+PRESENCE_TTL_SECONDS = 12 * 3600
+
+EVENTS_KEY = "viewers:events"
+DIRTY_KEY = "viewers:dirty"
+
+
+def _members_key(member: str) -> str:
+    return f"viewers:{member}"
+
+
+def _unique_key(member: str) -> str:
+    return f"viewers:uniq:{member}"
+
+
+class ViewerPresence:
+    def __init__(self, redis=None, flush_interval: float = VIEWER_FLUSH_SECONDS):
+        self.redis = redis
+        self.flush_interval = flush_interval
+        self._sessions: dict[str, tuple[float, Optional[tuple[int, str]]]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self.joins = 0
+        self.leaves = 0
+        self.flushes = 0
+        self.flushed_events = 0
+        self.flush_errors = 0
+
+    # ---------- room -> sessie ----------
+    async def session_for(self, s, room: str) -> Optional[tuple[int, str]]:
+        """``(session_id, "sid:gen")`` van de open sessie van ``room``, of None."""
+
+        now = time.monotonic()
+        cached = self._sessions.get(room)
+        if cached and now - cached[0] < SESSION_CACHE_SECONDS:
+            return cached[1]
+        row = (
+            await s.execute(
+                text(
+                    "SELECT id, started_at FROM live_sessions"
+                    " WHERE room_slug = :room AND ended_at IS NULL"
+                ),
+                {"room": room},
+            )
+        ).first()
+        session = (row[0], f"{row[0]}:{int(_timestamp(row[1]))}") if row else None
+        self._sessions[room] = (now, session)
+        return session
+
+    def forget(self, room: str) -> None:
+        self._sessions.pop(room, None)
+
+    # ---------- join / leave ----------
+    async def join(self, member: str, ip: str) -> bool:
+        """True als ``ip`` nieuw is in de sessie.  Gooit ``RedisError``."""
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.sadd(_members_key(member), ip)
+            pipe.pfadd(_unique_key(member), ip)
+            pipe.expire(_members_key(member), PRESENCE_TTL_SECONDS)
+            pipe.expire(_unique_key(member), PRESENCE_TTL_SECONDS)
+            added = (await pipe.execute())[0]
+        if added:
+            await self._record(member, ip, "join")
+            self.joins += 1
+            self._ensure_flusher()
+        return bool(added)
+
+    async def leave(self, member: str, ip: str) -> bool:
+        removed = await self.redis.srem(_members_key(member), ip)
+        if removed:
+            await self._record(member, ip, "leave")
+            self.leaves += 1
+            self._ensure_flusher()
+        return bool(removed)
+
+    async def _record(self, member: str, ip: str, op: str) -> None:
+        event = json.dumps({"m": member, "ip": ip, "op": op, "ts": time.time()})
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(EVENTS_KEY, event)
+            pipe.sadd(DIRTY_KEY, member)
+            await pipe.execute()
+
+    # ---------- flusher ----------
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and not self._flusher.done():
+            return
+        self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # Achterstand in één ronde wegwerken, batch per batch.
+                while await self.flush() >= VIEWER_FLUSH_BATCH:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.flush_errors += 1
+                print(f"⚠️  Viewer flush mislukt: {exc}")
+
+    async def flush(self) -> int:
+        """Schrijf één batch weg; geeft het aantal verwerkte events terug."""
+
+        if self.redis is None:
+            return 0
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lpop(EVENTS_KEY, VIEWER_FLUSH_BATCH)
+            pipe.spop(DIRTY_KEY, VIEWER_FLUSH_BATCH)
+            raw_events, dirty = await pipe.execute()
+        raw_events = raw_events or []
+        dirty = sorted(dirty or [])
+        if not raw_events and not dirty:
+            return 0
+
+        try:
+            counts = []
+            if dirty:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for member in dirty:
+                        pipe.scard(_members_key(member))
+                        pipe.pfcount(_unique_key(member))
+                    results = await pipe.execute()
+                for i, member in enumerate(dirty):
+                    counts.append(
+                        {
+                            "sid": int(member.split(":", 1)[0]),
+                            "viewers": int(results[2 * i]),
+                            "uniq": int(results[2 * i + 1]),
+                        }
+                    )
+            await self._write(_collapse(raw_events), counts)
+        except Exception:
+            # Niets kwijtspelen: terug in de wachtrij voor de volgende ronde.
+            async with self.redis.pipeline(transaction=False) as pipe:
+                if raw_events:
+                    pipe.lpush(EVENTS_KEY, *reversed(raw_events))
+                if dirty:
+                    pipe.sadd(DIRTY_KEY, *dirty)
+                await pipe.execute()
+            raise
+
+        self.flushes += 1
+        self.flushed_events += len(raw_events)
+        return len(raw_events)
+
+    async def _write(self, viewers: dict, counts: list[dict]) -> None:
+        async with async_session() as s:
+            await write_viewer_states(s, viewers)
+            if counts:
+                await s.execute(
+                    text(
+                        "UPDATE live_sessions SET viewers = :viewers, unique_viewers = :uniq"
+                        " WHERE id = :sid AND ended_at IS NULL"
+                    ),
+                    counts,
+                )
+            await s.commit()
+
+    async def stop(self) -> None:
+        """Flusher stoppen en wat nog in de wachtrij staat wegschrijven."""
+
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        try:
+            await self._flusher
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._flusher = None
+        try:
+            await self.flush()
+        except Exception as exc:
+            print(f"⚠️  Laatste viewer flush mislukt: {exc}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis" if self.redis is not None else "db",
+            "joins": self.joins,
+            "leaves": self.leaves,
+            "flushes": self.flushes,
+            "flushed_events": self.flushed_events,
+            "flush_errors": self.flush_errors,
+        }
+
+
+_VIEWER_BINDS = (
+    bindparam("sid", type_=Integer),
+    bindparam("ip", type_=String),
+    bindparam("joined", type_=DateTime),
+    bindparam("left", type_=DateTime),
+)
+
+_CLOSE_VIEWERS = text(
+    "UPDATE live_viewers SET left_at = :left"
+    " WHERE session_id = :sid AND viewer_ip = :ip AND left_at IS NULL"
+).bindparams(*_VIEWER_BINDS[:2], _VIEWER_BINDS[3])
+
+_UPDATE_VIEWERS = text(
+    "UPDATE live_viewers SET joined_at = :joined, left_at = :left"
+    " WHERE session_id = :sid AND viewer_ip = :ip"
+).bindparams(*_VIEWER_BINDS)
+
+# Getypeerde binds: asyncpg kan de SELECT-lijst anders niet typeren.
+_INSERT_VIEWERS = text(
+    "INSERT INTO live_viewers (session_id, viewer_ip, joined_at, left_at)"
+    " SELECT :sid, :ip, :joined, :left"
+    " WHERE NOT EXISTS ("
+    "SELECT 1 FROM live_viewers WHERE session_id = :sid AND viewer_ip = :ip)"
+).bindparams(*_VIEWER_BINDS)
+
+
+async def write_viewer_states(s, viewers: dict) -> None:
+    """Eindtoestand per ``(session_id, viewer)`` wegschrijven naar ``live_viewers``.
+
+    ``viewers`` mapt op ``{"joined": datetime|None, "left": datetime|None}``;
+    enkel ``left`` betekent: open rij afsluiten.  Hoe groot de batch ook is,
+    dit zijn hoogstens drie ``executemany``-statements: sluiten, bijwerken en
+    de ontbrekende rijen invoegen.
+    """
+
+    closes, joins = [], []
+    for (sid, viewer), state in viewers.items():
+        params = {"sid": sid, "ip": viewer, "joined": state["joined"], "left": state["left"]}
+        (joins if state["joined"] is not None else closes).append(params)
+
+    if closes:
+        await s.execute(_CLOSE_VIEWERS, closes)
+    if joins:
+        await s.execute(_UPDATE_VIEWERS, joins)
+        await s.execute(_INSERT_VIEWERS, joins)
+
+
+def _collapse(raw_events: list[str]) -> dict:
+    """Events per (sessie, ip) samenvoegen tot de eindtoestand van de batch."""
+
+    viewers: dict[tuple[int, str], dict] = {}
+    for raw in raw_events:
+        try:
+            event = json.loads(raw)
+            sid = int(event["m"].split(":", 1)[0])
+            ts = datetime.utcfromtimestamp(event["ts"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        state = viewers.setdefault((sid, event["ip"]), {"joined": None, "left": None})
+        if event["op"] == "join":
+            state["joined"], state["left"] = ts, None
+        else:
+            state["left"] = ts
+    return viewers
+
+
+viewer_presence = ViewerPresence(_redis)
+
+
+__all__ = ["ViewerPresence", "viewer_presence", "write_viewer_states", "VIEWER_FLUSH_SECONDS"]
@@ -0,0 +1,159 @@
+"""Begrensde worker pools voor CPU-zwaar werk buiten de event loop.
+
+Een :class:`BoundedPool` verpakt een ``ProcessPoolExecutor`` (of een
+``ThreadPoolExecutor`` voor lichte I/O-taken) met:
+
+* een concurrency-cap (``max_workers``);
+* een begrensde wachtrij: als er al ``max_workers + max_queue`` jobs lopen of
+  wachten, wordt een nieuwe job meteen geweigerd met een 503;
+* metrics (wachtrijdiepte, aantallen, doorlooptijden) voor monitoring.
+
+Jobs moeten top-level functies in een importeerbare module zijn zodat ze
+naar een (gespawned) child process gepickled kunnen worden.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+
+
+class BoundedPool:
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_workers: Optional[int] = None,
+        max_queue: int = 64,
+        kind: str = "process",
+        timeout: Optional[float] = None,
+    ):
+        self.name = name
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.kind = kind
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        # Jobs die hun timeout overschreden maar nog in een worker lopen.
+        self._abandoned: set = set()
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _get_executor(self) -> Executor:
+        # Lazy: geen child processes starten in processen die de pool nooit gebruiken.
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=self.name
+                )
+            else:
+                # "spawn" i.p.v. fork: forken vanuit een multi-threaded server
+                # (threadpool, DB-pool) kan locks in het child laten hangen.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Voer ``fn(*args)`` uit in de pool en wacht (non-blocking) op het resultaat."""
+
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server is even druk, probeer het zo opnieuw.",
+                headers={"Retry-After": "1"},
+            )
+
+        loop = asyncio.get_running_loop()
+        job = self._get_executor().submit(fn, *args)
+        self.pending += 1
+        self.submitted += 1
+
+        def _on_done(_job) -> None:
+            # Pas vrijgeven als de job echt klaar is, ook na een timeout.
+            try:
+                loop.call_soon_threadsafe(self._finish, job)
+            except RuntimeError:
+                pass  # loop al gesloten (shutdown)
+
+        job.add_done_callback(_on_done)
+        future = asyncio.wrap_future(job)
+        started = time.perf_counter()
+        try:
+            if self.timeout:
+                result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            else:
+                result = await future
+        except asyncio.TimeoutError:
+            # Een wachtende job kan nog weg; een lopende blijft een worker bezet
+            # houden en telt mee in ``pending`` tot ze klaar is.
+            future.cancel()
+            if not job.done():
+                self._abandoned.add(job)
+            self.timeouts += 1
+            self.failed += 1
+            raise HTTPException(status_code=503, detail="Verwerking duurde te lang")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.last_seconds = elapsed
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+        self.completed += 1
+        return result
+
+    def _finish(self, job) -> None:
+        self.pending -= 1
+        self._abandoned.discard(job)
+
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "running": min(self.pending, self.max_workers),
+            "queued": max(self.pending - self.max_workers, 0),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "timed_out_running": len(self._abandoned),
+            "avg_ms": round(self.total_seconds / finished * 1000, 2) if finished else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 2),
+            "last_ms": round(self.last_seconds * 1000, 2),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+__all__ = ["BoundedPool"]
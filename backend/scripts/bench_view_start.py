@@ -0,0 +1,95 @@
+"""Concurrency-benchmark voor ``POST /api/room/view-start``.
+
+Start een backend (bv. ``uvicorn main:app --workers 1``) met een actieve
+live-sessie voor ``--room`` en draai dan::
+
+    python scripts/bench_view_start.py --url http://localhost:8000 --room katty
+
+Draai het script één keer tegen de oude (sync psycopg2) build en één keer
+tegen de async build; vergelijk ``req/s`` en de latency-percentielen.  Met
+``--slow-path`` loopt er tegelijk een trage request mee, om te tonen of die
+de rest van de worker blokkeert.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def _worker(client: httpx.AsyncClient, url: str, room: str, n: int, latencies: list, errors: list):
+    for _ in range(n):
+        t0 = time.perf_counter()
+        try:
+            res = await client.post(url, json={"room": room})
+            if res.status_code != 200:
+                errors.append(res.status_code)
+        except httpx.HTTPError as exc:
+            errors.append(type(exc).__name__)
+        latencies.append(time.perf_counter() - t0)
+
+
+def _pct(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run(args: argparse.Namespace) -> None:
+    url = args.url.rstrip("/") + "/api/room/view-start"
+    per_worker = max(args.requests // args.concurrency, 1)
+    latencies: list = []
+    errors: list = []
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=30.0, limits=limits) as client:
+        slow = None
+        if args.slow_path:
+            slow = asyncio.create_task(client.get(args.url.rstrip("/") + args.slow_path))
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                _worker(client, url, args.room, per_worker, latencies, errors)
+                for _ in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+        if slow is not None:
+            slow.cancel()
+
+    total = len(latencies)
+    print(f"requests     : {total} ({len(errors)} fouten)")
+    print(f"concurrency  : {args.concurrency}")
+    print(f"duur         : {elapsed:.2f}s")
+    print(f"throughput   : {total / elapsed:.1f} req/s")
+    print(f"latency p50  : {_pct(latencies, 50) * 1000:.1f} ms")
+    print(f"latency p95  : {_pct(latencies, 95) * 1000:.1f} ms")
+    print(f"latency p99  : {_pct(latencies, 99) * 1000:.1f} ms")
+    if latencies:
+        print(f"latency mean : {statistics.mean(latencies) * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--room", required=True, help="room_slug van een actieve live-sessie")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument(
+        "--slow-path",
+        default=None,
+        help="optioneel pad dat parallel een trage request uitvoert",
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -644,13 +644,15 @@ async function sendSnapshot() {
   canvas.height = 240;
   const ctx = canvas.getContext("2d");
   ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-  const img = canvas.toDataURL("image/jpeg", 0.7);
-  
+  // Raw JPEG i.p.v. base64 in JSON: ~33% minder bytes, geen JSON-parse op de server.
+  const blob = await new Promise((resolve) => canvas.toBlob(resolve, "image/jpeg", 0.7));
+  if (!blob) return;
+
   try {
     await fetch(`${API}/room/snapshot`, {
       method: "POST",
-      headers: { Authorization: `Bearer ${authToken}`, "Content-Type": "application/json" },
-      body: JSON.stringify({ image: img }),
+      headers: { Authorization: `Bearer ${authToken}`, "Content-Type": "image/jpeg" },
+      body: blob,
     });
     console.log("📸 Snapshot verstuurd");
   } catch (err) {
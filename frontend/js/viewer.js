@@ -1224,8 +1224,62 @@ function refreshPMInbox() {
     });
 }
 
-// Iedere 5 sec inbox verversen
-setInterval(refreshPMInbox, 5000);
+// Nieuwe PM's komen via push (Server-Sent Events) binnen i.p.v. polling.
+// EventSource herverbindt zelf en stuurt Last-Event-ID mee, zodat de
+// server gemiste berichten opnieuw aflevert. Het sessietoken gaat nooit in
+// de URL: de stream opent met een kortlevend ticket. Is dat verlopen bij een
+// herverbinding, dan sluit de server af en halen we een nieuw ticket
+// (met ?since= zodat er niets verloren gaat).
+async function startPMStream(since) {
+    const token = localStorage.getItem("token");
+    if (!token) return;
+    if (typeof EventSource === "undefined") {
+        setInterval(refreshPMInbox, 5000);
+        return;
+    }
+
+    let lastId = since || "";
+    let ticket;
+    try {
+        const res = await fetch(`${API}/dm/stream-ticket`, {
+            method: "POST",
+            headers: { Authorization: `Bearer ${token}` },
+        });
+        if (!res.ok) return;
+        ticket = (await res.json()).ticket;
+    } catch (err) {
+        setTimeout(() => startPMStream(lastId), 5000);
+        return;
+    }
+
+    const params = new URLSearchParams({ ticket });
+    if (lastId) params.set("since", lastId);
+    const source = new EventSource(`${API}/dm/stream?${params}`);
+    source.addEventListener("error", () => {
+        if (source.readyState !== EventSource.CLOSED) return;
+        setTimeout(() => startPMStream(lastId), 3000);
+    });
+    source.addEventListener("dm", (event) => {
+        lastId = event.lastEventId || lastId;
+        const m = JSON.parse(event.data);
+        const myName = (localStorage.getItem("username") || "").toLowerCase();
+        // Eigen berichten staan er al ("jij") na het versturen.
+        if (typeof m.from === "string" && m.from.trim().toLowerCase() === myName) return;
+
+        addPMMessage(m.from, m.message);
+
+        const targetName =
+          window.streamerNameLower ||
+          (window.streamerName ? window.streamerName.toLowerCase() : null);
+        if (!pmUnlocked && targetName && m.from.trim().toLowerCase() === targetName) {
+          pmUnlocked = true;
+          updatePMLockUI();
+        }
+    });
+}
+
+refreshPMInbox();
+startPMStream();
 
 
 // PM versturen